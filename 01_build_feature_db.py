@@ -1,16 +1,21 @@
 import os
+import json
+import hashlib
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 import numpy as np
 import cv2
+from feature_store import open_store
+from pose_utils import pose_columns, ensure_pose_columns
+from metrics import metrics
+from feature_codec import (CODEC_FLOAT32, CODEC_PQ, PQ_TRAIN_SAMPLES, load_codec, save_codec, train_codec, store_columns,
+                           search_codes, needs_retraining)
+from dedup import DEFAULT_DUPLICATE_DISTANCE, RowSubset, dedup_features, find_duplicates
+from thumbnails import shrink_for_thumbnails, make_thumbnails, thumbnail_columns, ensure_thumbnail_columns
 
-# --- TensorFlow Lite Interpreter 로드 ---
-# TensorFlow의 로그 메시지 수준을 조정하여 불필요한 경고를 숨깁니다.
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
-try:
-    # tflite-runtime이 설치된 경우, 경량화된 인터프리터를 사용합니다.
-    from tflite_runtime.interpreter import Interpreter
-except ImportError:
-    # TensorFlow 전체가 설치된 경우, 표준 인터프리터를 사용합니다.
-    from tensorflow.lite.python.interpreter import Interpreter
+# TensorFlow Lite Interpreter 는 model_loader 가 처음 모델을 만들 때 import 합니다. (tflite_runtime 이 없으면 TensorFlow)
+from model_loader import ModelRunner, create_interpreter
 
 # --- 1. 설정 및 상수 정의 ---
 
@@ -18,7 +23,47 @@ except ImportError:
 FEATURE_MODEL_PATH = "models/feature_extractor.tflite"
 POSE_MODEL_PATH = "models/pose_model.tflite"  # 자세 인식을 위한 모델 경로 추가
 DB_IMAGE_DIR = "db_images"
-OUTPUT_DB_PATH = "feature_db.npz"
+OUTPUT_DB_DIR = "feature_db"  # 추가 전용 메모리 맵 특징 저장소 (feature_store.py 참고)
+LEGACY_DB_PATH = "feature_db.npz"  # 예전 형식의 DB. 저장소가 없으면 자동으로 가져옵니다.
+MANIFEST_PATH = "feature_db_manifest.json"  # 증분 빌드용 매니페스트 (feature_db 폴더 옆에 저장)
+
+# --- 빌드 모드 ---
+# True: 매니페스트를 기준으로 새로 추가/변경된 이미지만 처리하고, 삭제된 이미지는 DB에서 제거합니다.
+#       파일명 일괄 변경(0001.jpg...)은 하지 않습니다.
+# False: 기존과 같이 파일명을 정리한 뒤 모든 이미지를 처음부터 다시 분석합니다.
+INCREMENTAL_BUILD = True
+MANIFEST_VERSION = 3  # 2: 저장소에 keypoints / 자세 위치·크기를 함께 저장, 3: 썸네일도 함께 저장
+IMAGE_EXTENSIONS = ('.jpg', '.png', '.jpeg')
+
+# --- 특징 저장 형식 (feature_codec.py 참고) ---
+# "float32": 기존과 같이 원본 저장 / "float16": 1/2 크기 / "int8": 1/4 크기 / "pq": 벡터당 PQ_SUBSPACES 바이트
+# 형식을 바꾸면 다음 빌드에서 모든 이미지를 다시 분석합니다.
+# int8 / pq 는 학습할 사진이 적으면(feature_codec.MIN_TRAIN_VECTORS) float16 으로 저장해 두었다가,
+# DB 가 충분히 커지면 다시 학습해 기존 항목까지 새로 인코딩합니다. (모델 재분석 없음)
+FEATURE_CODEC = CODEC_FLOAT32
+PQ_SUBSPACES = 64
+
+# --- 중복 사진 제거 (dedup.py 참고) ---
+# True: 배경 특징이 거의 같은(코사인 거리 DUPLICATE_DISTANCE 이하) 사진들은 먼저 들어온 하나만 DB에 남깁니다.
+#       제외한 사진은 화면과 DEDUP_REPORT_PATH 에 기록되며, 대표 사진이 그대로 있는 동안은 다시 분석하지 않습니다.
+#       값을 바꾸면 다음 빌드에서 기존 DB 도 새 기준으로 다시 정리합니다. (모델 재분석 없음)
+DEDUP_MODE = True
+DUPLICATE_DISTANCE = DEFAULT_DUPLICATE_DISTANCE
+DEDUP_REPORT_PATH = "feature_db_dedup_report.json"
+
+# --- 병렬 빌드 설정 ---
+BUILD_WORKERS = os.cpu_count() or 1  # 분석 프로세스 수 (1이면 현재 프로세스에서 순차 처리)
+INTERPRETER_NUM_THREADS = 1          # 프로세스마다 각 Interpreter 가 사용할 스레드 수
+USE_XNNPACK = True                   # XNNPACK delegate(기본 delegate) 사용
+DECODE_THREADS = 2                   # 프로세스마다 이미지 디코딩/리사이즈를 미리 해두는 스레드 수
+BUILD_CHUNK_SIZE = 16                # 한 번에 작업자에게 넘기는 이미지 수
+COMPACT_THRESHOLD = 0.2              # 삭제 표시된 행의 비율이 이 값을 넘으면 저장소를 압축(compact)
+
+# --- 성능 계측 (metrics.py 참고) ---
+# True: 디코딩 / 모델 추론 / 저장소 쓰기 단계별 소요 시간과 처리 건수를 빌드가 끝날 때 파일로 내보냅니다.
+METRICS_ENABLED = False
+METRICS_JSON_PATH = "metrics_build.jsonl"
+METRICS_PROMETHEUS_PATH = "aiguidecam_build.prom"
 
 # --- 자세 인식을 위한 상수 (03번 파일과 동일하게 유지) ---
 KEYPOINT_DICT = {
@@ -46,35 +91,392 @@ def is_pose_valid(keypoints):
     # all() 함수는 모든 조건(신뢰도가 임계값보다 높은지)이 True일 때만 True를 반환합니다.
     return all(keypoints[i][2] > CONFIDENCE_THRESHOLD for i in required_indices)
 
-def run_inference(interpreter, image_bgr, target_size):
+def invoke_model(runner, img_resized):
     """
-    주어진 이미지로 AI 모델 추론을 실행하고 결과를 반환하는 범용 함수.
-    특징 추출 및 자세 인식에 모두 사용됩니다.
+    이미 모델 입력 크기로 맞춘 RGB 이미지로 추론을 실행합니다.
+    입력은 Interpreter 입력 버퍼에 바로 쓰고(float32 모델이면 0~1 정규화), 결과는 보관할 수 있도록 복사해 반환합니다.
     """
-    img_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
-    img_resized = cv2.resize(img_rgb, target_size)
-    input_data = np.expand_dims(img_resized, axis=0)
-    
-    input_details = interpreter.get_input_details()[0]
-    # 모델이 요구하는 입력 데이터 타입이 소수점(FLOAT32) 형태이면,
-    # 데이터 타입을 변환하고 픽셀 값을 0~1로 정규화합니다.
-    if input_details['dtype'] == np.float32:
-        input_data = input_data.astype(np.float32) / 255.0
-        
-    interpreter.set_tensor(input_details['index'], input_data)
-    interpreter.invoke()
-    
-    output_details = interpreter.get_output_details()[0]
-    return np.squeeze(interpreter.get_tensor(output_details['index']))
+    return runner.run_rgb(img_resized).copy()
 
-# --- 3. 메인 실행 로직 ---
-def main():
+def file_sha1(filepath, chunk_size=1 << 20):
+    """파일 내용의 SHA-1 해시를 계산합니다. (이미지 변경 여부 및 모델 버전 판별용)"""
+    h = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def get_model_versions():
+    """
+    현재 사용하는 두 모델 파일의 해시. 모델이 바뀌면 모든 이미지를 다시 분석해야 합니다.
+    특징 저장 형식도 함께 기록하여, 형식을 바꾸면 처음부터 다시 만들게 합니다. (기본 형식은 기록하지 않음)
+    """
+    versions = {'feature': file_sha1(FEATURE_MODEL_PATH), 'pose': file_sha1(POSE_MODEL_PATH)}
+    if FEATURE_CODEC != CODEC_FLOAT32:
+        versions['feature_codec'] = f"{FEATURE_CODEC}:{PQ_SUBSPACES}" if FEATURE_CODEC == CODEC_PQ else FEATURE_CODEC
+    return versions
+
+def load_manifest():
+    """매니페스트 파일을 읽습니다. 없거나 손상되었으면 None 을 반환합니다."""
+    if not os.path.exists(MANIFEST_PATH):
+        return None
+    try:
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"!!! 경고: 매니페스트를 읽을 수 없어 전체 재구축합니다: {e}")
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+def save_manifest(model_versions, entries):
+    """매니페스트를 임시 파일에 쓴 뒤 교체하여, 중간에 중단되어도 기존 파일이 깨지지 않게 합니다."""
+    manifest = {'version': MANIFEST_VERSION, 'models': model_versions, 'dedup': dedup_setting(), 'entries': entries}
+    tmp_path = MANIFEST_PATH + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def load_models(num_threads=None):
+    """배경 특징 추출 모델과 자세 인식 모델을 로드하여 (특징, 자세) ModelRunner 로 반환합니다. (runner.input_size 로 입력 크기 확인)"""
+    feature_runner = ModelRunner(create_interpreter(FEATURE_MODEL_PATH, num_threads, USE_XNNPACK), "feature")
+    pose_runner = ModelRunner(create_interpreter(POSE_MODEL_PATH, num_threads, USE_XNNPACK), "pose")
+    return feature_runner, pose_runner
+
+def dedup_setting():
+    """매니페스트에 기록하는 중복 제거 기준. 꺼져 있으면 None."""
+    return DUPLICATE_DISTANCE if DEDUP_MODE else None
+
+def append_to_store(store, valid_results):
+    """
+    유효한 사진들의 분석 결과 [(파일 경로, keypoints, 특징 벡터, 이미지 크기, 썸네일)] 를 저장소 끝에 추가합니다.
+    특징 벡터와 함께 keypoints, 유효 점 마스크, 자세 중심/크기, 썸네일도 저장하여
+    웹캠 스크립트가 원본 이미지를 다시 읽거나 분석하지 않고 조회만 하면 되게 합니다. (기존 행은 다시 쓰지 않음)
+    중복 제거가 켜져 있으면 저장소에 이미 있는 항목 및 앞선 사진과 거의 같은 사진은 추가하지 않고,
+    그 목록을 [(제외한 파일 경로, 대표 파일 경로, 유사도)] 로 반환합니다.
+    """
+    if not valid_results:
+        return []
+    filepaths, keypoints, features, shapes, thumbnails = zip(*valid_results)
+    features = np.array(features, dtype=np.float32)
+    codec = prepare_codec(store, features)
+    dropped = []
+    if DEDUP_MODE:
+        with metrics.span('dedup'):
+            rows = store.alive_indices()
+            reference = RowSubset(store.column(codec.column), rows) if len(rows) and store.has_column(codec.column) else None
+            keep, duplicate_of, similarity = dedup_features(codec, features, reference, DUPLICATE_DISTANCE)
+        if not keep.all():
+            paths = store.filepaths
+            for i in np.flatnonzero(~keep):
+                j = duplicate_of[i]
+                representative = paths[rows[j]] if j < len(rows) else filepaths[j - len(rows)]
+                dropped.append((filepaths[i], representative, float(similarity[i])))
+            keep_list = keep.tolist()
+            filepaths, keypoints, shapes, thumbnails = ([v for v, k in zip(values, keep_list) if k]
+                                                        for values in (filepaths, keypoints, shapes, thumbnails))
+            features = features[keep]
+        metrics.count('images_duplicate', len(dropped))
+    if not filepaths:
+        return dropped
+    with metrics.span('db_write'):
+        ensure_pose_columns(store)
+        ensure_thumbnail_columns(store)
+        store.append_many(filepaths, **store_columns(codec, features),
+                          **pose_columns(keypoints, shapes), **thumbnail_columns(thumbnails))
+    return dropped
+
+def dedup_existing(store):
+    """
+    저장소에 이미 있는 항목들끼리 중복을 찾아 삭제 표시합니다. (중복 제거 기준이 바뀌었을 때)
+    저장소 행 순서(먼저 추가된 항목)가 대표가 되며, [(제외한 파일 경로, 대표 파일 경로, 유사도)] 를 반환합니다.
+    """
+    codec = load_codec(store)
+    rows = store.alive_indices()
+    if len(rows) < 2 or not store.has_column(codec.column):
+        return []
+    with metrics.span('dedup'):
+        keep, duplicate_of, similarity = find_duplicates(codec, RowSubset(store.column(codec.column), rows),
+                                                         threshold=DUPLICATE_DISTANCE)
+    paths = store.filepaths
+    dropped = [(paths[rows[i]], paths[rows[duplicate_of[i]]], float(similarity[i])) for i in np.flatnonzero(~keep)]
+    store.delete(rows[~keep])
+    metrics.count('images_duplicate', len(dropped))
+    return dropped
+
+def report_duplicates(dropped, entries):
+    """
+    중복으로 제외한 사진을 출력하고 DEDUP_REPORT_PATH 에 기록합니다.
+    매니페스트 항목에는 대표 사진을 남겨, 대표가 그대로 있는 동안은 다시 분석하지 않게 합니다.
+    """
+    for filepath, representative, similarity in dropped:
+        entry = entries.get(os.path.basename(filepath))
+        if entry is not None:
+            entry['valid'] = False
+            entry['duplicate_of'] = os.path.basename(representative)
+        print(f"  [=] 중복 제외: {os.path.basename(filepath)} ~ {os.path.basename(representative)} (유사도 {similarity:.4f})")
+    if dropped:
+        print(f" - 거의 같은 사진 {len(dropped)}개를 DB에서 제외했습니다. (기준: 코사인 거리 {DUPLICATE_DISTANCE} 이하, "
+              f"목록: '{DEDUP_REPORT_PATH}')")
+    report = {'threshold_distance': DUPLICATE_DISTANCE,
+              'dropped': [{'path': p, 'duplicate_of': r, 'similarity': s} for p, r, s in dropped]}
+    tmp_path = DEDUP_REPORT_PATH + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, DEDUP_REPORT_PATH)
+
+def train_feature_codec(features):
+    with metrics.span('codec_train'):
+        kwargs = {'subspaces': PQ_SUBSPACES} if FEATURE_CODEC == CODEC_PQ else {}
+        codec = train_codec(FEATURE_CODEC, features, **kwargs)
+    if codec.kind != FEATURE_CODEC:
+        print(f" - 학습할 특징이 {len(features)}개뿐이라 '{FEATURE_CODEC}' 대신 '{codec.kind}' 형식으로 저장합니다. "
+              f"(DB 가 커지면 다시 학습)")
+    return codec
+
+def prepare_codec(store, features):
+    """
+    특징을 저장할 코덱을 준비합니다. 비어 있는 저장소(전체 재구축)이면 이번에 추가할 특징들로
+    FEATURE_CODEC 형식을 새로 학습해 저장하고, 아니면 저장소에 있는 코덱을 씁니다.
+    저장소가 학습 때보다 충분히 커졌으면(feature_codec.needs_retraining) 다시 학습하고 기존 코드도 새로 인코딩합니다.
+    """
+    if store.count == 0:
+        codec = train_feature_codec(features)
+        save_codec(store, codec)
+        return codec
+    codec = load_codec(store)
+    if needs_retraining(codec, FEATURE_CODEC, len(store) + len(features)):
+        codec = retrain_codec(store, codec, features)
+    return codec
+
+def retrain_codec(store, old_codec, features):
+    """
+    저장소에 있는 코드(풀어낸 값)와 이번에 추가할 원본 특징으로 코덱을 다시 학습하고,
+    저장소를 압축하면서 살아있는 행의 코드를 새 코덱으로 다시 인코딩합니다.
+    """
+    rows = store.alive_indices()
+    if len(rows) > PQ_TRAIN_SAMPLES:
+        rows = np.sort(np.random.default_rng(0).choice(rows, PQ_TRAIN_SAMPLES, replace=False))
+    stored = old_codec.decode(search_codes(old_codec, store.column(old_codec.column)[rows]))
+    codec = train_feature_codec(np.concatenate([stored, features]))
+    reencode = lambda block: store_columns(codec, old_codec.decode(search_codes(old_codec, block)))[codec.column]
+    sample_codes = store_columns(codec, features[:1])[codec.column]
+    with metrics.span('codec_reencode'):
+        # 코드 열은 압축과 함께 새 세대 파일로 한 번에 교체되며, 바로 이어서 새 코덱 설정을 저장합니다.
+        store.compact(transforms={codec.column: (sample_codes.dtype, sample_codes.shape[1:], reencode)})
+        save_codec(store, codec)
+    print(f" - 특징 저장 형식을 다시 학습했습니다: {old_codec.kind} ({old_codec.trained_count}개) -> "
+          f"{codec.kind} ({codec.trained_count}개), 기존 {len(store)}개 항목을 새로 인코딩")
+    return codec
+
+def compact_if_needed(store):
+    if store.deleted_ratio() > COMPACT_THRESHOLD:
+        with metrics.span('db_compact'):
+            store.compact()
+        print(f" - 삭제된 항목을 정리하여 저장소를 압축했습니다. (남은 항목 {len(store)}개)")
+
+# --- 3. 병렬 분석 엔진 ---
+# 작업자 프로세스마다 자신만의 자세/특징 Interpreter 를 하나씩 가지며,
+# 프로세스 안에서는 디코딩 스레드가 다음 이미지를 미리 읽고 리사이즈해 둡니다.
+_worker_models = None
+
+def _init_worker(num_threads, metrics_enabled=False):
+    """작업자 프로세스 초기화: 모델을 한 번만 로드합니다. 실패하면 예외를 보관했다가 작업 시 전달합니다."""
+    global _worker_models
+    # 작업자의 측정값은 묶음마다 꺼내서 메인 프로세스로 돌려보냅니다. (파일로 직접 내보내지 않음)
+    metrics.configure(enabled=metrics_enabled)
+    try:
+        _worker_models = load_models(num_threads)
+    except Exception as e:
+        _worker_models = e
+
+def decode_image(filepath, pose_input_size, feature_input_size):
+    """
+    (디코딩 스레드) 이미지를 읽어 두 모델의 입력 크기로 각각 리사이즈한 뒤 RGB 로 바꿉니다.
+    큰 원본 대신 줄인 이미지에서만 색 변환을 하며, 결과는 원본을 변환한 뒤 줄인 것과 같습니다.
+    썸네일용으로는 원본 대신 화면 크기로 줄인 이미지만 넘겨 메모리에 큰 원본이 쌓이지 않게 합니다.
+    """
+    with metrics.span('decode'):
+        image = cv2.imread(filepath)
+        if image is None:
+            return None
+        pose_input = cv2.cvtColor(cv2.resize(image, pose_input_size), cv2.COLOR_BGR2RGB)
+        feature_input = cv2.cvtColor(cv2.resize(image, feature_input_size), cv2.COLOR_BGR2RGB)
+        return pose_input, feature_input, image.shape, shrink_for_thumbnails(image)
+
+def _analyze_chunk(filepaths):
+    """
+    이미지 묶음을 분석하여 [(파일 경로, 자세 keypoints, 특징 벡터, 원본 이미지 크기, 썸네일)] 를 입력 순서대로 반환합니다.
+    읽을 수 없는 이미지는 keypoints 가 None, 자세가 유효하지 않은 이미지는 특징 벡터와 썸네일이 None 입니다.
+    이 묶음을 처리하며 모은 계측 값도 함께 반환합니다.
+    """
+    if isinstance(_worker_models, Exception):
+        raise RuntimeError(f"AI 모델 로드 실패: {_worker_models}")
+    feature_runner, pose_runner = _worker_models
+    results = []
+    with ThreadPoolExecutor(max_workers=DECODE_THREADS) as decoder:
+        decoded = decoder.map(decode_image, filepaths, repeat(pose_runner.input_size), repeat(feature_runner.input_size))
+        for filepath, inputs in zip(filepaths, decoded):
+            if inputs is None:
+                results.append((filepath, None, None, None, None))
+                continue
+            pose_input, feature_input, shape, preview = inputs
+            keypoints = invoke_model(pose_runner, pose_input)
+            features, thumbnails = None, None
+            if is_pose_valid(keypoints):
+                features = invoke_model(feature_runner, feature_input)
+                with metrics.span('thumbnails'):
+                    thumbnails = make_thumbnails(preview, keypoints)
+            results.append((filepath, keypoints, features, shape, thumbnails))
+    return results, metrics.drain()
+
+def analyze_images(filepaths):
+    """
+    주어진 이미지들을 (가능하면 여러 프로세스에서 병렬로) 분석합니다.
+    결과는 작업자 수와 관계없이 항상 입력 순서대로 나오므로 DB 내용이 결정적입니다.
+    모델 로드에 실패하면 RuntimeError 를 발생시킵니다.
+    """
+    chunks = [filepaths[i:i + BUILD_CHUNK_SIZE] for i in range(0, len(filepaths), BUILD_CHUNK_SIZE)]
+    workers = min(BUILD_WORKERS, len(chunks))
+    print(f" - 분석 프로세스 {max(workers, 1)}개, 프로세스당 Interpreter 스레드 {INTERPRETER_NUM_THREADS}개 사용")
+    if workers <= 1:
+        _init_worker(INTERPRETER_NUM_THREADS, metrics.enabled)
+        for chunk in chunks:
+            results, chunk_metrics = _analyze_chunk(chunk)
+            metrics.merge(chunk_metrics)
+            yield from results
+        return
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(INTERPRETER_NUM_THREADS, metrics.enabled)) as pool:
+        for results, chunk_metrics in pool.imap(_analyze_chunk, chunks):
+            metrics.merge(chunk_metrics)
+            yield from results
+
+def report_result(filepath, keypoints, features):
+    """분석 결과 한 건을 기존과 같은 형식으로 출력합니다."""
+    metrics.count('images_analyzed')
+    if keypoints is None:
+        metrics.count('images_unreadable')
+        print(f"!!! 경고: '{filepath}' 파일을 읽을 수 없어 건너뜁니다.")
+    elif features is not None:
+        metrics.count('images_valid')
+        print(f"  [O] 유효한 자세 확인: {os.path.basename(filepath)} -> 특징 추출 진행")
+    else:
+        print(f"  [X] 유효하지 않은 자세: {os.path.basename(filepath)} -> DB에서 제외합니다.")
+
+# --- 4. 메인 실행 로직 ---
+def build_incremental():
+    """
+    매니페스트 기반 증분 빌드:
+    1. db_images 폴더의 이미지를 (파일명 변경 없이) 매니페스트와 비교합니다.
+       크기/수정 시각이 같으면 그대로 두고, 다르면 내용 해시로 실제 변경 여부를 확인합니다.
+    2. 새로 추가되었거나 내용이 바뀐 이미지만 자세 검사 및 특징 추출을 수행합니다.
+    3. 폴더에서 사라진 이미지는 DB와 매니페스트에서 제거합니다.
+    4. 모델 파일이 바뀌었거나 매니페스트가 없으면 모든 이미지를 다시 분석합니다.
+    """
+    print(">>> [증분 DB 빌드 모드]를 시작합니다.")
+
+    if not os.path.isdir(DB_IMAGE_DIR):
+        print(f"!!! 오류: '{DB_IMAGE_DIR}' 폴더를 찾을 수 없습니다."); return
+
+    filenames = sorted(f for f in os.listdir(DB_IMAGE_DIR) if f.lower().endswith(IMAGE_EXTENSIONS))
+    model_versions = get_model_versions()
+    manifest = load_manifest()
+    store = open_store(OUTPUT_DB_DIR, LEGACY_DB_PATH)
+    old_entries = {}
+    existing_rows = {}
+    dedup_changed = manifest is not None and manifest.get('dedup') != dedup_setting()
+    if manifest is None:
+        print(" - 매니페스트가 없어 모든 이미지를 분석합니다.")
+    elif manifest.get('models') != model_versions:
+        print(" - 모델 파일이 변경되어 모든 이미지를 다시 분석합니다.")
+    else:
+        old_entries = manifest.get('entries', {})
+        existing_rows = store.rows_by_path()
+
+    # --- 단계 1: 변경 사항 확인 ---
+    print("\n--- 단계 1: 변경된 이미지 확인 ---")
+    entries, to_process = {}, []
+    to_process_set = set()
+    for filename in filenames:
+        filepath = os.path.join(DB_IMAGE_DIR, filename)
+        stat = os.stat(filepath)
+        old = old_entries.get(filename)
+        if old is not None and old['size'] == stat.st_size and old['mtime'] == stat.st_mtime:
+            entries[filename] = old
+            continue
+        sha1 = file_sha1(filepath)
+        if old is not None and old['sha1'] == sha1:
+            entries[filename] = dict(old, size=stat.st_size, mtime=stat.st_mtime)
+            continue
+        entries[filename] = {'sha1': sha1, 'size': stat.st_size, 'mtime': stat.st_mtime, 'valid': False}
+        to_process.append(filename); to_process_set.add(filename)
+
+    # 유효한 항목인데 저장소에 특징이 없는 경우(저장소 삭제 등)에도 다시 분석합니다.
+    for filename, entry in entries.items():
+        if entry['valid'] and filename not in to_process_set and os.path.join(DB_IMAGE_DIR, filename) not in existing_rows:
+            to_process.append(filename); to_process_set.add(filename)
+    removed = [f for f in old_entries if f not in entries]
+
+    # 그대로 유지할 항목을 제외한 저장소의 나머지 행(삭제/변경된 이미지, 매니페스트에 없던 캡처 등)은 삭제 대상입니다.
+    keep_paths = {os.path.join(DB_IMAGE_DIR, f) for f, e in entries.items() if e['valid'] and f not in to_process_set}
+    stale_rows = [row for path, row in existing_rows.items() if path not in keep_paths]
+
+    # 중복으로 제외했던 사진은 대표 사진이 없어졌거나 바뀌었을 때, 또는 중복 기준이 바뀌었을 때 다시 분석합니다.
+    for filename, entry in entries.items():
+        representative = entry.get('duplicate_of')
+        if representative and filename not in to_process_set and (
+                dedup_changed or os.path.join(DB_IMAGE_DIR, representative) not in keep_paths):
+            to_process.append(filename); to_process_set.add(filename)
+    print(f" - 전체 {len(filenames)}개 / 처리 대상 {len(to_process)}개 / 삭제됨 {len(removed)}개")
+
+    # --- 단계 2: 새 이미지 분석 ---
+    new_results = []
+    if to_process:
+        print("\n--- 단계 2: AI 모델 로드 및 새 이미지 분석 ---")
+        try:
+            for result in analyze_images([os.path.join(DB_IMAGE_DIR, f) for f in to_process]):
+                filepath, keypoints, features = result[:3]
+                report_result(filepath, keypoints, features)
+                entries[os.path.basename(filepath)]['valid'] = features is not None
+                entries[os.path.basename(filepath)].pop('duplicate_of', None)
+                if features is not None:
+                    new_results.append(result)
+        except Exception as e:
+            print(f"!!! {e}"); return
+
+    if not to_process and not stale_rows and not dedup_changed and manifest is not None:
+        save_manifest(model_versions, entries)  # 수정 시각 갱신만 반영
+        print("\n>>> 변경된 이미지가 없습니다. DB가 이미 최신 상태입니다.")
+        return
+
+    # --- 단계 3: 저장소 갱신 (변경분만 기록) ---
+    if manifest is None or manifest.get('models') != model_versions:
+        store.reset()
+    else:
+        store.delete(stale_rows)
+    dropped = dedup_existing(store) if dedup_changed and DEDUP_MODE else []
+    dropped += append_to_store(store, new_results)
+    if DEDUP_MODE:
+        report_duplicates(dropped, entries)
+    compact_if_needed(store)
+    save_manifest(model_versions, entries)
+
+    if len(store):
+        new_paths = {result[0] for result in new_results}
+        added = len(new_results) - sum(path in new_paths for path, _, _ in dropped)
+        print(f"\n>>> 증분 빌드 완료! '{OUTPUT_DB_DIR}' 저장소를 갱신했습니다. (추가 {added}개, 제거 {len(stale_rows)}개)")
+        print(f" - 총 {len(filenames)}개의 이미지 중 {len(store)}개가 DB에 저장되어 있습니다.")
+    else:
+        print("\n>>> 유효한 자세를 가진 이미지가 하나도 없어 DB가 비어 있습니다.")
+
+def build_full():
     """
     이 스크립트의 역할:
     1. db_images 폴더의 모든 이미지 파일명을 0001.jpg, 0002.jpg 등으로 순서대로 변경합니다.
     2. 모든 이미지에 대해 '자세 인식'을 먼저 수행합니다.
     3. 얼굴(눈,코,귀)이 명확하게 인식되는 '유효한' 이미지만 선별합니다.
-    4. 선별된 유효한 이미지들에 대해서만 '배경 특징'을 추출하여 최종 DB 파일(feature_db.npz)로 저장합니다.
+    4. 선별된 유효한 이미지들에 대해서만 '배경 특징'을 추출하여 최종 DB 저장소(feature_db/)에 저장합니다.
     """
     print(">>> [자세 검증 포함 DB 재구축 모드]를 시작합니다.")
     
@@ -83,7 +485,7 @@ def main():
 
     # --- 단계 1: 파일명 변경 작업 ---
     print("\n--- 단계 1: 이미지 파일명 일괄 변경 ---")
-    current_files = sorted([f for f in os.listdir(DB_IMAGE_DIR) if f.lower().endswith(('.jpg', '.png', '.jpeg'))])
+    current_files = sorted([f for f in os.listdir(DB_IMAGE_DIR) if f.lower().endswith(IMAGE_EXTENSIONS)])
     if not current_files:
         print("!!! db_images 폴더에 분석할 이미지가 없습니다."); return
     
@@ -99,57 +501,52 @@ def main():
         renamed_filepaths.append(new_filepath)
     print(f" - 총 {len(renamed_filepaths)}개 파일의 이름을 순서대로 정리했습니다.")
 
-    # --- 단계 2: AI 모델 로드 ---
-    print("\n--- 단계 2: AI 모델 로드 ---")
+    # --- 단계 2~3: AI 모델 로드, 유효성 검사 및 특징 추출 ---
+    # 각 작업자가 모델을 로드한 뒤, (1) 자세 인식 -> (2) 자세 유효성 검사 (눈, 코, 귀가 모두 인식되었는지)
+    # -> (3) 유효한 사진에 대해서만 배경 특징 추출 순서로 처리합니다.
+    print("\n--- 단계 2: 자세 유효성 검사 및 특징 추출 시작 ---")
+    valid_results = []
+    entries = {}
+    for filepath in renamed_filepaths:
+        stat = os.stat(filepath)
+        entries[os.path.basename(filepath)] = {'sha1': file_sha1(filepath), 'size': stat.st_size, 'mtime': stat.st_mtime, 'valid': False}
+
     try:
-        feature_interpreter = Interpreter(model_path=FEATURE_MODEL_PATH); feature_interpreter.allocate_tensors()
-        pose_interpreter = Interpreter(model_path=POSE_MODEL_PATH); pose_interpreter.allocate_tensors()
+        for result in analyze_images(renamed_filepaths):
+            filepath, keypoints, features = result[:3]
+            report_result(filepath, keypoints, features)
+            if features is not None:
+                entries[os.path.basename(filepath)]['valid'] = True
+                valid_results.append(result)
     except Exception as e:
-        print(f"!!! AI 모델 로드 실패: {e}"); return
-    
-    # 각 모델이 요구하는 입력 이미지 크기를 가져옴
-    feature_input_details = feature_interpreter.get_input_details()[0]
-    feature_input_size = (feature_input_details['shape'][2], feature_input_details['shape'][1])
-    pose_input_details = pose_interpreter.get_input_details()[0]
-    pose_input_size = (pose_input_details['shape'][2], pose_input_details['shape'][1])
-    print(" - 배경 특징 추출 모델 및 자세 인식 모델 로드 완료.")
-
-    # --- 단계 3: 유효성 검사 및 특징 추출 ---
-    print("\n--- 단계 3: 자세 유효성 검사 및 특징 추출 시작 ---")
-    all_features = []
-    all_filepaths = []
-    
-    # 이름이 변경된 모든 파일을 하나씩 처리
-    for filepath in renamed_filepaths:
-        image = cv2.imread(filepath)
-        if image is None:
-            print(f"!!! 경고: '{filepath}' 파일을 읽을 수 없어 건너뜁니다.")
-            continue
-        
-        # (1) 자세 인식 먼저 수행
-        keypoints = run_inference(pose_interpreter, image, pose_input_size)
-        
-        # (2) 자세 유효성 검사 (눈, 코, 귀가 모두 인식되었는지)
-        if is_pose_valid(keypoints):
-            print(f"  [O] 유효한 자세 확인: {os.path.basename(filepath)} -> 특징 추출 진행")
-            # (3) 유효한 사진에 대해서만 배경 특징 추출 수행
-            features = run_inference(feature_interpreter, image, feature_input_size)
-            all_features.append(features)
-            all_filepaths.append(filepath)
-        else:
-            print(f"  [X] 유효하지 않은 자세: {os.path.basename(filepath)} -> DB에서 제외합니다.")
-
-    # --- 단계 4: 최종 결과 저장 ---
-    if all_features:
-        # 유효한 사진들의 특징 벡터와 파일 경로를 .npz 파일로 압축 저장
-        np.savez(OUTPUT_DB_PATH, features=np.array(all_features), filepaths=np.array(all_filepaths))
-        print(f"\n>>> DB 재구축 완료! '{OUTPUT_DB_PATH}' 파일이 새로 생성되었습니다.")
-        print(f" - 총 {len(renamed_filepaths)}개의 이미지 중 {len(all_filepaths)}개가 유효하여 DB에 최종 저장되었습니다.")
+        print(f"!!! {e}"); return
+
+    # --- 단계 3: 최종 결과 저장 ---
+    store = open_store(OUTPUT_DB_DIR, legacy_npz_path=None)
+    store.reset()
+    dropped = append_to_store(store, valid_results)
+    if DEDUP_MODE:
+        report_duplicates(dropped, entries)
+    if valid_results:
+        print(f"\n>>> DB 재구축 완료! '{OUTPUT_DB_DIR}' 저장소가 새로 생성되었습니다.")
+        print(f" - 총 {len(renamed_filepaths)}개의 이미지 중 {len(valid_results) - len(dropped)}개가 유효하여 DB에 최종 저장되었습니다.")
     else:
-        print("\n>>> 유효한 자세를 가진 이미지가 하나도 없어 DB 파일을 생성하지 않았습니다.")
-        # 기존 DB 파일이 있다면 삭제하여 혼동을 방지
-        if os.path.exists(OUTPUT_DB_PATH):
-            os.remove(OUTPUT_DB_PATH)
+        print("\n>>> 유효한 자세를 가진 이미지가 하나도 없어 DB가 비어 있습니다.")
+    # 다음 증분 빌드가 이번 결과를 재사용할 수 있도록 매니페스트를 기록
+    save_manifest(get_model_versions(), entries)
+
+def main():
+    if METRICS_ENABLED:
+        metrics.configure(json_path=METRICS_JSON_PATH, prometheus_path=METRICS_PROMETHEUS_PATH)
+    with metrics.span('build'):
+        if INCREMENTAL_BUILD:
+            build_incremental()
+        else:
+            build_full()
+    if METRICS_ENABLED:
+        store = open_store(OUTPUT_DB_DIR, legacy_npz_path=None)
+        metrics.gauge('db_size', len(store))
+        metrics.export()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
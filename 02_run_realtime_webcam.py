@@ -1,21 +1,30 @@
+import time
+STARTUP_START = time.perf_counter()  # 시작 시간 보고용 (모듈 import 시간 포함)
 import os
 import cv2
 import numpy as np
-from scipy.spatial.distance import cosine
-import time
-from PIL import ImageFont, ImageDraw, Image
-
-# --- TensorFlow Lite Interpreter 로드 ---
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
-try:
-    from tflite_runtime.interpreter import Interpreter
-except ImportError:
-    from tensorflow.lite.python.interpreter import Interpreter
+from PIL import ImageFont
+from search_index import FeatureIndex, SEARCH_MODE_AUTO
+from feature_store import open_store
+from pose_utils import pose_columns, ensure_pose_columns, stored_pose, draw_pose_on_image, pose_center_and_size
+from thumbnails import THUMBNAIL_SIZE, make_thumbnails, thumbnail_columns, ensure_thumbnail_columns, stored_thumbnail, stored_guide_thumbnail
+from realtime_pipeline import FrameGrabber, InferenceWorker
+from text_renderer import TextSpriteCache
+from frame_buffers import FrameBufferPool, MaskedOverlay
+from pose_tracking import PoseTracker
+from pose_rerank import PoseReranker
+from feature_codec import store_columns
+from dedup import DEFAULT_DUPLICATE_DISTANCE, find_capture_duplicate
+from scene_suggestions import LiveSuggestions, MIN_SEARCH_INTERVAL_S
+from metrics import metrics
+# TensorFlow Lite Interpreter 는 model_loader 가 처음 모델을 만들 때 import 합니다. (tflite_runtime 이 없으면 TensorFlow)
+from model_loader import BackgroundModelLoader
 
 # --- 1. 설정 및 상수 정의 ---
 
 # --- 파일 경로 ---
-DB_PATH = "feature_db.npz"
+DB_DIR = "feature_db"  # 01_build_feature_db.py 가 만드는 추가 전용 특징 저장소
+LEGACY_DB_PATH = "feature_db.npz"  # 예전 형식의 DB. 저장소가 없으면 자동으로 가져옵니다.
 DB_IMAGE_DIR = "db_images"
 FEATURE_MODEL_PATH = "models/feature_extractor.tflite"
 POSE_MODEL_PATH = "models/pose_model.tflite"
@@ -36,13 +45,58 @@ except IOError:
 
 # --- AI 모델 파라미터 ---
 TOP_K = 5  # DB에서 배경이 유사한 상위 5개를 바로 사용
+SEARCH_INDEX_MODE = SEARCH_MODE_AUTO  # "exact": 정확한 검색, "ivf": 대용량 DB용 근사 검색, "auto": 크기에 따라 자동
 CONFIDENCE_THRESHOLD = 0.3
+# 하이브리드 검색: 배경이 비슷한 후보를 넉넉히 찾은 뒤, 현재 화면 속 사람의 자세/구도와 비슷한 순서로 다시 정렬합니다.
+# (저장소에 미리 계산된 자세 정보를 사용하므로 후보마다 모델을 다시 돌리지 않습니다. pose_rerank.py 참고)
+HYBRID_SEARCH_MODE = True
+HYBRID_CANDIDATES = 50        # 재정렬할 배경 후보 수
+HYBRID_BACKGROUND_WEIGHT = 1.0
+HYBRID_POSE_WEIGHT = 0.3      # 자세 모양(정규화된 keypoint) 거리 가중치
+HYBRID_FRAMING_WEIGHT = 0.3   # 화면 안 위치/크기 거리 가중치
+
+# 'k' 로 저장할 때 DB에 배경이 거의 같은(코사인 거리 DUPLICATE_DISTANCE 이하) 사진이 있으면 추가하지 않습니다. (dedup.py 참고)
+CAPTURE_DEDUP_MODE = True
+DUPLICATE_DISTANCE = DEFAULT_DUPLICATE_DISTANCE  # 01_build_feature_db.py 와 같은 기준
+
+# 실시간 배경 추천: 검색 모드에서 's' 를 누르지 않아도 화면 아래에 추천 사진을 계속 보여주고, 숫자 키로 바로 고를 수 있습니다.
+# 배경이 실제로 바뀌었을 때만(장면 서명 비교) 별도 스레드에서 특징 추출 + 검색을 하므로 화면이 멈추지 않습니다. (scene_suggestions.py 참고)
+# 실시간 추천은 배경 유사도만으로 정렬합니다. 자세까지 반영한 하이브리드 검색은 기존처럼 's' 로 실행합니다.
+LIVE_SUGGESTION_MODE = True
+SUGGESTION_MIN_INTERVAL_S = MIN_SEARCH_INTERVAL_S  # 특징 추출 최소 간격 (초)
+SUGGESTION_THUMBNAIL_WIDTH = 160
+SUGGESTION_THUMBNAIL_HEIGHT = 120
+
+# --- 실시간 처리 방식 ---
+# True: 캡처 / 자세 추론 / 화면 출력을 별도 스레드로 분리합니다. 추론이 느려도 화면은 카메라 속도로 갱신되고,
+#       자세 가이드는 모델이 허용하는 속도로 갱신됩니다. (가장 최신 프레임만 처리, 오래된 프레임은 버림)
+# False: 기존처럼 한 루프에서 순서대로 처리합니다.
+PIPELINED_MODE = True
+# True: 실시간 가이드 중 이전 keypoint 주변 영역만 잘라 추론하고(ROI 추적), One-Euro 필터로 떨림을 줄이며,
+#       화면 움직임이 거의 없을 때는 추론을 건너뜁니다. (pose_tracking.py 참고)
+POSE_TRACKING_MODE = True
+
+# --- 빠른 시작 (model_loader.py 참고) ---
+# True: 카메라를 먼저 열어 첫 화면을 바로 보여주고, 모델 로드와 예열(첫 invoke)은 백그라운드에서 진행합니다.
+#       모델이 필요한 키('s', 'k')를 그 전에 누르면 준비될 때까지 기다립니다.
+# False: 기존처럼 모든 모델이 준비된 뒤에 카메라를 엽니다.
+FAST_START_MODE = True
+INTERPRETER_NUM_THREADS = 2  # Interpreter 마다 사용할 스레드 수 (XNNPACK 도 이 값을 따름)
+USE_XNNPACK = True           # XNNPACK delegate(기본 delegate) 사용
+WARMUP_RUNS = 1              # 시작 시 미리 실행해 둘 invoke 횟수
+
+# --- 성능 계측 (metrics.py 참고) ---
+# True: 단계별 소요 시간, 버린 프레임 수, DB 크기를 모아 METRICS_EXPORT_INTERVAL 초마다 파일로 내보냅니다.
+METRICS_ENABLED = False
+METRICS_JSON_PATH = "metrics_webcam.jsonl"        # 롤링 JSON 로그 (None 이면 쓰지 않음)
+METRICS_PROMETHEUS_PATH = "aiguidecam_webcam.prom"  # Prometheus 텍스트 파일 (None 이면 쓰지 않음)
+METRICS_EXPORT_INTERVAL = 5.0
 
 # --- UI/UX 설정 ---
-THUMBNAIL_WIDTH = 320
-THUMBNAIL_HEIGHT = 240
-GUIDE_THUMBNAIL_WIDTH = 160
-GUIDE_THUMBNAIL_HEIGHT = 120
+TEXT_SPRITE_CACHE_SIZE = 128  # 미리 그려 둘 (문자열, 폰트, 색상) 글자 이미지의 최대 개수
+THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT = THUMBNAIL_SIZE  # 검색 결과 창 크기는 DB 빌드 시 저장되는 썸네일 크기를 따름
+GUIDE_PREVIEW_WIDTH = 640   # 가이드 선택 확인 창 크기 (저장된 썸네일을 키워서 자세를 그림)
+GUIDE_PREVIEW_HEIGHT = 480
 
 # --- 프로그램 상태 관리 ---
 MODE_SEARCHING = 0
@@ -55,53 +109,43 @@ KEYPOINT_DICT = {
     'left_wrist': 9, 'right_wrist': 10, 'left_hip': 11, 'right_hip': 12,
     'left_knee': 13, 'right_knee': 14, 'left_ankle': 15, 'right_ankle': 16
 }
-REV_KEYPOINT_DICT = {v: k for k, v in KEYPOINT_DICT.items()}
-CONNECTIONS = [(5, 6), (5, 7), (6, 8), (7, 9), (8, 10), (5, 11), (6, 12), (11, 12), (11, 13), (12, 14), (13, 15), (14, 16)]
-KEYPOINT_COLORS = {
-    'nose': (255, 255, 0), 'left_eye': (0, 0, 255), 'right_eye': (0, 0, 255),
-    'left_ear': (0, 255, 0), 'right_ear': (0, 255, 0), 'left_shoulder': (255, 0, 0),
-    'right_shoulder': (255, 0, 0), 'left_elbow': (255, 0, 255), 'right_elbow': (255, 0, 255),
-    'left_wrist': (0, 255, 255), 'right_wrist': (0, 255, 255), 'left_hip': (255, 128, 0),
-    'right_hip': (255, 128, 0), 'left_knee': (128, 0, 255), 'right_knee': (128, 0, 255),
-    'left_ankle': (255, 255, 255), 'right_ankle': (255, 255, 255),
-}
-CONNECTION_COLOR = (192, 192, 192)
 
 # --- 2. AI 모델 추론 및 처리 함수 ---
 
 # --- [삭제] is_pose_valid 함수는 더 이상 03파일에서 필요 없음 ---
 
-def get_pose_center_and_size(keypoints, img_shape):
-    h, w = img_shape[:2]
-    valid_keypoints = [kp for kp in keypoints if kp[2] > CONFIDENCE_THRESHOLD]
-    print(f"\rDetected valid keypoints: {len(valid_keypoints)}   ", end="")
-    if len(valid_keypoints) < 2:
-        return None, None
-    points_x = [kp[1] * w for kp in valid_keypoints]
-    points_y = [kp[0] * h for kp in valid_keypoints]
-    min_x, max_x = min(points_x), max(points_x)
-    min_y, max_y = min(points_y), max(points_y)
-    center_x = (min_x + max_x) / 2
-    center_y = (min_y + max_y) / 2
-    size = (max_x - min_x) * (max_y - min_y)
-    return (center_x, center_y), size
-
-def run_inference_on_frame(interpreter, image_bgr, target_size):
-    img_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
-    img_resized = cv2.resize(img_rgb, target_size)
-    input_data = np.expand_dims(img_resized, axis=0)
-    input_details = interpreter.get_input_details()[0]
-    if input_details['dtype'] == np.float32:
-        input_data = input_data.astype(np.float32) / 255.0
-    interpreter.set_tensor(input_details['index'], input_data)
-    interpreter.invoke()
-    output_details = interpreter.get_output_details()[0]
-    return np.squeeze(interpreter.get_tensor(output_details['index']))
-
-def find_similar_images(features, db_data, limit):
-    distances = [cosine(features, db_feature) for db_feature in db_data['features']]
-    sorted_indices = np.argsort(distances)
-    return [{'path': db_data['filepaths'][i], 'distance': distances[i]} for i in sorted_indices[:limit]]
+def run_inference_on_frame(runner, image_bgr):
+    """
+    ModelRunner 로 추론합니다. 프레임을 입력 크기로 줄이고 RGB 변환/정규화를 입력 버퍼에 바로 씁니다. (model_loader.py 참고)
+    반환값은 그 모델의 다음 추론 때 덮어쓰이므로, 보관하려면 복사해야 합니다.
+    """
+    return runner.run(image_bgr)
+
+def find_similar_images(features, search_index, limit, reranker=None, live_kps=None, frame_shape=None):
+    if reranker is None or live_kps is None:
+        return search_index.search(features, limit)
+    candidates = search_index.search(features, max(limit, HYBRID_CANDIDATES))
+    return reranker.rerank(candidates, live_kps, frame_shape, limit)
+
+def get_guide_pose(db_store, row, guide_image, pose_runner):
+    """
+    가이드 사진의 (keypoints, 중심, 크기) 를 DB에서 조회합니다.
+    DB 빌드 시 미리 계산되지 않은 항목(예전 DB)만 자세 인식을 실행합니다.
+    """
+    pose = stored_pose(db_store, row)
+    if pose is not None:
+        return pose
+    kps = run_inference_on_frame(pose_runner, guide_image).copy()  # 가이드 중 계속 쓰므로 복사해 둠
+    center, size = pose_center_and_size(kps, guide_image.shape)
+    return kps, center, size
+
+def make_guide_preview(db_store, row, guide_kps):
+    """저장된 검색 썸네일을 선택 확인 창 크기로 키워 가이드 자세를 그립니다. 썸네일이 없는 예전 항목이면 None."""
+    thumb = stored_thumbnail(db_store, row)
+    if thumb is None:
+        return None
+    preview = cv2.resize(thumb, (GUIDE_PREVIEW_WIDTH, GUIDE_PREVIEW_HEIGHT), interpolation=cv2.INTER_LINEAR)
+    return draw_pose_on_image(preview, guide_kps)
 
 def generate_pose_feedback(target_kps, live_kps):
     HEAD_INDICES, SHOULDER_INDICES = [0, 1, 2, 3, 4], [5, 6]
@@ -133,61 +177,75 @@ def resize_to_fit(image, max_width, max_height):
     new_w, new_h = int(w * scale), int(h * scale)
     return cv2.resize(image, (new_w, new_h))
 
+text_sprites = TextSpriteCache(TEXT_SPRITE_CACHE_SIZE)
+
 def draw_text_with_outline(frame, texts_to_draw):
-    img_pil = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-    draw = ImageDraw.Draw(img_pil)
-    outline_color = (0, 0, 0)
+    # 글자마다 캐시된 외곽선 스프라이트를 글자 영역에만 합성합니다. (전체 프레임 PIL 변환 없음)
     for text, pos, font, fill_color in texts_to_draw:
-        draw.multiline_text((pos[0]-2, pos[1]), text, font=font, fill=outline_color)
-        draw.multiline_text((pos[0]+2, pos[1]), text, font=font, fill=outline_color)
-        draw.multiline_text((pos[0], pos[1]-2), text, font=font, fill=outline_color)
-        draw.multiline_text((pos[0], pos[1]+2), text, font=font, fill=outline_color)
-        draw.multiline_text(pos, text, font=font, fill=fill_color)
-    return cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
-
-def draw_pose_on_image(image, keypoints, color_override=None):
-    h, w, _ = image.shape
-    for i, kp in enumerate(keypoints):
-        if kp[2] > CONFIDENCE_THRESHOLD:
-            y, x, conf = kp
-            center = (int(x * w), int(y * h))
-            if color_override: color = color_override
-            else:
-                keypoint_name = REV_KEYPOINT_DICT.get(i)
-                color = KEYPOINT_COLORS.get(keypoint_name, (255, 255, 255))
-            cv2.circle(image, center, 5, color, -1)
-    for start_idx, end_idx in CONNECTIONS:
-        start_kp, end_kp = keypoints[start_idx], keypoints[end_idx]
-        if start_kp[2] > CONFIDENCE_THRESHOLD and end_kp[2] > CONFIDENCE_THRESHOLD:
-            start_pos = (int(start_kp[1] * w), int(start_kp[0] * h))
-            end_pos = (int(end_kp[1] * w), int(end_kp[0] * h))
-            cv2.line(image, start_pos, end_pos, CONNECTION_COLOR, 2)
-    return image
+        text_sprites.draw(frame, text, pos, font, fill_color)
+    return frame
 
 def close_all_thumbnail_windows():
     for i in range(1, TOP_K + 1): # TOP_K 개수만큼만 닫으면 됨
         try: cv2.destroyWindow(str(i))
         except: pass
 
+def load_thumbnail(db_store, img_info):
+    # DB 빌드 시 저장해 둔 썸네일을 사용합니다. (없는 예전 항목만 원본 이미지를 읽음)
+    thumb = stored_thumbnail(db_store, img_info['index'])
+    if thumb is None:
+        thumb = cv2.resize(cv2.imread(img_info['path']), (THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT))
+    return thumb
+
+def make_suggestion_strip(db_store, suggestions, gap=10):
+    """실시간 추천 썸네일을 가로로 이어 붙인 이미지를 만듭니다. (추천 결과가 바뀔 때만 호출)"""
+    w, h = SUGGESTION_THUMBNAIL_WIDTH, SUGGESTION_THUMBNAIL_HEIGHT
+    strip = np.zeros((h, len(suggestions) * (w + gap) - gap, 3), dtype=np.uint8)
+    for i, img_info in enumerate(suggestions):
+        cv2.resize(load_thumbnail(db_store, img_info), (w, h), dst=strip[:, i * (w + gap):i * (w + gap) + w])
+    return strip
+
 # --- 4. 메인 실행 로직 ---
 def main():
     current_mode = MODE_SEARCHING
     similar_images, selected_guide_path, selected_guide_frame = None, None, None
     guide_thumbnail_frame, target_kps, target_pos_center, target_pos_size = None, None, None, None
+    selected_guide_pose, selected_guide_row = None, None
+    target_overlay = None  # 가이드 확정 시 한 번만 그려 두는 목표 자세 오버레이
+    frame_buffers = FrameBufferPool()  # 화면 합성용 버퍼 재사용 (매 프레임 새로 할당하지 않음)
+
+    if METRICS_ENABLED:
+        metrics.configure(json_path=METRICS_JSON_PATH, prometheus_path=METRICS_PROMETHEUS_PATH,
+                          export_interval=METRICS_EXPORT_INTERVAL)
 
     print(">>> AI 모델 및 DB 로드 중...")
+    model_list = [('feature', FEATURE_MODEL_PATH), ('pose', POSE_MODEL_PATH)]
+    if PIPELINED_MODE:
+        # 실시간 자세 추론 스레드 전용 Interpreter (메인 스레드의 pose Interpreter 와 동시에 쓰이지 않도록 분리)
+        model_list.append(('live_pose', POSE_MODEL_PATH))
+    if LIVE_SUGGESTION_MODE:
+        # 실시간 추천 스레드 전용 특징 추출 Interpreter ('s' / 'k' 가 쓰는 feature Interpreter 와 분리)
+        model_list.append(('suggest_feature', FEATURE_MODEL_PATH))
+    live_pose_model = 'live_pose' if PIPELINED_MODE else 'pose'
+    models = BackgroundModelLoader(model_list, INTERPRETER_NUM_THREADS, USE_XNNPACK, WARMUP_RUNS).start()
     try:
-        feature_interpreter = Interpreter(model_path=FEATURE_MODEL_PATH); feature_interpreter.allocate_tensors()
-        pose_interpreter = Interpreter(model_path=POSE_MODEL_PATH); pose_interpreter.allocate_tensors()
-        if not os.path.exists(DB_PATH):
-            np.savez(DB_PATH, features=np.array([]), filepaths=np.array([]))
-        db_data = np.load(DB_PATH, allow_pickle=True)
+        if not FAST_START_MODE:
+            models.wait()
+        db_start = time.perf_counter()
+        db_store = open_store(DB_DIR, LEGACY_DB_PATH)
+        ensure_pose_columns(db_store)
+        ensure_thumbnail_columns(db_store)
+        search_index = FeatureIndex.from_store(db_store, mode=SEARCH_INDEX_MODE)
+        reranker = PoseReranker(db_store, HYBRID_BACKGROUND_WEIGHT, HYBRID_POSE_WEIGHT, HYBRID_FRAMING_WEIGHT) if HYBRID_SEARCH_MODE else None
+        metrics.gauge('db_size', len(search_index))
+        db_seconds = time.perf_counter() - db_start
     except Exception as e:
         print(f"!!! 초기화 실패: {e}"); return
-    print(">>> 초기화 완료.")
+    print(">>> 초기화 완료." if models.ready else ">>> DB 로드 완료. AI 모델은 백그라운드에서 준비 중입니다.")
 
     if not os.path.isdir(DB_IMAGE_DIR): os.makedirs(DB_IMAGE_DIR)
 
+    camera_start = time.perf_counter()
     cap = cv2.VideoCapture(0)
     if not cap.isOpened():
         print("!!! 웹캠을 열 수 없습니다."); return
@@ -196,64 +254,134 @@ def main():
     actual_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     actual_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     print(f">>> 웹캠 해상도 요청: 1280x720, 실제 적용된 해상도: {actual_width}x{actual_height}")
-        
-    pose_input_details = pose_interpreter.get_input_details()[0]
-    pose_input_size = (pose_input_details['shape'][2], pose_input_details['shape'][1])
+    camera_seconds = time.perf_counter() - camera_start
+    first_frame_shown, models_reported = False, False
+
+    # 실시간 가이드용 자세 추정: 추적 모드이면 PoseTracker 가 추론 함수를 감쌉니다.
+    # (모델은 가이드 모드에서 처음 호출될 때 가져오며, 그 전에 검색 단계에서 이미 준비가 끝나 있습니다.)
+    # 추론 결과는 다음 추론 때 덮어쓰이므로, 다른 스레드에서 읽는 결과는 복사본이어야 합니다. (PoseTracker 는 항상 복사본을 반환)
+    infer_live_pose = lambda f: run_inference_on_frame(models[live_pose_model], f)
+    pose_tracker = PoseTracker(infer_live_pose) if POSE_TRACKING_MODE else None
+    estimate_live_pose = pose_tracker.update if POSE_TRACKING_MODE else (lambda f: infer_live_pose(f).copy())
+
+    grabber, live_pose_worker = None, None
+    if PIPELINED_MODE:
+        grabber = FrameGrabber(cap, transform=lambda f: cv2.flip(f, 1)).start()
+        live_pose_worker = InferenceWorker(estimate_live_pose, name="LivePoseWorker").start()
+        print(">>> 파이프라인 모드: 캡처 / 자세 추론 / 출력을 별도 스레드에서 처리합니다.")
+
+    # 실시간 추천: 배경이 바뀌었을 때만 전용 스레드에서 특징 추출 + 상위 TOP_K 검색 (scene_suggestions.py 참고)
+    live_suggestions, live_selection = None, False
+    suggestion_strip, suggestion_strip_source = None, None  # 추천 결과가 바뀔 때만 썸네일 줄을 다시 만듦
+    if LIVE_SUGGESTION_MODE:
+        suggest = lambda f: search_index.search(run_inference_on_frame(models['suggest_feature'], f), TOP_K)
+        live_suggestions = LiveSuggestions(suggest, SUGGESTION_MIN_INTERVAL_S).start()
+    background_workers = [w for w in (live_pose_worker, live_suggestions) if w is not None]
 
     while True:
-        ret, frame = cap.read()
+        frame_start = time.perf_counter()
+        with metrics.span('capture'):
+            if PIPELINED_MODE:
+                ret, frame = grabber.read()
+            else:
+                ret, frame = cap.read()
+                if ret: frame = cv2.flip(frame, 1)
         if not ret: break
-        frame = cv2.flip(frame, 1)
         key = cv2.waitKey(1) & 0xFF
         if key == ord('q'): break
+        if models.error is not None:
+            print(f"!!! 초기화 실패: {models.error}"); break
+        failed_worker = next((w for w in background_workers if w.error is not None), None)
+        if failed_worker is not None:
+            # 백그라운드 스레드의 예외는 스레드 안에서 사라지지 않도록 여기서 보고하고 종료합니다.
+            print(f"!!! {failed_worker.name} 처리 실패: {failed_worker.error!r}"); break
+        if not models_reported and models.ready:
+            models_reported = True
+            details = ", ".join(f"{name} {t['load_s']:.2f}s + 예열 {t['warmup_s']:.2f}s" for name, t in models.timings.items())
+            print(f">>> AI 모델 준비 완료: {models.elapsed:.2f}s ({details})")
+            metrics.observe('startup.models', models.elapsed)
         
         texts_to_draw = []
 
         if key == ord('k'):
             # k키 DB 추가 로직 (생략 없음)
             print("\n--- [DB 추가 요청] 현재 프레임을 DB에 추가합니다. ---")
-            timestamp = int(time.time())
-            filename = f"capture_{timestamp}.jpg"
-            filepath = os.path.join(DB_IMAGE_DIR, filename)
-            cv2.imwrite(filepath, frame)
-            print(f" - 이미지 저장 완료: {filepath}")
             print(" - 특징 추출 중...")
-            f_input_details = feature_interpreter.get_input_details()[0]
-            f_input_size = (f_input_details['shape'][2], f_input_details['shape'][1])
-            features = run_inference_on_frame(feature_interpreter, frame, f_input_size)
+            features = run_inference_on_frame(models['feature'], frame)
             print(" - 특징 추출 완료.")
-            current_features = list(db_data.get('features', []))
-            current_filepaths = list(db_data.get('filepaths', []))
-            current_features.append(features)
-            current_filepaths.append(filepath)
-            np.savez(DB_PATH, features=np.array(current_features), filepaths=np.array(current_filepaths))
-            db_data = np.load(DB_PATH, allow_pickle=True)
-            print(f" - 데이터베이스 업데이트 완료! (총 {len(db_data['filepaths'])}개)")
-            texts_to_draw.append(("DB에 현재 이미지 추가 완료!", (50, 200), font_large, (0, 255, 255)))
+            # 연속으로 눌러 거의 같은 장면이 쌓이지 않도록, DB에 이미 비슷한 사진이 있으면 추가하지 않습니다.
+            duplicate = find_capture_duplicate(search_index, features, DUPLICATE_DISTANCE) if CAPTURE_DEDUP_MODE else None
+            if duplicate is not None:
+                print(f" - DB에 거의 같은 사진이 있어 추가하지 않습니다: {duplicate['path']} (거리 {duplicate['distance']:.4f})")
+                metrics.count('captures_duplicate')
+                texts_to_draw.append(("이미 비슷한 사진이 DB에 있습니다.", (50, 200), font_large, (0, 165, 255)))
+            else:
+                timestamp = int(time.time())
+                filename = f"capture_{timestamp}.jpg"
+                filepath = os.path.join(DB_IMAGE_DIR, filename)
+                cv2.imwrite(filepath, frame)
+                print(f" - 이미지 저장 완료: {filepath}")
+                capture_kps = run_inference_on_frame(models['pose'], frame)
+                # 저장소 끝에 한 행만 추가하고 커밋 (기존 DB 전체를 다시 쓰지 않음)
+                # 가이드로 선택될 때 바로 쓸 수 있도록 자세 정보도 함께 저장합니다.
+                with metrics.span('db_write'):
+                    capture_pose = {name: values[0] for name, values in pose_columns([capture_kps], [frame.shape]).items()}
+                    capture_thumbnails = {name: values[0] for name, values in thumbnail_columns([make_thumbnails(frame, capture_kps)]).items()}
+                    # 저장소와 같은 형식(float32 / 압축 코드)으로 특징을 저장합니다.
+                    capture_features = {name: values[0] for name, values in store_columns(search_index.codec, features).items()}
+                    row = db_store.append(filepath, **capture_features, **capture_pose, **capture_thumbnails)
+                    search_index.add(features, filepath, id=row)
+                metrics.gauge('db_size', len(search_index))
+                if live_suggestions is not None:
+                    live_suggestions.invalidate()  # DB 가 바뀌었으므로 보관한 추천 결과를 버림
+                print(f" - 데이터베이스 업데이트 완료! (총 {len(search_index)}개)")
+                texts_to_draw.append(("DB에 현재 이미지 추가 완료!", (50, 200), font_large, (0, 255, 255)))
 
         if current_mode == MODE_SEARCHING:
+            live_results = None
+            if similar_images is None and live_suggestions is not None and len(search_index) > 0:
+                # 장면 변화 확인은 매 프레임 하지만, 특징 추출은 배경이 바뀌었을 때만 별도 스레드에서 실행됩니다.
+                live_suggestions.update(frame)
+                live_results = live_suggestions.latest()
+                if live_results and ord('1') <= key <= ord('5') and key - ord('1') < len(live_results):
+                    # 추천 줄에서 바로 고르면 썸네일 창 없이 아래 가이드 선택 처리로 넘어갑니다.
+                    similar_images, live_selection = live_results, True
+
             if similar_images is None:
                 texts_to_draw.append(("모드: 배경 검색", (20, 30), font_large, (255, 255, 255)))
                 texts_to_draw.append(("'s': 배경 검색", (20, 70), font_large, (255, 255, 255)))
+                if not models.ready:
+                    texts_to_draw.append(("AI 모델 준비 중...", (20, 110), font_small, (0, 255, 255)))
+                if live_results:
+                    if live_results is not suggestion_strip_source:
+                        suggestion_strip, suggestion_strip_source = make_suggestion_strip(db_store, live_results), live_results
+                    frame_h, frame_w, _ = frame.shape
+                    strip_h, strip_w = suggestion_strip.shape[:2]
+                    strip_w = min(strip_w, frame_w - 40)
+                    strip_x, strip_y = 20, frame_h - strip_h - 20
+                    frame[strip_y:strip_y + strip_h, strip_x:strip_x + strip_w] = suggestion_strip[:, :strip_w]
+                    texts_to_draw.append(("실시간 추천 (번호 키로 바로 선택)", (strip_x, strip_y - 30), font_small, (255, 255, 0)))
+                    for i in range(len(live_results)):
+                        texts_to_draw.append((str(i + 1), (strip_x + i * (SUGGESTION_THUMBNAIL_WIDTH + 10) + 5, strip_y + 5), font_small, (0, 255, 255)))
                 if key == ord('s'):
-                    if len(db_data.get('features', [])) == 0:
+                    if len(search_index) == 0:
                         texts_to_draw.append(("DB가 비어있습니다. 'k' 또는 '01_build...'을 실행하세요.", (50, 200), font_large, (0, 0, 255)))
                     else:
                         print("\n--- [단계 1] 유사 이미지 검색 (DB는 이미 검증됨) ---")
-                        feature_input_details = feature_interpreter.get_input_details()[0]
-                        feature_input_size = (feature_input_details['shape'][2], feature_input_details['shape'][1])
-                        features = run_inference_on_frame(feature_interpreter, frame, feature_input_size)
+                        features = run_inference_on_frame(models['feature'], frame)
                         
                         # --- [핵심 수정] 자세 유효성 검사 로직이 완전히 사라지고, 코드가 매우 단순해짐 ---
                         # DB에 있는 데이터는 모두 유효하므로, 상위 TOP_K개 결과를 바로 사용합니다.
-                        similar_images = find_similar_images(features, db_data, TOP_K)
+                        search_kps = run_inference_on_frame(models['pose'], frame) if HYBRID_SEARCH_MODE else None
+                        with metrics.span('search'):
+                            similar_images = find_similar_images(features, search_index, TOP_K, reranker, search_kps, frame.shape)
                         
                         if not similar_images:
                              texts_to_draw.append(("유사한 배경의 가이드를 찾지 못했습니다.", (50, 200), font_large, (255, 0, 0)))
                         else:
                             print(f"--- {len(similar_images)}개의 추천 결과를 찾았습니다. ---")
                             for i, img_info in enumerate(similar_images):
-                                thumb = cv2.resize(cv2.imread(img_info['path']), (THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT))
+                                thumb = load_thumbnail(db_store, img_info)
                                 cv2.imshow(str(i + 1), thumb); cv2.moveWindow(str(i + 1), i * (THUMBNAIL_WIDTH + 10), 50)
             
             elif selected_guide_path is None:
@@ -263,40 +391,69 @@ def main():
                     choice_idx = key - ord('1')
                     if similar_images and choice_idx < len(similar_images):
                         selected_guide_path = similar_images[choice_idx]['path']
+                        selected_guide_row = similar_images[choice_idx]['index']
                         close_all_thumbnail_windows()
-                        selected_guide_frame = cv2.imread(selected_guide_path)
-                        kps = run_inference_on_frame(pose_interpreter, selected_guide_frame, pose_input_size)
-                        guide_with_pose = selected_guide_frame.copy()
-                        draw_pose_on_image(guide_with_pose, kps)
-                        display_guide_frame = resize_to_fit(guide_with_pose, DISPLAY_WIDTH, DISPLAY_HEIGHT)
+                        # DB 빌드 시 저장해 둔 자세 정보와 썸네일로 확인 화면을 만듭니다. (원본 이미지를 읽지 않음)
+                        selected_guide_pose = stored_pose(db_store, selected_guide_row)
+                        display_guide_frame = None
+                        if selected_guide_pose is not None:
+                            display_guide_frame = make_guide_preview(db_store, selected_guide_row, selected_guide_pose[0])
+                        if display_guide_frame is None:
+                            # 자세나 썸네일이 저장되지 않은 예전 항목만 원본을 읽습니다.
+                            selected_guide_frame = cv2.imread(selected_guide_path)
+                            selected_guide_pose = get_guide_pose(db_store, selected_guide_row,
+                                                                 selected_guide_frame, models['pose'])
+                            guide_with_pose = selected_guide_frame.copy()
+                            draw_pose_on_image(guide_with_pose, selected_guide_pose[0])
+                            display_guide_frame = resize_to_fit(guide_with_pose, DISPLAY_WIDTH, DISPLAY_HEIGHT)
                         cv2.imshow("Selected Guide (c:Confirm, r:Cancel)", display_guide_frame)
                 elif key == ord('r'):
-                    close_all_thumbnail_windows(); similar_images = None
+                    close_all_thumbnail_windows(); similar_images, live_selection = None, False
 
             else:
                 texts_to_draw.append(("모드: 선택 확인", (20, 30), font_large, (255, 255, 255)))
                 texts_to_draw.append(("'c' 키로 가이드 시작", (20, 70), font_large, (255, 255, 255)))
                 if key == ord('c'):
                     cv2.destroyWindow("Selected Guide (c:Confirm, r:Cancel)")
-                    guide_image = selected_guide_frame
-                    target_kps = run_inference_on_frame(pose_interpreter, guide_image, pose_input_size)
-                    target_pos_center, target_pos_size = get_pose_center_and_size(target_kps, guide_image.shape)
-                    guide_image_with_pose = guide_image.copy()
-                    draw_pose_on_image(guide_image_with_pose, target_kps)
-                    guide_thumbnail_frame = cv2.resize(guide_image_with_pose, (GUIDE_THUMBNAIL_WIDTH, GUIDE_THUMBNAIL_HEIGHT))
+                    target_kps, target_pos_center, target_pos_size = selected_guide_pose
+                    # DB 빌드 시 자세까지 그려서 저장해 둔 가이드 썸네일을 사용합니다.
+                    guide_thumbnail_frame = stored_guide_thumbnail(db_store, selected_guide_row)
+                    if guide_thumbnail_frame is None:
+                        if selected_guide_frame is None:
+                            selected_guide_frame = cv2.imread(selected_guide_path)
+                        guide_thumbnail_frame = make_thumbnails(selected_guide_frame, target_kps)[1]
+                    # 목표 자세는 가이드 중에 바뀌지 않으므로 오버레이를 지금 한 번만 그려 둡니다.
+                    target_overlay = MaskedOverlay(
+                        frame.shape, lambda canvas: draw_pose_on_image(canvas, target_kps, color_override=(255, 0, 0)), weight=0.5)
                     current_mode = MODE_GUIDING
                 elif key == ord('r'): 
-                    cv2.destroyWindow("Selected Guide (c:Confirm, r:Cancel)"); selected_guide_path, selected_guide_frame = None, None
+                    cv2.destroyWindow("Selected Guide (c:Confirm, r:Cancel)"); selected_guide_path, selected_guide_frame, selected_guide_pose, selected_guide_row = None, None, None, None
+                    if live_selection:  # 실시간 추천에서 고른 경우 썸네일 창이 없으므로 검색 화면으로 돌아감
+                        similar_images, live_selection = None, False
 
         elif current_mode == MODE_GUIDING:
-            live_kps = run_inference_on_frame(pose_interpreter, frame, pose_input_size)
-            live_pos_center, live_pos_size = get_pose_center_and_size(live_kps, frame.shape)
-            pose_feedback = generate_pose_feedback(target_kps, live_kps)
-            position_feedback = generate_position_feedback(target_pos_center, target_pos_size, live_pos_center, live_pos_size)
-            frame = draw_pose_on_image(frame, live_kps)
-            overlay = np.zeros_like(frame, dtype=np.uint8)
-            overlay = draw_pose_on_image(overlay, target_kps, color_override=(255, 0, 0))
-            frame = cv2.addWeighted(frame, 1, overlay, 0.5, 0)
+            if PIPELINED_MODE:
+                # 추론 스레드에 현재 프레임을 넘기고, 지금까지 나온 가장 최근 결과를 사용합니다.
+                # 추론 스레드가 읽는 원본 프레임은 그대로 두고, 그림은 재사용 버퍼에 복사해서 그립니다.
+                live_pose_worker.submit(frame)
+                frame = frame_buffers.copy_into('guiding', frame)
+                live_kps = live_pose_worker.latest()
+                if live_kps is None:
+                    live_kps = np.zeros((len(KEYPOINT_DICT), 3), dtype=np.float32)
+            else:
+                live_kps = estimate_live_pose(frame)
+            with metrics.span('feedback'):
+                if metrics.enabled:  # 측정을 끈 상태에서는 개수 계산도 하지 않음
+                    metrics.gauge('valid_keypoints', int(np.count_nonzero(live_kps[:, 2] > CONFIDENCE_THRESHOLD)))
+                live_pos_center, live_pos_size = pose_center_and_size(live_kps, frame.shape)
+                pose_feedback = generate_pose_feedback(target_kps, live_kps)
+                position_feedback = generate_position_feedback(target_pos_center, target_pos_size, live_pos_center, live_pos_size)
+            with metrics.span('render.pose'):
+                frame = draw_pose_on_image(frame, live_kps)
+                if target_overlay.frame_shape != frame.shape:
+                    target_overlay = MaskedOverlay(
+                        frame.shape, lambda canvas: draw_pose_on_image(canvas, target_kps, color_override=(255, 0, 0)), weight=0.5)
+                frame = target_overlay.apply(frame)
             
             texts_to_draw.append(("모드: 실시간 가이드", (20, 30), font_large, (0, 255, 255)))
             texts_to_draw.append((f"자세: {pose_feedback or '좋음'}", (20, 70), font_large, (0, 255, 0)))
@@ -313,23 +470,48 @@ def main():
             if key == ord('r'):
                 print("\n>>> 가이드 초기화. 검색 모드로 돌아갑니다.")
                 current_mode = MODE_SEARCHING
+                if live_pose_worker is not None: live_pose_worker.reset()
+                if pose_tracker is not None: pose_tracker.reset()
+                if live_suggestions is not None: live_suggestions.reset()
+                live_selection = False
                 similar_images, selected_guide_path, selected_guide_frame = None, None, None
                 guide_thumbnail_frame, target_kps, target_pos_center, target_pos_size = None, None, None, None
+                selected_guide_pose, selected_guide_row, target_overlay = None, None, None
         
         if texts_to_draw:
-            frame = draw_text_with_outline(frame, texts_to_draw)
-
-        h, w, _ = frame.shape
-        scale = min(DISPLAY_WIDTH / w, DISPLAY_HEIGHT / h)
-        new_w, new_h = int(w * scale), int(h * scale)
-        display_frame = cv2.resize(frame, (new_w, new_h))
-        final_frame = np.zeros((DISPLAY_HEIGHT, DISPLAY_WIDTH, 3), dtype=np.uint8)
-        y_offset = (DISPLAY_HEIGHT - new_h) // 2
-        x_offset = (DISPLAY_WIDTH - new_w) // 2
-        final_frame[y_offset:y_offset+new_h, x_offset:x_offset+new_w] = display_frame
-
-        cv2.imshow("AIGuideCam (Press 'q' to quit)", final_frame)
-
+            with metrics.span('render.text'):
+                frame = draw_text_with_outline(frame, texts_to_draw)
+
+        with metrics.span('display'):
+            # 비율을 유지한 채 화면 크기에 맞춰 가운데 배치 (미리 할당한 버퍼에 직접 resize)
+            final_frame = frame_buffers.letterbox('display', frame, DISPLAY_WIDTH, DISPLAY_HEIGHT)
+            cv2.imshow("AIGuideCam (Press 'q' to quit)", final_frame)
+        if not first_frame_shown:
+            first_frame_shown = True
+            startup_seconds = time.perf_counter() - STARTUP_START
+            print(f">>> 시작 시간: 첫 화면까지 {startup_seconds:.2f}s "
+                  f"(DB {db_seconds:.2f}s, 카메라 {camera_seconds:.2f}s, AI 모델 {'준비 완료' if models.ready else '백그라운드 준비 중'})")
+            metrics.observe('startup.first_frame', startup_seconds)
+
+        if metrics.enabled:
+            metrics.observe('frame', time.perf_counter() - frame_start)
+            metrics.count('frames')
+            if PIPELINED_MODE:
+                metrics.set_count('capture_dropped_frames', grabber.dropped)
+                metrics.set_count('inference_dropped_frames', live_pose_worker.dropped)
+            metrics.maybe_export()
+
+    if PIPELINED_MODE:
+        live_pose_worker.stop(); grabber.stop()
+        print(f"\n>>> 버려진 프레임: 캡처 {grabber.dropped}개, 자세 추론 {live_pose_worker.dropped}개")
+    if pose_tracker is not None and pose_tracker.frame_count:
+        print(f">>> 자세 추적: 프레임당 평균 추론 {pose_tracker.inference_ratio():.2f}회")
+    if live_suggestions is not None:
+        live_suggestions.stop()
+        if live_suggestions.frames:
+            print(f">>> 실시간 추천: 검색 화면 {live_suggestions.frames}프레임 동안 특징 추출 {live_suggestions.searches}번, "
+                  f"저장된 결과 재사용 {live_suggestions.memo_hits}번")
+    metrics.export()
     cap.release()
     cv2.destroyAllWindows()
 
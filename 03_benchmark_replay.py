@@ -0,0 +1,372 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import importlib
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+import cv2
+
+# --- 헤드리스 재생 벤치마크 ---
+# 웹캠과 화면 없이 동영상 파일이나 이미지 폴더를 02_run_realtime_webcam.py 와 같은 단계로 재생하며
+# 단계별 지연 시간(p50/p95/p99), 처리량(FPS), 최대 메모리를 측정하여 JSON 으로 저장합니다.
+# 릴리스마다 결과 파일을 비교하여 FPS / 검색 지연 회귀를 찾는 용도입니다.
+#
+# 사용 예:
+#   python .\03_benchmark_replay.py --source sample.mp4 --db-sizes 1000,100000
+#   python .\03_benchmark_replay.py --source db_images --stand-in --pose-latency-ms 15 --feature-latency-ms 30
+
+# 02 파일의 함수들을 그대로 사용하여 실제 실행 경로를 측정합니다. (파일명이 숫자로 시작하므로 importlib 사용)
+webcam = importlib.import_module("02_run_realtime_webcam")
+from search_index import FeatureIndex
+from feature_store import open_store
+from feature_codec import load_codec
+from model_loader import ModelRunner, create_interpreter
+from frame_buffers import FrameBufferPool, MaskedOverlay
+from pose_utils import draw_pose_on_image, pose_center_and_size, NUM_KEYPOINTS
+
+# --- 1. 설정 및 상수 정의 ---
+RESULT_VERSION = 2  # 2: 프로세스 전체 최대 RSS 대신 DB 크기별 메모리(tracemalloc) 기록
+DEFAULT_OUTPUT_PATH = "benchmark_results.json"
+DEFAULT_DB_SIZES = "1000,10000,100000"
+DEFAULT_FRAMES = 300
+DEFAULT_WARMUP_FRAMES = 10    # 측정에서 제외하는 첫 프레임 수 (캐시/할당 안정화)
+DEFAULT_SEARCH_INTERVAL = 30  # 이 프레임 수마다 한 번 배경 검색 ('s' 키 검색을 흉내냄, 0이면 검색 안 함)
+PERCENTILES = (50, 95, 99)
+IMAGE_EXTENSIONS = ('.jpg', '.png', '.jpeg')
+STAND_IN_POSE_INPUT = (192, 192)     # 대역 모델 입력 크기 (너비, 높이), MoveNet Lightning 과 동일
+STAND_IN_FEATURE_INPUT = (224, 224)
+STAND_IN_FEATURE_DIM = 1280
+
+# --- 2. 대역(stand-in) Interpreter ---
+
+class StandInInterpreter:
+    """
+    실제 .tflite 모델 없이 파이프라인을 측정하기 위한 가짜 Interpreter.
+    invoke() 는 설정한 지연 시간만큼 기다린 뒤, 입력 이미지에서 결정적으로 계산한 그럴듯한 출력을 돌려줍니다.
+    - 자세 모델: (1, 1, 17, 3) keypoints. 입력 밝기에 따라 조금씩 움직이는 상반신 자세
+    - 특징 모델: (1, dim) 벡터. 8x8 로 줄인 입력을 고정된 난수 행렬로 투영
+    """
+
+    def __init__(self, kind, input_size, latency_s=0.0, feature_dim=STAND_IN_FEATURE_DIM, seed=0):
+        self.kind = kind
+        self.latency_s = latency_s
+        self._input = np.zeros((1, input_size[1], input_size[0], 3), dtype=np.uint8)
+        if kind == 'pose':
+            self._output = np.zeros((1, 1, NUM_KEYPOINTS, 3), dtype=np.float32)
+            rng = np.random.default_rng(seed)
+            self._base_pose = np.column_stack([
+                np.linspace(0.25, 0.85, NUM_KEYPOINTS), 0.5 + rng.uniform(-0.15, 0.15, NUM_KEYPOINTS),
+                np.full(NUM_KEYPOINTS, 0.8)]).astype(np.float32)
+        else:
+            self._output = np.zeros((1, feature_dim), dtype=np.float32)
+            self._projection = np.random.default_rng(seed).standard_normal((8 * 8 * 3, feature_dim)).astype(np.float32)
+
+    def allocate_tensors(self):
+        pass
+
+    def get_input_details(self):
+        return [{'index': 0, 'shape': np.array(self._input.shape), 'dtype': np.uint8}]
+
+    def get_output_details(self):
+        return [{'index': 1, 'shape': np.array(self._output.shape), 'dtype': np.float32}]
+
+    def set_tensor(self, index, value):
+        self._input[...] = value
+
+    def tensor(self, index):
+        target = self._input if index == 0 else self._output
+        return lambda: target
+
+    def get_tensor(self, index):
+        return (self._input if index == 0 else self._output).copy()
+
+    def invoke(self):
+        start = time.perf_counter()
+        image = self._input[0]
+        if self.kind == 'pose':
+            shift = (float(image[::16, ::16].mean()) / 255.0 - 0.5) * 0.1
+            self._output[0, 0] = self._base_pose
+            self._output[0, 0, :, 1] += shift
+        else:
+            small = cv2.resize(image, (8, 8), interpolation=cv2.INTER_AREA).astype(np.float32).reshape(-1) / 255.0
+            self._output[0] = small @ self._projection
+        remaining = self.latency_s - (time.perf_counter() - start)
+        if remaining > 0:
+            time.sleep(remaining)
+
+# --- 3. 입력 프레임 ---
+
+class ReplaySource:
+    """동영상 파일 또는 이미지 폴더를 웹캠처럼 한 프레임씩 돌려줍니다. 끝에 도달하면 처음부터 반복합니다."""
+
+    def __init__(self, path, frame_size=None):
+        self.path = path
+        self.frame_size = frame_size
+        self._cap = None
+        self._images = None
+        self._pos = 0
+        if os.path.isdir(path):
+            self._images = [os.path.join(path, f) for f in sorted(os.listdir(path)) if f.lower().endswith(IMAGE_EXTENSIONS)]
+            if not self._images:
+                raise ValueError(f"'{path}' 폴더에 이미지가 없습니다.")
+        else:
+            self._cap = cv2.VideoCapture(path)
+            if not self._cap.isOpened():
+                raise ValueError(f"'{path}' 동영상을 열 수 없습니다.")
+
+    def read(self):
+        if self._images is not None:
+            frame = None
+            for _ in range(len(self._images)):
+                frame = cv2.imread(self._images[self._pos])
+                self._pos = (self._pos + 1) % len(self._images)
+                if frame is not None:
+                    break
+        else:
+            ret, frame = self._cap.read()
+            if not ret:
+                self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = self._cap.read()
+        if frame is None:
+            raise ValueError(f"'{self.path}' 에서 프레임을 읽을 수 없습니다.")
+        if self.frame_size is not None and (frame.shape[1], frame.shape[0]) != self.frame_size:
+            frame = cv2.resize(frame, self.frame_size)
+        return cv2.flip(frame, 1)  # 웹캠 스크립트와 같이 좌우 반전
+
+    def rewind(self):
+        self._pos = 0
+        if self._cap is not None:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def close(self):
+        if self._cap is not None:
+            self._cap.release()
+
+# --- 4. 측정 도구 ---
+
+class StageTimer:
+    """단계 이름별 소요 시간(초)을 모읍니다."""
+
+    def __init__(self):
+        self.samples = {}
+        self.enabled = True
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.enabled:
+                self.samples.setdefault(name, []).append(time.perf_counter() - start)
+
+def summarize(samples):
+    """소요 시간 목록을 밀리초 단위 통계로 요약합니다."""
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    summary = {'count': int(ms.size), 'mean_ms': float(ms.mean()), 'max_ms': float(ms.max())}
+    for p, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+        summary[f'p{p}_ms'] = float(value)
+    return summary
+
+def measure_index_memory(make_index, dim, searches=3, seed=0):
+    """
+    DB 크기마다 따로 tracemalloc 으로 (인덱스 생성 + 검색) 의 메모리를 측정합니다. (Windows 포함 모든 환경)
+    프로세스 전체의 최대 RSS 는 앞선 큰 DB 의 값이 계속 남으므로 DB 크기별 비교에 쓸 수 없습니다.
+    NumPy 배열 할당도 tracemalloc 에 잡히며, 메모리 맵으로 읽기만 하는 저장소 파일은 포함되지 않습니다.
+    반환: (인덱스, {'index_mb': 생성 후 남은 할당, 'peak_mb': 생성과 검색 중 최대 할당})
+    """
+    queries = np.random.default_rng(seed).standard_normal((searches, dim), dtype=np.float32)
+    tracemalloc.start()
+    try:
+        index = make_index()
+        index_bytes = tracemalloc.get_traced_memory()[0]
+        for query in queries:
+            webcam.find_similar_images(query, index, webcam.TOP_K)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return index, {'index_mb': index_bytes / (1024 * 1024), 'peak_mb': peak_bytes / (1024 * 1024)}
+
+# --- 5. 벤치마크 실행 ---
+
+def feature_dim(interpreter):
+    return int(np.prod(interpreter.get_output_details()[0]['shape']))
+
+def load_interpreters(args, store=None):
+    """
+    실제 모델 또는 대역 Interpreter 를 (자세, 특징) 순서로 반환합니다.
+    실제 저장소를 함께 측정하면 대역 특징 모델의 출력 차원을 저장소의 특징 차원에 맞춥니다.
+    """
+    if args.stand_in:
+        dim = (load_codec(store).dim if store is not None else None) or STAND_IN_FEATURE_DIM
+        return (StandInInterpreter('pose', STAND_IN_POSE_INPUT, args.pose_latency_ms / 1000.0),
+                StandInInterpreter('feature', STAND_IN_FEATURE_INPUT, args.feature_latency_ms / 1000.0, feature_dim=dim))
+    pose_interpreter = create_interpreter(webcam.POSE_MODEL_PATH, webcam.INTERPRETER_NUM_THREADS, webcam.USE_XNNPACK)
+    feature_interpreter = create_interpreter(webcam.FEATURE_MODEL_PATH, webcam.INTERPRETER_NUM_THREADS, webcam.USE_XNNPACK)
+    return pose_interpreter, feature_interpreter
+
+def synthetic_index(size, dim, mode, seed=0):
+    """정규분포 특징 벡터 size 개로 검색 인덱스를 만듭니다. (DB 크기별 검색 지연 측정용)"""
+    features = np.random.default_rng(seed).standard_normal((size, dim), dtype=np.float32)
+    filepaths = [f"synthetic_{i:07d}.jpg" for i in range(size)]
+    return FeatureIndex(features, filepaths, mode=mode)
+
+def replay(source, index, pose_interpreter, feature_interpreter, args):
+    """
+    웹캠 스크립트의 실시간 가이드 루프를 한 스레드에서 순서대로 재생합니다.
+    (캡처 -> 자세 추론 -> 피드백 계산 -> 주기적 배경 검색 -> 자세/오버레이/글자 그리기 -> 화면 크기 맞춤)
+    """
+    # 웹캠 스크립트와 같이 입력 버퍼에 바로 쓰는 전처리를 사용합니다.
+    pose_runner, feature_runner = ModelRunner(pose_interpreter, "pose"), ModelRunner(feature_interpreter, "feature")
+    frame_buffers = FrameBufferPool()
+    timer = StageTimer()
+    source.rewind()
+
+    # 첫 프레임의 자세를 목표 자세로 사용합니다. (가이드 확정 'c' 와 같은 상태)
+    first = source.read()
+    target_kps = webcam.run_inference_on_frame(pose_runner, first).copy()
+    target_center, target_size = pose_center_and_size(target_kps, first.shape)
+    target_overlay = MaskedOverlay(
+        first.shape, lambda canvas: draw_pose_on_image(canvas, target_kps, color_override=(255, 0, 0)), weight=0.5)
+
+    tracemalloc_started = False
+    if args.trace_memory:
+        tracemalloc.start()
+        tracemalloc_started = True
+
+    frames, measured_time = 0, 0.0
+    for frame_idx in range(args.warmup + args.frames):
+        timer.enabled = frame_idx >= args.warmup
+        if frame_idx == args.warmup and tracemalloc_started:
+            tracemalloc.reset_peak()
+        frame_start = time.perf_counter()
+        with timer.stage('capture'):
+            frame = source.read()
+        with timer.stage('pose_inference'):
+            live_kps = webcam.run_inference_on_frame(pose_runner, frame)
+        with timer.stage('feedback'):
+            live_center, live_size = pose_center_and_size(live_kps, frame.shape)
+            pose_feedback = webcam.generate_pose_feedback(target_kps, live_kps)
+            position_feedback = webcam.generate_position_feedback(target_center, target_size, live_center, live_size)
+        if args.search_interval and frame_idx % args.search_interval == 0:
+            with timer.stage('feature_inference'):
+                features = webcam.run_inference_on_frame(feature_runner, frame)
+            with timer.stage('search'):
+                webcam.find_similar_images(features, index, webcam.TOP_K)
+        with timer.stage('render'):
+            canvas = frame_buffers.copy_into('guiding', frame)
+            draw_pose_on_image(canvas, live_kps)
+            if target_overlay.frame_shape != canvas.shape:
+                target_overlay = MaskedOverlay(
+                    canvas.shape, lambda c: draw_pose_on_image(c, target_kps, color_override=(255, 0, 0)), weight=0.5)
+            target_overlay.apply(canvas)
+            webcam.draw_text_with_outline(canvas, [
+                ("모드: 실시간 가이드", (20, 30), webcam.font_large, (0, 255, 255)),
+                (f"자세: {pose_feedback or '좋음'}", (20, 70), webcam.font_large, (0, 255, 0)),
+                (f"위치: {position_feedback or '좋음'}", (20, 110), webcam.font_large, (0, 255, 0)),
+                ("'r' 키를 눌러 초기화", (20, 680), webcam.font_large, (255, 255, 255)),
+            ])
+        with timer.stage('letterbox'):
+            frame_buffers.letterbox('display', canvas, webcam.DISPLAY_WIDTH, webcam.DISPLAY_HEIGHT)
+        if timer.enabled:
+            timer.samples.setdefault('frame', []).append(time.perf_counter() - frame_start)
+            measured_time += time.perf_counter() - frame_start
+            frames += 1
+
+    peak_traced = None
+    if tracemalloc_started:
+        peak_traced = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+
+    return {
+        'db_size': len(index),
+        'search_mode': index.mode,
+        'frames': frames,
+        'measured_time_s': measured_time,
+        'fps': frames / measured_time if measured_time > 0 else None,
+        'stages': {name: summarize(samples) for name, samples in timer.samples.items()},
+        'peak_traced_mb': peak_traced,
+    }
+
+def print_run(run):
+    print(f"\n--- DB {run['db_size']}개 ({run['search_mode']}) : {run['fps']:.1f} FPS ---")
+    print(f"  {'단계':<18}{'p50':>9}{'p95':>9}{'p99':>9}  (ms)")
+    for name, s in run['stages'].items():
+        print(f"  {name:<18}{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}{s['p99_ms']:>9.2f}")
+    memory = run['memory']
+    print(f"  메모리(tracemalloc): 인덱스 {memory['index_mb']:.1f} MB, 인덱스 생성 + 검색 중 최대 {memory['peak_mb']:.1f} MB")
+    if run['peak_traced_mb'] is not None:
+        print(f"  재생 중 최대 할당(tracemalloc): {run['peak_traced_mb']:.1f} MB")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="웹캠 없이 동영상/이미지 폴더로 검색 및 가이드 파이프라인을 측정합니다.")
+    parser.add_argument('--source', default=webcam.DB_IMAGE_DIR, help="동영상 파일 또는 이미지 폴더 (기본: db_images)")
+    parser.add_argument('--frames', type=int, default=DEFAULT_FRAMES, help="DB 크기마다 측정할 프레임 수")
+    parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP_FRAMES, help="측정 전에 버리는 프레임 수")
+    parser.add_argument('--frame-size', default="1280x720", help="입력 프레임 크기 WxH (웹캠 요청 해상도와 동일), 'native' 이면 원본 유지")
+    parser.add_argument('--db-sizes', default=DEFAULT_DB_SIZES, help="쉼표로 구분한 합성 DB 크기 목록")
+    parser.add_argument('--db-dir', default=None, help="합성 DB 대신(또는 추가로) 측정할 실제 특징 저장소 폴더")
+    parser.add_argument('--search-mode', default=webcam.SEARCH_INDEX_MODE, help="검색 인덱스 모드 (auto / exact / ivf)")
+    parser.add_argument('--search-interval', type=int, default=DEFAULT_SEARCH_INTERVAL, help="배경 검색 간격(프레임), 0이면 검색 안 함")
+    parser.add_argument('--stand-in', action='store_true', help="실제 모델 대신 대역 Interpreter 사용")
+    parser.add_argument('--pose-latency-ms', type=float, default=0.0, help="대역 자세 모델의 추론 시간")
+    parser.add_argument('--feature-latency-ms', type=float, default=0.0, help="대역 특징 모델의 추론 시간")
+    parser.add_argument('--trace-memory', action='store_true', help="재생 중에도 tracemalloc 으로 Python/NumPy 할당 최대치 측정 (측정 오버헤드 있음)")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_PATH, help="결과 JSON 파일 경로")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    frame_size = None if args.frame_size == 'native' else tuple(int(v) for v in args.frame_size.lower().split('x'))
+    db_sizes = [int(v) for v in args.db_sizes.split(',') if v.strip()]
+
+    try:
+        source = ReplaySource(args.source, frame_size)
+        store = open_store(args.db_dir, legacy_npz_path=None) if args.db_dir is not None else None
+        pose_interpreter, feature_interpreter = load_interpreters(args, store)
+    except Exception as e:
+        print(f"!!! 초기화 실패: {e}"); return 1
+
+    indexes = [lambda size=size: synthetic_index(size, feature_dim(feature_interpreter), args.search_mode) for size in db_sizes]
+    if store is not None:
+        indexes.append(lambda: FeatureIndex.from_store(store, mode=args.search_mode))
+
+    runs = []
+    try:
+        for make_index in indexes:
+            # 메모리는 인덱스 생성 + 검색만 따로 측정하고, 재생(FPS 측정)은 tracemalloc 없이 실행합니다.
+            index, memory = measure_index_memory(make_index, feature_dim(feature_interpreter))
+            print(f">>> DB {len(index)}개로 {args.frames}프레임 재생 중...")
+            run = replay(source, index, pose_interpreter, feature_interpreter, args)
+            run['memory'] = memory
+            print_run(run)
+            runs.append(run)
+            del index
+    finally:
+        source.close()
+
+    result = {
+        'version': RESULT_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': {
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'numpy': np.__version__, 'opencv': cv2.__version__, 'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'source': args.source, 'frames': args.frames, 'warmup': args.warmup, 'frame_size': args.frame_size,
+            'search_mode': args.search_mode, 'search_interval': args.search_interval, 'top_k': webcam.TOP_K,
+            'stand_in': args.stand_in, 'pose_latency_ms': args.pose_latency_ms, 'feature_latency_ms': args.feature_latency_ms,
+        },
+        'runs': runs,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=1)
+    print(f"\n>>> 결과를 '{args.output}' 에 저장했습니다.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import sys
+import json
+import argparse
+import numpy as np
+from feature_store import open_store
+from feature_codec import CODECS, CODEC_FLOAT32, DEFAULT_PQ_SUBSPACES, load_codec, recall_report
+
+# --- 특징 압축 형식 비교 보고서 ---
+# 각 저장 형식(float32 / float16 / int8 / pq)으로 특징 DB를 압축했을 때
+# 벡터당 크기와, 정확한 float32 검색의 상위 K개를 얼마나 그대로 찾는지(recall@K)를 비교합니다.
+# 01_build_feature_db.py 의 FEATURE_CODEC 을 고르기 전에 실행해 보세요.
+#
+# 사용 예:
+#   python .\04_feature_codec_report.py                      (feature_db 저장소의 원본 특징 사용)
+#   python .\04_feature_codec_report.py --synthetic 100000   (합성 데이터)
+
+# --- 1. 설정 및 상수 정의 ---
+DB_DIR = "feature_db"
+DEFAULT_QUERIES = 200
+DEFAULT_TOP_K = 5  # 02_run_realtime_webcam.py 의 TOP_K 와 동일
+DEFAULT_OUTPUT_PATH = "feature_codec_report.json"
+SYNTHETIC_DIM = 1280
+SYNTHETIC_RANK = 64  # 합성 특징의 실제 자유도
+
+# --- 2. 데이터 준비 ---
+
+def load_store_features(directory):
+    """저장소의 원본 float32 특징을 읽습니다. 이미 압축된 저장소이면 기준값이 없으므로 None."""
+    store = open_store(directory, legacy_npz_path=None)
+    if load_codec(store).kind != CODEC_FLOAT32 or not store.has_column('features'):
+        return None
+    return np.asarray(store.column('features')[store.alive_indices()], dtype=np.float32)
+
+def synthetic_features(n, dim=SYNTHETIC_DIM, seed=0):
+    """
+    CNN 특징처럼 낮은 차원의 구조(배경 종류)를 가진 음이 아닌 특징을 만듭니다.
+    (완전한 무작위 벡터는 압축/검색 특성이 실제 DB와 전혀 달라 비교에 쓸 수 없습니다.)
+    """
+    rng = np.random.default_rng(seed)
+    basis = rng.standard_normal((SYNTHETIC_RANK, dim)).astype(np.float32)
+    latent = rng.standard_normal((n, SYNTHETIC_RANK)).astype(np.float32)
+    return np.maximum(latent @ basis, 0) + rng.gamma(1.0, 0.05, (n, dim)).astype(np.float32)
+
+# --- 3. 메인 ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="특징 압축 형식별 크기와 검색 재현율(recall@K)을 비교합니다.")
+    parser.add_argument('--db-dir', default=DB_DIR, help="원본(float32) 특징을 읽을 저장소 폴더")
+    parser.add_argument('--synthetic', type=int, default=0, help="저장소 대신 이 개수의 합성 특징 사용")
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES, help="질의로 사용할 벡터 수 (DB에서 뽑아 잡음 추가)")
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    parser.add_argument('--pq-subspaces', type=int, default=DEFAULT_PQ_SUBSPACES)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_PATH, help="결과 JSON 파일 경로")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        features = synthetic_features(args.synthetic)
+        source = f"synthetic:{args.synthetic}"
+    else:
+        features = load_store_features(args.db_dir)
+        source = args.db_dir
+        if features is None:
+            print(f"!!! '{args.db_dir}' 저장소에 원본(float32) 특징이 없습니다. float32 로 빌드하거나 --synthetic 을 사용하세요.")
+            return 1
+    if len(features) < 2:
+        print("!!! 비교할 특징이 부족합니다."); return 1
+
+    # 질의: DB 벡터에 약간의 잡음을 더해 '비슷하지만 똑같지는 않은' 웹캠 화면을 흉내냅니다.
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(features), min(args.queries, len(features)), replace=False)
+    queries = features[picks] + rng.normal(0, 0.1 * features.std(), (len(picks), features.shape[1])).astype(np.float32)
+
+    print(f">>> {source}: 벡터 {len(features)}개 x {features.shape[1]}차원, 질의 {len(queries)}개, recall@{args.top_k}")
+    report = recall_report(features, queries, CODECS, k=args.top_k, pq_subspaces=args.pq_subspaces)
+    print(f"  {'형식':<10}{'바이트/벡터':>12}{'압축률':>10}{'DB 전체(MB)':>14}{'recall':>10}")
+    for row in report:
+        total_mb = row['bytes_per_vector'] * len(features) / (1024 * 1024)
+        row['total_mb'] = total_mb
+        print(f"  {row['codec']:<10}{row['bytes_per_vector']:>12.0f}{row['compression']:>9.1f}x{total_mb:>14.2f}{row['recall']:>10.3f}")
+
+    result = {'source': source, 'vectors': int(len(features)), 'dim': int(features.shape[1]), 'queries': int(len(queries)),
+              'top_k': args.top_k, 'pq_subspaces': args.pq_subspaces, 'codecs': report}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=1)
+    print(f"\n>>> 결과를 '{args.output}' 에 저장했습니다.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
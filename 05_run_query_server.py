@@ -0,0 +1,79 @@
+import sys
+import argparse
+from feature_store import open_store
+from search_index import FeatureIndex, SEARCH_MODE_AUTO
+from model_loader import ModelRunner, create_interpreter, warm_up
+from query_service import QueryBatcher, QueryServer, DEFAULT_HOST, DEFAULT_PORT, MAX_BATCH_SIZE, MAX_BATCH_WAIT_S
+from metrics import metrics
+
+# --- 배경 유사도 질의 서버 ---
+# 01_build_feature_db.py 로 만든 특징 DB 와 특징 추출 모델을 한 번만 올려 두고, 로컬 소켓으로 질의를 받습니다.
+# 안드로이드 앱 등 다른 프로그램이 이미지(또는 특징 벡터)를 보내면 상위 K개 경로/거리/가이드 keypoints 를 돌려줍니다.
+# 메시지 형식은 query_service.py 참고, 부하 시험은 06_query_load_test.py 를 사용하세요.
+#
+# 사용 예:
+#   python .\05_run_query_server.py
+#   python .\05_run_query_server.py --port 9000 --max-batch 32
+
+# --- 1. 설정 및 상수 정의 ---
+DB_DIR = "feature_db"
+LEGACY_DB_PATH = "feature_db.npz"
+FEATURE_MODEL_PATH = "models/feature_extractor.tflite"
+SEARCH_INDEX_MODE = SEARCH_MODE_AUTO
+INTERPRETER_NUM_THREADS = 4  # 서버는 특징 모델 하나만 쓰므로 스레드를 넉넉히 줍니다.
+USE_XNNPACK = True
+
+# --- 성능 계측 (metrics.py 참고) ---
+METRICS_JSON_PATH = "metrics_server.jsonl"
+METRICS_PROMETHEUS_PATH = "aiguidecam_server.prom"
+
+# --- 2. 메인 ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="특징 DB 배경 유사도 질의 서버")
+    parser.add_argument('--host', default=DEFAULT_HOST, help="수신 주소 (기본: 이 컴퓨터에서만 접속 가능)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--db-dir', default=DB_DIR)
+    parser.add_argument('--model', default=FEATURE_MODEL_PATH, help="특징 추출 모델 경로")
+    parser.add_argument('--features-only', action='store_true', help="모델을 로드하지 않고 특징 벡터 질의만 처리")
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH_SIZE, help="한 번에 모아 처리할 최대 질의 수")
+    parser.add_argument('--batch-wait-ms', type=float, default=MAX_BATCH_WAIT_S * 1000.0, help="질의를 모으며 기다리는 최대 시간")
+    parser.add_argument('--threads', type=int, default=INTERPRETER_NUM_THREADS, help="Interpreter 스레드 수")
+    parser.add_argument('--metrics', action='store_true', help="단계별 소요 시간을 파일로 내보내기")
+    args = parser.parse_args(argv)
+
+    if args.metrics:
+        metrics.configure(json_path=METRICS_JSON_PATH, prometheus_path=METRICS_PROMETHEUS_PATH)
+
+    print(">>> 특징 DB 및 AI 모델 로드 중...")
+    try:
+        store = open_store(args.db_dir, LEGACY_DB_PATH)
+        index = FeatureIndex.from_store(store, mode=SEARCH_INDEX_MODE)
+        runner = None
+        if not args.features_only:
+            interpreter = create_interpreter(args.model, args.threads, USE_XNNPACK)
+            warm_up(interpreter)
+            runner = ModelRunner(interpreter, "feature")
+        batcher = QueryBatcher(index, store, runner, args.max_batch, args.batch_wait_ms / 1000.0).start()
+        server = QueryServer(batcher, args.host, args.port)
+    except Exception as e:
+        print(f"!!! 초기화 실패: {e}"); return 1
+
+    info = server.info()
+    print(f">>> {args.host}:{args.port} 에서 질의를 기다립니다. (DB {info['db_size']}개, {info['codec']}, "
+          f"최대 배치 {args.max_batch}, {'특징 벡터만' if runner is None else '이미지/특징 벡터'})")
+    print(">>> Ctrl+C 로 종료합니다.")
+    try:
+        server.serve_forever(poll_interval=0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.stop()
+        metrics.export()
+    if batcher.batches:
+        print(f"\n>>> 처리한 질의 {batcher.queries}개, 배치 {batcher.batches}개 (평균 {batcher.queries / batcher.batches:.2f}개/배치)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import numpy as np
+import cv2
+from query_service import QueryClient, QueryError, DEFAULT_HOST, DEFAULT_PORT, DEFAULT_TOP_K
+
+# --- 질의 서버 부하 시험 ---
+# 05_run_query_server.py 로 띄운 서버에 여러 클라이언트(스레드, 클라이언트마다 연결 하나)가 동시에 질의를 보내
+# 요청 지연 시간(p50/p95/p99), 처리량, 서버가 실제로 묶어 처리한 배치 크기를 측정합니다.
+#
+# 사용 예:
+#   python .\05_run_query_server.py                                  (다른 터미널)
+#   python .\06_query_load_test.py --clients 8 --requests 50
+#   python .\06_query_load_test.py --mode features --clients 32      (특징 벡터 질의: 검색만 측정)
+
+# --- 1. 설정 및 상수 정의 ---
+DEFAULT_SOURCE = "db_images"
+DEFAULT_CLIENTS = 4
+DEFAULT_REQUESTS = 25          # 클라이언트마다 보낼 질의 수
+QUERY_IMAGE_SIZE = (640, 480)  # 모바일 미리보기 정도의 크기로 줄여 JPEG 으로 보냄
+JPEG_QUALITY = 85
+PERCENTILES = (50, 95, 99)
+DEFAULT_OUTPUT_PATH = "query_load_test.json"
+IMAGE_EXTENSIONS = ('.jpg', '.png', '.jpeg')
+
+# --- 2. 질의 준비 ---
+
+def load_query_images(source, limit=32):
+    """폴더의 이미지를 QUERY_IMAGE_SIZE 로 줄여 JPEG 바이트로 인코딩해 둡니다. (측정 중에는 인코딩하지 않음)"""
+    files = sorted(f for f in os.listdir(source) if f.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    payloads = []
+    for filename in files:
+        image = cv2.imread(os.path.join(source, filename))
+        if image is None:
+            continue
+        ok, encoded = cv2.imencode('.jpg', cv2.resize(image, QUERY_IMAGE_SIZE), [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        if ok:
+            payloads.append(encoded.tobytes())
+    return payloads
+
+def random_features(dim, count, seed=0):
+    return np.abs(np.random.default_rng(seed).standard_normal((count, dim))).astype(np.float32)
+
+# --- 3. 부하 시험 ---
+
+def summarize(samples):
+    """소요 시간 목록을 밀리초 단위 통계로 요약합니다."""
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    summary = {'count': int(ms.size), 'mean_ms': float(ms.mean()), 'max_ms': float(ms.max())}
+    for p, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+        summary[f'p{p}_ms'] = float(value)
+    return summary
+
+def run_client(client_id, args, queries, barrier, record):
+    """연결 하나로 질의를 args.requests 번 보내고 (지연 시간, 배치 크기) 를 record 에 모읍니다."""
+    latencies, batch_sizes, errors = [], [], []
+    try:
+        with QueryClient(args.host, args.port) as client:
+            barrier.wait()
+            for i in range(args.requests):
+                query = queries[(client_id + i * args.clients) % len(queries)]
+                start = time.perf_counter()
+                try:
+                    if args.mode == 'image':
+                        response = client.query_image(query, args.top_k)
+                    else:
+                        response = client.query_features(query, args.top_k)
+                except QueryError as e:
+                    errors.append(str(e))
+                    continue
+                latencies.append(time.perf_counter() - start)
+                batch_sizes.append(response['batch_size'])
+    except (OSError, threading.BrokenBarrierError) as e:
+        errors.append(str(e))
+        barrier.abort()
+    record(latencies, batch_sizes, errors)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="배경 유사도 질의 서버 부하 시험")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--mode', choices=('image', 'features'), default='image',
+                        help="image: 이미지를 보내 특징 추출+검색 / features: 특징 벡터를 보내 검색만")
+    parser.add_argument('--source', default=DEFAULT_SOURCE, help="질의 이미지 폴더")
+    parser.add_argument('--clients', type=int, default=DEFAULT_CLIENTS, help="동시에 질의하는 클라이언트 수")
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="클라이언트마다 보낼 질의 수")
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_PATH, help="결과 JSON 파일 경로")
+    args = parser.parse_args(argv)
+
+    try:
+        with QueryClient(args.host, args.port) as client:
+            info = client.info()
+    except OSError as e:
+        print(f"!!! 서버({args.host}:{args.port})에 연결할 수 없습니다: {e}"); return 1
+    print(f">>> 서버: DB {info['db_size']}개, {info['feature_dim']}차원 {info['codec']}, 최대 배치 {info['max_batch_size']}")
+
+    if args.mode == 'image':
+        queries = load_query_images(args.source) if os.path.isdir(args.source) else []
+        if not queries:
+            print(f"!!! '{args.source}' 에서 질의 이미지를 읽을 수 없습니다."); return 1
+    else:
+        if not info['feature_dim']:
+            print("!!! 서버 DB 가 비어 있어 특징 차원을 알 수 없습니다."); return 1
+        queries = random_features(info['feature_dim'], 64)
+
+    latencies, batch_sizes, errors = [], [], []
+    lock = threading.Lock()
+    def record(client_latencies, client_batch_sizes, client_errors):
+        with lock:
+            latencies.extend(client_latencies); batch_sizes.extend(client_batch_sizes); errors.extend(client_errors)
+
+    barrier = threading.Barrier(args.clients + 1)
+    threads = [threading.Thread(target=run_client, args=(i, args, queries, barrier, record)) for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    try:
+        barrier.wait()  # 모든 클라이언트가 연결된 뒤 동시에 시작
+    except threading.BrokenBarrierError:
+        pass
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if not latencies:
+        print(f"!!! 성공한 질의가 없습니다. {errors[:1]}"); return 1
+    summary = summarize(latencies)
+    throughput = len(latencies) / elapsed
+    print(f"\n>>> {args.mode} 질의 {len(latencies)}개 (클라이언트 {args.clients}개, 실패 {len(errors)}개), {elapsed:.2f}s")
+    print(f"  지연 시간(ms): 평균 {summary['mean_ms']:.2f}, p50 {summary['p50_ms']:.2f}, "
+          f"p95 {summary['p95_ms']:.2f}, p99 {summary['p99_ms']:.2f}")
+    print(f"  처리량: {throughput:.1f} 질의/초, 평균 배치 크기: {np.mean(batch_sizes):.2f}")
+    if errors:
+        print(f"  첫 번째 오류: {errors[0]}")
+
+    result = {'server': info, 'mode': args.mode, 'clients': args.clients, 'requests_per_client': args.requests,
+              'top_k': args.top_k, 'elapsed_s': elapsed, 'throughput_qps': throughput, 'latency': summary,
+              'mean_batch_size': float(np.mean(batch_sizes)), 'errors': len(errors)}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=1)
+    print(f"\n>>> 결과를 '{args.output}' 에 저장했습니다.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import numpy as np
+from feature_codec import store_columns, search_codes
+
+# --- 중복(거의 같은 사진) 제거 ---
+# 연속 촬영처럼 배경 특징이 거의 같은 사진들은 메모리만 차지하고 검색을 느리게 하며, 상위 5개를 같은 장면으로 채웁니다.
+# 특징 벡터 사이의 코사인 거리가 threshold 이하이면 같은 장면으로 보고, 각 묶음에서 대표 하나만 남깁니다.
+# - 순서대로 보면서 '이미 남긴 항목' 중 가까운 것이 있으면 중복으로 버립니다. (먼저 들어온 항목이 대표)
+#   이렇게 하면 A~B, B~C 처럼 조금씩 달라지는 연속 사진이 하나로 이어 붙지 않습니다.
+# - 유사도는 (후보 블록 x 남긴 항목 블록) 단위로 계산하므로 N x N 행렬을 한 번에 만들지 않습니다.
+#   (임시 메모리는 block_rows x block_rows 정도)
+# - codes 는 저장소 열 값 그대로(float32 원본 또는 float16 / int8 / pq 코드) 넘기면 되고, 블록을 읽을 때마다
+#   float32 로 풀어 다시 정규화한 뒤 비교합니다. 두 항목을 같은 방식으로 풀어 비교하므로 코드가 같으면 유사도가 정확히 1 입니다.
+#   (PQ 의 비대칭 거리는 자기 자신과도 1 이 되지 않아 중복 판단에는 쓰지 않습니다.)
+
+# --- 1. 설정 및 상수 정의 ---
+DEFAULT_DUPLICATE_DISTANCE = 0.03  # 코사인 거리. 이 값 이하이면 같은 장면으로 봄 (0 이면 완전히 같은 특징만)
+DEDUP_BLOCK_ROWS = 4096
+
+# --- 2. 블록 단위 중복 찾기 ---
+
+def _vectors(codec, codes):
+    """저장소 열 값 블록을 정규화된 float32 벡터로 풉니다."""
+    vectors = np.array(codec.decode(search_codes(codec, codes)), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+def _best_matches(codec, codes, queries, block_rows):
+    """queries (q, dim) 마다 codes 중 가장 비슷한 행 번호와 유사도를 블록 단위로 찾습니다. codes 가 비어 있으면 (-1, -inf)."""
+    best_index = np.full(len(queries), -1, dtype=np.int64)
+    best_similarity = np.full(len(queries), -np.inf, dtype=np.float32)
+    for start in range(0, len(codes), block_rows):
+        similarities = _vectors(codec, codes[start:start + block_rows]) @ queries.T  # (block, q)
+        block_best = np.argmax(similarities, axis=0)
+        block_similarity = similarities[block_best, np.arange(len(queries))]
+        better = block_similarity > best_similarity
+        best_index[better] = start + block_best[better]
+        best_similarity[better] = block_similarity[better]
+    return best_index, best_similarity
+
+def find_duplicates(codec, codes, reference_codes=None, threshold=DEFAULT_DUPLICATE_DISTANCE, block_rows=DEDUP_BLOCK_ROWS):
+    """
+    codes (후보, 저장소 열과 같은 형식) 를 순서대로 보며 중복을 찾습니다.
+    reference_codes 는 이미 DB 에 남아 있는 항목으로, 항상 대표로 남기며 후보보다 먼저인 것으로 봅니다.
+
+    반환: (keep, duplicate_of, similarity) - 모두 후보 수 길이의 배열
+      keep[i]         후보 i 를 남기면 True
+      duplicate_of[i] 버린 후보의 대표. 0 <= 값 < len(reference_codes) 이면 기준 항목 번호,
+                      그 이상이면 len(reference_codes) + 후보 번호. 남긴 후보는 -1
+      similarity[i]   대표와의 코사인 유사도 (남긴 후보는 nan)
+    """
+    n = len(codes)
+    n_reference = 0 if reference_codes is None else len(reference_codes)
+    min_similarity = 1.0 - threshold
+    keep = np.zeros(n, dtype=bool)
+    duplicate_of = np.full(n, -1, dtype=np.int64)
+    similarity = np.full(n, np.nan, dtype=np.float32)
+    kept_indices = []
+
+    for start in range(0, n, block_rows):
+        stop = min(start + block_rows, n)
+        queries = _vectors(codec, codes[start:stop])
+
+        # 1) 기준 항목(기존 DB) 및 앞 블록들에서 남긴 후보와 비교
+        best_index, best_similarity = np.full(stop - start, -1, dtype=np.int64), np.full(stop - start, -np.inf, dtype=np.float32)
+        if n_reference:
+            best_index, best_similarity = _best_matches(codec, reference_codes, queries, block_rows)
+        if kept_indices:
+            kept = np.asarray(kept_indices, dtype=np.int64)
+            kept_best, kept_similarity = _best_matches(codec, RowSubset(codes, kept), queries, block_rows)
+            better = kept_similarity > best_similarity
+            best_index[better] = n_reference + kept[kept_best[better]]
+            best_similarity[better] = kept_similarity[better]
+
+        # 2) 블록 안에서는 순서가 중요하므로, 블록 내 유사도를 한 번 계산한 뒤 차례로 결정합니다.
+        within = queries @ queries.T  # (block, block), within[j, i] = 후보 start+j 와 start+i
+        for i in range(stop - start):
+            if best_similarity[i] >= min_similarity:
+                duplicate_of[start + i] = best_index[i]
+                similarity[start + i] = best_similarity[i]
+                continue
+            keep[start + i] = True
+            kept_indices.append(start + i)
+            # 이 후보보다 뒤에 있고 아직 대표가 정해지지 않은 후보 중, 더 가까우면 이 후보를 대표로 갱신
+            later = within[i, i + 1:]
+            closer = later > best_similarity[i + 1:]
+            best_index[i + 1:][closer] = n_reference + start + i
+            best_similarity[i + 1:][closer] = later[closer]
+    return keep, duplicate_of, similarity
+
+class RowSubset:
+    """
+    codes[rows] 를 한 번에 복사하지 않고, 블록 단위로 잘라 읽을 때만 골라 가져오는 얇은 보기.
+    (예: RowSubset(store.column(...), store.alive_indices()) 로 저장소의 살아있는 행만 비교)
+    """
+
+    def __init__(self, codes, rows):
+        self._codes = codes
+        self._rows = rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, block):
+        return self._codes[self._rows[block]]
+
+# --- 3. 빌드 / 캡처용 도우미 ---
+
+def dedup_features(codec, features, reference_codes=None, threshold=DEFAULT_DUPLICATE_DISTANCE):
+    """
+    float32 특징 (n, dim) 을 코덱으로 압축해 find_duplicates 를 실행합니다. (01_build_feature_db.py 용)
+    압축된 코드 위에서 비교하므로 검색할 때 보이는 거리와 같은 기준으로 중복을 판단합니다.
+    """
+    codes = next(iter(store_columns(codec, features).values()))
+    return find_duplicates(codec, codes, reference_codes, threshold)
+
+def find_capture_duplicate(search_index, features, threshold=DEFAULT_DUPLICATE_DISTANCE):
+    """
+    새로 찍은 사진의 특징과 가장 가까운 DB 항목이 threshold 이내이면 그 항목({'index', 'path', 'distance'})을,
+    아니면 None 을 반환합니다. (02_run_realtime_webcam.py 의 'k' 저장 전 확인용)
+    검색(PQ 비대칭 거리, IVF 후보만 비교) 대신 빌드 때와 같이 인덱스 코덱으로 압축한 뒤 모든 항목을 풀어서 비교하므로,
+    다음 빌드와 같은 판단을 내립니다. (같은 사진을 다시 찍으면 거리는 0)
+    """
+    if len(search_index) == 0:
+        return None
+    keep, duplicate_of, similarity = dedup_features(search_index.codec, features, search_index.codes, threshold)
+    if keep[0]:
+        return None
+    return search_index.entry(int(duplicate_of[0]), 1.0 - float(similarity[0]))
@@ -0,0 +1,322 @@
+import os
+import numpy as np
+
+# --- 특징 벡터 압축 저장 ---
+# 대용량 DB를 메모리가 적은 키오스크에서 쓰기 위해 배경 특징 벡터를 압축하여 저장하고,
+# 검색은 압축된 코드 위에서 바로 계산합니다. (전체 float32 행렬로 되돌리지 않음)
+# - float32: 기존과 같음. 원본 특징을 'features' 열에 그대로 저장 (기본값)
+# - float16: 정규화된 벡터를 반정밀도로 저장 (1/2 크기)
+# - int8:    정규화된 벡터를 차원별 배율(scale)로 -127~127 정수화 (1/4 크기)
+# - pq:      곱 양자화(Product Quantization). 벡터를 M개 부분 공간으로 나눠 각각 256개 중심 중 하나의 번호(1바이트)로 저장
+#            검색은 질의와 각 중심의 내적 표(M x 256)를 한 번 만든 뒤 코드로 표를 찾아 더하는 비대칭 거리 계산(ADC)
+# float32 이외의 형식은 'feature_codes' 열에 저장하며, 학습된 배율/중심은 저장소 폴더의 codec.npz 에 저장합니다.
+# int8 / pq 는 학습 데이터가 MIN_TRAIN_VECTORS 보다 적으면 float16 으로 대신 저장하고, 저장소가 학습 때보다
+# RETRAIN_GROWTH 배 이상 커지면 다시 학습해 코드를 새로 만듭니다. (01_build_feature_db.py 의 prepare_codec 참고)
+
+# --- 1. 설정 및 상수 정의 ---
+CODEC_FLOAT32 = "float32"
+CODEC_FLOAT16 = "float16"
+CODEC_INT8 = "int8"
+CODEC_PQ = "pq"
+CODECS = (CODEC_FLOAT32, CODEC_FLOAT16, CODEC_INT8, CODEC_PQ)
+
+RAW_FEATURES_COLUMN = "features"      # float32 형식: 원본(정규화 전) 특징
+CODES_COLUMN = "feature_codes"        # 그 외 형식: 정규화된 특징의 압축 코드
+CODEC_FILE = "codec.npz"
+
+DEFAULT_PQ_SUBSPACES = 64   # 부분 공간 수 M (= 벡터 하나당 바이트 수)
+PQ_CENTROIDS = 256          # 부분 공간마다 중심 수 (코드 1바이트)
+PQ_TRAIN_SAMPLES = 50_000
+PQ_TRAIN_ITERS = 15
+MIN_TRAIN_VECTORS = {CODEC_INT8: 1_000, CODEC_PQ: 4 * PQ_CENTROIDS}  # 이보다 적으면 float16 으로 대신 저장
+RETRAIN_GROWTH = 4          # 저장소가 학습에 쓴 벡터 수의 이 배수 이상이 되면 다시 학습 (PQ_TRAIN_SAMPLES 이상 학습했으면 안 함)
+DISTANCE_BLOCK_ROWS = 65_536  # 코드를 float32 로 바꿔 계산할 때 한 번에 처리하는 행 수 (임시 메모리 제한)
+
+def _normalize_rows(matrix):
+    matrix = np.array(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+def _blocks(n):
+    for start in range(0, n, DISTANCE_BLOCK_ROWS):
+        yield slice(start, min(start + DISTANCE_BLOCK_ROWS, n))
+
+# --- 2. 형식별 코덱 ---
+# 모든 코덱은 정규화된 벡터를 다룹니다.
+# - encode(vectors) -> 코드, decode(codes) -> float32 벡터
+# - similarities(codes, query) -> 정규화된 질의와의 내적 (코사인 유사도 근사), 코사인 거리 = 1 - 유사도
+#   query 가 (dim,) 이면 (n,), 여러 질의 (q, dim) 이면 (n, q) 를 반환합니다.
+
+class Float32Codec:
+    kind = CODEC_FLOAT32
+    column = RAW_FEATURES_COLUMN
+    trained = True
+    trained_count = 0  # 학습에 쓴 벡터 수 (학습이 필요 없는 형식은 0)
+
+    def __init__(self, dim=None):
+        self.dim = dim
+
+    def train(self, vectors):
+        self.dim = vectors.shape[1]
+        return self
+
+    def encode(self, vectors):
+        return np.asarray(vectors, dtype=np.float32)
+
+    def decode(self, codes):
+        return np.asarray(codes, dtype=np.float32)
+
+    def similarities(self, codes, query):
+        return codes @ query.T
+
+    def params(self):
+        return {}
+
+class Float16Codec(Float32Codec):
+    kind = CODEC_FLOAT16
+    column = CODES_COLUMN
+
+    def encode(self, vectors):
+        return np.asarray(vectors, dtype=np.float16)
+
+    def similarities(self, codes, query):
+        # NumPy 는 float16 행렬 곱에 BLAS 를 쓰지 못하므로 블록 단위로 float32 로 바꿔 계산합니다.
+        out = np.empty((len(codes), *query.shape[:-1]), dtype=np.float32)
+        for block in _blocks(len(codes)):
+            out[block] = codes[block].astype(np.float32) @ query.T
+        return out
+
+class Int8Codec(Float32Codec):
+    """차원별 배율 scale[d] = 학습 데이터에서 |x[d]| 의 최댓값 / 127. x ≈ code * scale."""
+    kind = CODEC_INT8
+    column = CODES_COLUMN
+    trained = False
+
+    def __init__(self, dim=None, scale=None):
+        super().__init__(dim)
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float32)
+        self.trained = self.scale is not None
+
+    def train(self, vectors):
+        self.dim = vectors.shape[1]
+        max_abs = np.abs(vectors).max(axis=0)
+        self.scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+        self.trained = True
+        return self
+
+    def encode(self, vectors):
+        # 학습 이후 추가된 벡터가 범위를 넘으면 잘라냅니다.
+        return np.clip(np.rint(np.asarray(vectors, dtype=np.float32) / self.scale), -127, 127).astype(np.int8)
+
+    def decode(self, codes):
+        return np.asarray(codes, dtype=np.float32) * self.scale
+
+    def similarities(self, codes, query):
+        # x . q = sum(code[d] * scale[d] * q[d]) 이므로 질의에 배율을 한 번만 곱해 둡니다.
+        scaled_query = (self.scale * query).astype(np.float32)
+        out = np.empty((len(codes), *query.shape[:-1]), dtype=np.float32)
+        for block in _blocks(len(codes)):
+            out[block] = codes[block].astype(np.float32) @ scaled_query.T
+        return out
+
+    def params(self):
+        return {'scale': self.scale}
+
+class PQCodec(Float32Codec):
+    """곱 양자화. 차원이 M 으로 나누어떨어지지 않으면 0을 덧붙여 맞춥니다."""
+    kind = CODEC_PQ
+    column = CODES_COLUMN
+    trained = False
+
+    def __init__(self, dim=None, subspaces=DEFAULT_PQ_SUBSPACES, centroids=None):
+        super().__init__(dim)
+        self.subspaces = int(subspaces)
+        self.centroids = None if centroids is None else np.asarray(centroids, dtype=np.float32)  # (M, 256, dsub)
+        self.trained = self.centroids is not None
+
+    @property
+    def _sub_dim(self):
+        return -(-self.dim // self.subspaces)
+
+    def _split(self, vectors):
+        """(n, dim) -> (M, n, dsub)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        padded_dim = self._sub_dim * self.subspaces
+        if padded_dim != vectors.shape[1]:
+            vectors = np.pad(vectors, ((0, 0), (0, padded_dim - vectors.shape[1])))
+        return vectors.reshape(len(vectors), self.subspaces, self._sub_dim).transpose(1, 0, 2)
+
+    def train(self, vectors, seed=0):
+        self.dim = vectors.shape[1]
+        self.subspaces = min(self.subspaces, self.dim)
+        rng = np.random.default_rng(seed)
+        if len(vectors) > PQ_TRAIN_SAMPLES:
+            vectors = vectors[rng.choice(len(vectors), PQ_TRAIN_SAMPLES, replace=False)]
+        parts = self._split(vectors)
+        n_centroids = min(PQ_CENTROIDS, len(vectors))
+        centroids = np.zeros((self.subspaces, PQ_CENTROIDS, self._sub_dim), dtype=np.float32)
+        for j, part in enumerate(parts):
+            centroids[j, :n_centroids] = _kmeans(part, n_centroids, rng)
+        if n_centroids < PQ_CENTROIDS:
+            # 학습 데이터가 적으면 남는 번호는 쓰이지 않도록 첫 중심을 복사해 둡니다.
+            centroids[:, n_centroids:] = centroids[:, :1]
+        self.centroids = centroids
+        self.trained = True
+        return self
+
+    def encode(self, vectors):
+        codes = np.empty((len(vectors), self.subspaces), dtype=np.uint8)
+        for block in _blocks(len(vectors)):
+            for j, part in enumerate(self._split(vectors[block])):
+                codes[block, j] = _nearest(part, self.centroids[j])
+        return codes
+
+    def decode(self, codes):
+        codes = np.asarray(codes)
+        parts = self.centroids[np.arange(self.subspaces), codes]  # (n, M, dsub)
+        return parts.reshape(len(codes), -1)[:, :self.dim]
+
+    def similarities(self, codes, query):
+        # 비대칭 거리 계산: 질의(원본)와 각 부분 공간 중심의 내적 표를 만든 뒤 코드로 찾아 더합니다.
+        queries = np.atleast_2d(query)
+        tables = np.einsum('mkd,mqd->qmk', self.centroids, self._split(queries))  # (q, M, 256)
+        out = np.empty((len(codes), len(queries)), dtype=np.float32)
+        subspace = np.arange(self.subspaces)
+        for block in _blocks(len(codes)):
+            for i, table in enumerate(tables):
+                out[block, i] = table[subspace, codes[block]].sum(axis=1)
+        return out if query.ndim > 1 else out[:, 0]
+
+    def params(self):
+        return {'subspaces': np.array(self.subspaces), 'centroids': self.centroids}
+
+def _nearest(vectors, centroids):
+    """각 벡터와 가장 가까운(유클리드) 중심 번호."""
+    distances = (centroids ** 2).sum(axis=1)[np.newaxis] - 2 * vectors @ centroids.T
+    return np.argmin(distances, axis=1)
+
+def _kmeans(vectors, k, rng):
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(PQ_TRAIN_ITERS):
+        assign = _nearest(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        centroids = np.where(empty[:, np.newaxis], vectors[rng.integers(len(vectors), size=k)], sums / np.maximum(counts, 1)[:, np.newaxis])
+    return centroids.astype(np.float32)
+
+# --- 3. 생성 / 저장 / 불러오기 ---
+
+def make_codec(kind, **kwargs):
+    """학습되지 않은 코덱을 만듭니다."""
+    classes = {CODEC_FLOAT32: Float32Codec, CODEC_FLOAT16: Float16Codec, CODEC_INT8: Int8Codec, CODEC_PQ: PQCodec}
+    if kind not in classes:
+        raise ValueError(f"알 수 없는 특징 저장 형식입니다: {kind} (가능: {', '.join(CODECS)})")
+    return classes[kind](**kwargs)
+
+def fit_codec(codec, vectors):
+    """
+    학습되지 않은 codec 을 정규화된 vectors 로 학습해 반환합니다.
+    학습 데이터가 MIN_TRAIN_VECTORS 보다 적으면 (예: 빈 인덱스에 사진 한 장 추가) 대신 float16 코덱을 반환합니다.
+    """
+    if len(vectors) < MIN_TRAIN_VECTORS.get(codec.kind, 0):
+        codec = Float16Codec()
+    codec.train(vectors)
+    codec.trained_count = len(vectors)
+    return codec
+
+def train_codec(kind, features, **kwargs):
+    """원본 특징 벡터들을 정규화하여 kind 형식의 코덱을 학습합니다. (학습 데이터가 적으면 float16, fit_codec 참고)"""
+    return fit_codec(make_codec(kind, **kwargs), _normalize_rows(features))
+
+def needs_retraining(codec, kind, n_vectors):
+    """
+    저장소 코덱을 kind 형식으로 다시 학습해야 하면 True.
+    - 학습 데이터가 적어 float16 으로 대신 저장했는데 이제 MIN_TRAIN_VECTORS 이상이 된 경우
+    - 학습 때보다 저장소가 RETRAIN_GROWTH 배 이상 커진 경우 (PQ 중심 수, int8 배율이 작은 표본에 맞춰져 있음)
+    """
+    if kind not in MIN_TRAIN_VECTORS or n_vectors < MIN_TRAIN_VECTORS[kind]:
+        return False
+    if codec.kind != kind:
+        return True
+    return codec.trained_count < PQ_TRAIN_SAMPLES and n_vectors >= RETRAIN_GROWTH * codec.trained_count
+
+def codec_path(store):
+    return os.path.join(store.directory, CODEC_FILE)
+
+def save_codec(store, codec):
+    """코덱 설정을 저장소 폴더에 씁니다. float32 는 설정이 필요 없으므로 파일을 지웁니다."""
+    path = codec_path(store)
+    if codec.kind == CODEC_FLOAT32:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(store.directory, exist_ok=True)
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, kind=np.array(codec.kind), dim=np.array(codec.dim), trained_count=np.array(codec.trained_count),
+             **codec.params())
+    os.replace(tmp_path, path)
+
+def load_codec(store):
+    """저장소의 코덱을 불러옵니다. 설정 파일이 없으면 기존 형식(float32)입니다."""
+    path = codec_path(store)
+    if not os.path.exists(path):
+        dim = store.columns[RAW_FEATURES_COLUMN]['shape'][0] if store.has_column(RAW_FEATURES_COLUMN) else None
+        return Float32Codec(dim)
+    with np.load(path, allow_pickle=False) as data:
+        params = {name: data[name] for name in data.files}
+    kind, dim = str(params.pop('kind')), int(params.pop('dim'))
+    # 예전 설정 파일에는 학습 벡터 수가 없으므로 0 으로 보아, 다음 빌드에서 한 번 다시 학습합니다.
+    trained_count = int(params.pop('trained_count', 0))
+    if 'subspaces' in params:
+        params['subspaces'] = int(params['subspaces'])
+    codec = make_codec(kind, dim=dim, **params)
+    codec.trained_count = trained_count
+    return codec
+
+def store_columns(codec, features):
+    """
+    특징 벡터들(원본 모델 출력)을 저장소에 넣을 열 dict 로 만듭니다.
+    float32 는 기존과 같이 원본을, 그 외 형식은 정규화 후 압축한 코드를 저장합니다.
+    """
+    features = np.asarray(features, dtype=np.float32).reshape(-1, codec.dim or np.shape(features)[-1])
+    if codec.kind == CODEC_FLOAT32:
+        return {RAW_FEATURES_COLUMN: features}
+    return {CODES_COLUMN: codec.encode(_normalize_rows(features))}
+
+def search_codes(codec, stored):
+    """저장소 열 값(store_columns 의 결과)을 similarities() 에 바로 쓸 수 있는 코드로 바꿉니다. (float32 원본만 정규화)"""
+    return _normalize_rows(stored) if codec.kind == CODEC_FLOAT32 else np.asarray(stored)
+
+# --- 4. 압축률 / 재현율 비교 ---
+
+def recall_report(features, queries, codec_kinds=CODECS, k=5, pq_subspaces=DEFAULT_PQ_SUBSPACES):
+    """
+    각 형식으로 features 를 압축했을 때, 정확한 float32 검색의 상위 k개를 얼마나 찾는지(recall@k)와
+    벡터 하나당 바이트 수를 비교합니다. [{'codec', 'bytes_per_vector', 'compression', 'recall'}] 를 반환합니다.
+    """
+    vectors = _normalize_rows(features)
+    queries = _normalize_rows(queries)
+    k = min(k, len(vectors))
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+    baseline_bytes = vectors.shape[1] * 4
+    report = []
+    for kind in codec_kinds:
+        codec = make_codec(kind, subspaces=pq_subspaces) if kind == CODEC_PQ else make_codec(kind)
+        codec.train(vectors)
+        codes = codec.encode(vectors)
+        hits = 0
+        for query, truth in zip(queries, exact):
+            scores = codec.similarities(codes, query)
+            found = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            hits += len(np.intersect1d(found, truth))
+        bytes_per_vector = codes.nbytes / len(codes)
+        report.append({
+            'codec': kind,
+            'bytes_per_vector': float(bytes_per_vector),
+            'compression': float(baseline_bytes / bytes_per_vector),
+            'recall': hits / (len(queries) * k),
+        })
+    return report
@@ -0,0 +1,333 @@
+import os
+import json
+import numpy as np
+
+# --- 추가 전용(append-only) 메모리 맵 특징 저장소 ---
+# feature_db.npz 를 통째로 다시 쓰는 대신, 고정 dtype 의 열(column) 파일에 행을 이어 붙이고
+# 헤더(store.json)를 원자적으로 교체하는 방식으로 커밋합니다.
+#
+# 디렉터리 구조 (예: feature_db/):
+#   store.json               헤더: 커밋된 행 수, 세대(generation), 열 정의
+#   <열 이름>.<세대>.bin     각 열의 원시 데이터 (행 단위로 연속 저장, np.memmap 으로 읽음)
+#   paths.<세대>.txt         행마다 한 줄씩 저장된 이미지 경로
+#
+# - 헤더에 기록된 행 수까지만 유효한 데이터로 취급하므로, 추가 도중 프로그램이 종료되어도
+#   다음에 열 때 커밋되지 않은 꼬리 부분은 잘려 나갑니다.
+# - 삭제는 '_deleted' 열에 표시만 하고, compact() 가 살아있는 행만 새 세대 파일로 옮겨 씁니다.
+# - pickle 을 사용하지 않습니다.
+
+# --- 1. 설정 및 상수 정의 ---
+STORE_VERSION = 1
+HEADER_FILE = "store.json"
+DELETED_COLUMN = "_deleted"
+LEGACY_NPZ_PATH = "feature_db.npz"
+WRITE_BLOCK_BYTES = 64 << 20  # 열 전체를 다시 쓸 때(열 추가, 압축) 한 번에 메모리에 올리는 최대 크기
+
+# --- 2. 내부 함수 ---
+
+def _fsync_write(path, data):
+    _fsync_write_blocks(path, [data])
+
+def _fsync_write_blocks(path, blocks):
+    """여러 덩어리로 나눠 만든 데이터를 한 파일에 이어 쓴 뒤 디스크에 반영합니다."""
+    with open(path, 'wb') as f:
+        for block in blocks:
+            f.write(block)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _block_rows(row_bytes):
+    return max(1, WRITE_BLOCK_BYTES // max(1, row_bytes))
+
+def _transform_block(block, transform):
+    """compact() 의 transforms 항목 (dtype, shape, 함수) 로 블록을 바꿉니다. 없으면 그대로 연속 배열로 만듭니다."""
+    if transform is None:
+        return np.ascontiguousarray(block)
+    dtype, shape, fn = transform
+    return np.ascontiguousarray(fn(block), dtype=dtype).reshape(len(block), *shape)
+
+def _truncate(path, size):
+    """파일을 지정한 크기로 맞춥니다. (커밋되지 않은 꼬리 데이터 제거)"""
+    with open(path, 'ab') as f:
+        f.truncate(size)
+
+# --- 3. 특징 저장소 ---
+
+class FeatureStore:
+    """
+    고정 dtype 열과 경로 테이블로 이루어진 추가 전용 특징 DB.
+    - append()/append_many() 는 기존 데이터를 다시 쓰지 않으므로 O(추가한 행 수) 입니다.
+    - column(name) 은 커밋된 행 전체를 읽기 전용 np.memmap 으로 돌려줍니다.
+    - 행 번호는 compact() 전까지 바뀌지 않으므로 다른 자료구조의 키로 사용할 수 있습니다.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._maps = {}
+        self._paths = None
+        self._header = {'version': STORE_VERSION, 'generation': 0, 'count': 0, 'paths_bytes': 0, 'columns': {}}
+        header_path = os.path.join(directory, HEADER_FILE)
+        if os.path.exists(header_path):
+            with open(header_path, 'r', encoding='utf-8') as f:
+                header = json.load(f)
+            if header.get('version') != STORE_VERSION:
+                raise ValueError(f"지원하지 않는 저장소 버전입니다: {header.get('version')}")
+            self._header = header
+            self._discard_uncommitted()
+
+    # --- 파일 경로 및 헤더 ---
+
+    def _column_file(self, name, generation=None):
+        generation = self._header['generation'] if generation is None else generation
+        return os.path.join(self.directory, f"{name}.{generation}.bin")
+
+    def _paths_file(self, generation=None):
+        generation = self._header['generation'] if generation is None else generation
+        return os.path.join(self.directory, f"paths.{generation}.txt")
+
+    def _row_bytes(self, name):
+        spec = self._header['columns'][name]
+        return int(np.dtype(spec['dtype']).itemsize * np.prod(spec['shape'], dtype=np.int64))
+
+    def _write_header(self):
+        """헤더를 임시 파일에 쓰고 교체합니다. 이 교체가 곧 커밋입니다."""
+        tmp_path = os.path.join(self.directory, HEADER_FILE + '.tmp')
+        _fsync_write(tmp_path, json.dumps(self._header, ensure_ascii=False, indent=1).encode('utf-8'))
+        os.replace(tmp_path, os.path.join(self.directory, HEADER_FILE))
+
+    def _discard_uncommitted(self):
+        count = self._header['count']
+        for name in self._header['columns']:
+            path = self._column_file(name)
+            if os.path.exists(path) and os.path.getsize(path) > count * self._row_bytes(name):
+                _truncate(path, count * self._row_bytes(name))
+        path = self._paths_file()
+        if os.path.exists(path) and os.path.getsize(path) > self._header['paths_bytes']:
+            _truncate(path, self._header['paths_bytes'])
+
+    # --- 읽기 ---
+
+    def __len__(self):
+        """삭제 표시된 행을 제외한 살아있는 행의 수."""
+        return int(len(self.alive_indices()))
+
+    @property
+    def count(self):
+        """삭제 표시된 행까지 포함한 전체 행 수 (= 다음에 추가될 행 번호)."""
+        return self._header['count']
+
+    @property
+    def columns(self):
+        return {name: spec for name, spec in self._header['columns'].items() if name != DELETED_COLUMN}
+
+    def has_column(self, name):
+        return name in self._header['columns']
+
+    def column(self, name):
+        """커밋된 모든 행의 열 데이터를 읽기 전용 메모리 맵으로 반환합니다. (삭제된 행 포함)"""
+        cached = self._maps.get(name)
+        if cached is not None:
+            return cached
+        spec = self._header['columns'][name]
+        shape = (self.count, *spec['shape'])
+        if self.count == 0:
+            data = np.empty(shape, dtype=spec['dtype'])
+        else:
+            data = np.memmap(self._column_file(name), dtype=spec['dtype'], mode='r', shape=shape)
+        self._maps[name] = data
+        return data
+
+    @property
+    def filepaths(self):
+        """행 번호 순서의 이미지 경로 목록. (삭제된 행 포함)"""
+        if self._paths is None:
+            path = self._paths_file()
+            if self._header['paths_bytes'] == 0 or not os.path.exists(path):
+                self._paths = []
+            else:
+                with open(path, 'rb') as f:
+                    raw = f.read(self._header['paths_bytes'])
+                self._paths = raw.decode('utf-8').split('\n')[:-1]
+        return self._paths
+
+    def alive_mask(self):
+        if not self.has_column(DELETED_COLUMN):
+            return np.ones(self.count, dtype=bool)
+        return self.column(DELETED_COLUMN) == 0
+
+    def alive_indices(self):
+        return np.flatnonzero(self.alive_mask())
+
+    def rows_by_path(self):
+        """살아있는 행에 대해 이미지 경로 -> 행 번호 사전을 만듭니다."""
+        paths = self.filepaths
+        return {paths[i]: int(i) for i in self.alive_indices()}
+
+    # --- 쓰기 ---
+
+    def _ensure_columns(self, values):
+        """처음 보는 열은 첫 데이터의 dtype/shape 으로 정의합니다. 기존 행은 0으로 채웁니다."""
+        for name, array in values.items():
+            if name in self._header['columns']:
+                continue
+            self.add_column(name, array.dtype, array.shape[1:])
+
+    def add_column(self, name, dtype, shape, fill_value=0):
+        """
+        새 열을 정의합니다. 이미 행이 있으면 fill_value 로 채운 뒤 커밋합니다.
+        이후 append 에서 이 열의 값을 주지 않은 경우에도 fill_value 로 채웁니다.
+        """
+        if name in self._header['columns']:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._header['columns'][name] = {'dtype': np.dtype(dtype).str, 'shape': [int(s) for s in shape], 'fill': np.asarray(fill_value).item()}
+        path = self._column_file(name)
+        # 썸네일처럼 행이 큰 열도 메모리에 한꺼번에 만들지 않도록 나눠서 채웁니다.
+        step = _block_rows(self._row_bytes(name))
+        filler = np.full((min(step, self.count), *shape), fill_value, dtype=dtype)
+        _fsync_write_blocks(path, (filler[:min(step, self.count - start)].tobytes() for start in range(0, self.count, step)))
+        if self.count:
+            self._write_header()
+
+    def append(self, filepath, **values):
+        """한 행을 추가하고 바로 커밋합니다. 추가된 행 번호를 반환합니다."""
+        batch = {name: np.asarray(value)[np.newaxis] for name, value in values.items()}
+        return self.append_many([filepath], **batch)[0]
+
+    def append_many(self, filepaths, **columns):
+        """
+        여러 행을 한 번에 추가한 뒤 한 번만 커밋합니다. 추가된 행 번호 범위를 반환합니다.
+        저장소에 정의된 열 중 값이 주어지지 않은 열은 열의 기본값(fill_value)으로 채웁니다.
+        """
+        filepaths = [str(p) for p in filepaths]
+        n = len(filepaths)
+        if n == 0:
+            return range(self.count, self.count)
+        columns = {name: np.asarray(values) for name, values in columns.items()}
+        for name, values in columns.items():
+            if len(values) != n:
+                raise ValueError(f"'{name}' 열의 행 수({len(values)})가 경로 수({n})와 다릅니다.")
+        os.makedirs(self.directory, exist_ok=True)
+        self._ensure_columns(columns)
+        columns.setdefault(DELETED_COLUMN, np.zeros(n, dtype=np.uint8))
+        self._ensure_columns({DELETED_COLUMN: columns[DELETED_COLUMN]})
+
+        start = self.count
+        for name, spec in self._header['columns'].items():
+            values = columns.get(name)
+            if values is None:
+                values = np.full((n, *spec['shape']), spec.get('fill', 0), dtype=spec['dtype'])
+            values = np.ascontiguousarray(values, dtype=spec['dtype']).reshape(n, *spec['shape'])
+            with open(self._column_file(name), 'r+b' if os.path.exists(self._column_file(name)) else 'wb') as f:
+                f.seek(start * self._row_bytes(name))
+                f.write(values.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+        encoded = ''.join(p.replace('\n', ' ') + '\n' for p in filepaths).encode('utf-8')
+        with open(self._paths_file(), 'r+b' if os.path.exists(self._paths_file()) else 'wb') as f:
+            f.seek(self._header['paths_bytes'])
+            f.write(encoded)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._header['count'] = start + n
+        self._header['paths_bytes'] += len(encoded)
+        self._write_header()
+        self._maps.clear()
+        if self._paths is not None:
+            self._paths.extend(filepaths)
+        return range(start, start + n)
+
+    def delete(self, rows):
+        """행에 삭제 표시를 합니다. 실제 공간은 compact() 에서 회수됩니다."""
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        if len(rows) == 0:
+            return
+        self._ensure_columns({DELETED_COLUMN: np.zeros(1, dtype=np.uint8)})
+        self._maps.pop(DELETED_COLUMN, None)
+        deleted = np.memmap(self._column_file(DELETED_COLUMN), dtype=np.uint8, mode='r+', shape=(self.count,))
+        deleted[rows] = 1
+        deleted.flush()
+        del deleted
+
+    def deleted_ratio(self):
+        return 0.0 if self.count == 0 else 1.0 - len(self) / self.count
+
+    def compact(self, transforms=None):
+        """
+        살아있는 행만 새 세대 파일로 옮겨 쓰고 헤더를 교체합니다.
+        행 번호가 바뀌므로, 반환값(이전 행 번호 배열, 새 번호 순서)으로 외부 자료구조를 갱신해야 합니다.
+        transforms: {열 이름: (dtype, shape, 함수)} 를 주면 그 열은 블록마다 함수(기존 값) 의 결과로 바꿔 씁니다.
+                    (예: 코덱을 다시 학습한 뒤 특징 코드를 새로 인코딩) 헤더와 함께 한 번에 교체됩니다.
+        """
+        transforms = transforms or {}
+        alive = self.alive_indices()
+        old_generation = self._header['generation']
+        new_generation = old_generation + 1
+        for name in self._header['columns']:
+            if name == DELETED_COLUMN:
+                _fsync_write(self._column_file(name, new_generation), np.zeros(len(alive), dtype=np.uint8).tobytes())
+                continue
+            data, step = self.column(name), _block_rows(self._row_bytes(name))
+            transform = transforms.get(name)
+            blocks = (_transform_block(data[alive[i:i + step]], transform).tobytes() for i in range(0, len(alive), step))
+            _fsync_write_blocks(self._column_file(name, new_generation), blocks)
+        for name, (dtype, shape, _) in transforms.items():
+            self._header['columns'][name].update(dtype=np.dtype(dtype).str, shape=[int(s) for s in shape])
+        paths = self.filepaths
+        encoded = ''.join(paths[i] + '\n' for i in alive).encode('utf-8')
+        _fsync_write(self._paths_file(new_generation), encoded)
+
+        self._maps.clear()
+        self._paths = None
+        self._header.update(generation=new_generation, count=int(len(alive)), paths_bytes=len(encoded))
+        self._write_header()
+        for name in self._header['columns']:
+            self._remove_quietly(self._column_file(name, old_generation))
+        self._remove_quietly(self._paths_file(old_generation))
+        return alive
+
+    def reset(self):
+        """모든 행을 지우고 빈 저장소로 되돌립니다. (전체 재구축용)"""
+        old_generation = self._header['generation']
+        old_columns = list(self._header['columns'])
+        self._maps.clear()
+        self._paths = None
+        self._header.update(generation=old_generation + 1, count=0, paths_bytes=0, columns={})
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_header()
+        for name in old_columns:
+            self._remove_quietly(self._column_file(name, old_generation))
+        self._remove_quietly(self._paths_file(old_generation))
+
+    @staticmethod
+    def _remove_quietly(path):
+        try:
+            os.remove(path)
+        except OSError:
+            # Windows 에서는 다른 곳에서 아직 메모리 맵으로 열려 있으면 지울 수 없습니다. 다음 정리 때 무시됩니다.
+            pass
+
+# --- 4. 기존 .npz DB 가져오기 ---
+
+def import_npz(npz_path, directory):
+    """기존 feature_db.npz (features, filepaths) 를 새 저장소 형식으로 옮깁니다."""
+    # 예전 DB 의 filepaths 는 문자열 배열이므로 pickle 없이 읽을 수 있습니다.
+    db_data = np.load(npz_path, allow_pickle=False)
+    store = FeatureStore(directory)
+    store.reset()
+    features = np.asarray(db_data['features'])
+    filepaths = [str(p) for p in db_data['filepaths']]
+    if len(filepaths) and features.ndim == 2:
+        store.append_many(filepaths, features=features.astype(np.float32))
+    return store
+
+def open_store(directory, legacy_npz_path=LEGACY_NPZ_PATH):
+    """
+    저장소를 엽니다. 저장소가 아직 없고 예전 .npz DB 가 있으면 자동으로 가져옵니다.
+    """
+    if not os.path.exists(os.path.join(directory, HEADER_FILE)) and legacy_npz_path and os.path.exists(legacy_npz_path):
+        print(f" - 기존 '{legacy_npz_path}' 를 새 저장소 형식('{directory}')으로 변환합니다.")
+        return import_npz(legacy_npz_path, directory)
+    return FeatureStore(directory)
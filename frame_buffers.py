@@ -0,0 +1,78 @@
+import numpy as np
+import cv2
+
+# --- 프레임 버퍼 재사용 ---
+# 매 프레임 np.zeros / cv2.resize 로 새 배열을 만드는 대신, 미리 할당한 버퍼에 결과를 직접 씁니다.
+# 가이드 모드의 목표 자세 오버레이처럼 바뀌지 않는 그림은 한 번만 그려 두고 해당 픽셀만 합성합니다.
+
+class FrameBufferPool:
+    """이름별로 재사용할 배열을 보관합니다. 요청한 크기/타입이 달라졌을 때만 새로 할당합니다."""
+
+    def __init__(self):
+        self._buffers = {}
+        self._letterbox_rois = {}
+        self.allocations = 0
+
+    def get(self, name, shape, dtype=np.uint8):
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype:
+            buffer = np.zeros(shape, dtype=dtype)
+            self._buffers[name] = buffer
+            self.allocations += 1
+        return buffer
+
+    def copy_into(self, name, image):
+        """image 를 같은 크기의 재사용 버퍼에 복사하여 반환합니다."""
+        buffer = self.get(name, image.shape, image.dtype)
+        np.copyto(buffer, image)
+        return buffer
+
+    def letterbox(self, name, image, width, height):
+        """
+        image 를 비율을 유지한 채 (height, width) 버퍼 가운데에 배치하여 반환합니다. (남는 부분은 검정)
+        버퍼에 직접 resize 하므로 새 배열을 만들지 않으며, 배치 영역이 바뀔 때만 버퍼를 지웁니다.
+        """
+        canvas = self.get(name, (height, width, image.shape[2]), image.dtype)
+        h, w = image.shape[:2]
+        scale = min(width / w, height / h)
+        new_w, new_h = int(w * scale), int(h * scale)
+        y_offset = (height - new_h) // 2
+        x_offset = (width - new_w) // 2
+        roi_key = (x_offset, y_offset, new_w, new_h)
+        if self._letterbox_rois.get(name) != roi_key:
+            canvas[...] = 0
+            self._letterbox_rois[name] = roi_key
+        roi = canvas[y_offset:y_offset + new_h, x_offset:x_offset + new_w]
+        if (new_w, new_h) == (w, h):
+            np.copyto(roi, image)
+        else:
+            cv2.resize(image, (new_w, new_h), dst=roi)
+        return canvas
+
+class MaskedOverlay:
+    """
+    미리 그려 둔 오버레이. apply() 는 cv2.addWeighted(frame, 1, overlay, weight, 0) 와 반올림 차이(채널 값 ±1) 안에서
+    같은 결과를 그림이 있는 픽셀(마스크)과 그 경계 사각형 안에서만 계산합니다.
+    """
+
+    def __init__(self, frame_shape, draw_fn, weight=0.5):
+        self.frame_shape = tuple(frame_shape)
+        canvas = np.zeros(self.frame_shape, dtype=np.uint8)
+        draw_fn(canvas)
+        mask = np.any(canvas > 0, axis=2)
+        ys, xs = np.nonzero(mask)
+        if len(ys) == 0:
+            self._roi = None
+            return
+        y0, y1, x0, x1 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+        self._roi = (slice(y0, y1), slice(x0, x1))
+        self._weighted = cv2.convertScaleAbs(canvas[self._roi], alpha=weight)
+        self._mask = mask[self._roi].astype(np.uint8) * 255
+
+    def apply(self, frame):
+        """프레임에 오버레이를 제자리에서 더합니다. (포화 연산)"""
+        if self._roi is None:
+            return frame
+        roi = frame[self._roi]
+        cv2.add(roi, self._weighted, dst=roi, mask=self._mask)
+        return frame
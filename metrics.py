@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+import numpy as np
+
+# --- 단계별 성능 계측 ---
+# 두 스크립트의 주요 단계(캡처, 전처리, Interpreter.invoke, 검색, 그리기, DB 쓰기)를 span 으로 감싸 소요 시간을 모으고,
+# 버린 프레임 수 / DB 크기 같은 카운터·게이지와 함께 주기적으로 파일에 내보냅니다.
+# - 롤링 JSON 로그: 한 줄에 스냅샷 하나 (JSON Lines), 크기가 넘으면 .1, .2 ... 로 밀어냅니다.
+# - Prometheus 텍스트 파일: node_exporter textfile collector 가 읽는 형식, 매번 원자적으로 교체합니다.
+# 꺼져 있을 때(기본값) span() 은 미리 만들어 둔 빈 컨텍스트를 돌려주고, count()/gauge() 는 바로 반환하므로
+# 프레임마다 호출해도 비용이 거의 없습니다.
+#
+# 사용 예:
+#   from metrics import metrics
+#   metrics.configure(enabled=True, json_path="metrics.jsonl", prometheus_path="aiguidecam.prom")
+#   with metrics.span("search"):
+#       ...
+#   metrics.count("frames")
+#   metrics.maybe_export()
+
+# --- 1. 설정 및 상수 정의 ---
+WINDOW_SIZE = 1024            # 백분위수 계산에 쓰는 span 별 최근 측정값 개수
+QUANTILES = (0.5, 0.95, 0.99)
+DEFAULT_EXPORT_INTERVAL = 5.0  # 초
+DEFAULT_JSON_MAX_BYTES = 5 << 20
+DEFAULT_JSON_BACKUPS = 3
+METRIC_PREFIX = "aiguidecam"
+
+# --- 2. span ---
+
+class _NullSpan:
+    """계측이 꺼져 있을 때 쓰는 빈 컨텍스트. 하나만 만들어 두고 재사용합니다."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ('_metrics', '_name', '_start')
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._metrics.observe(self._name, time.perf_counter() - self._start)
+        return False
+
+class _SpanStats:
+    """span 하나의 누적 횟수/합계와 최근 WINDOW_SIZE 개의 측정값."""
+    __slots__ = ('count', 'total', 'window')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.window = deque(maxlen=WINDOW_SIZE)
+
+# --- 3. 계측 수집기 ---
+
+class Metrics:
+    """
+    span 소요 시간, 카운터, 게이지를 모으는 수집기. 여러 스레드에서 동시에 기록해도 됩니다.
+    기본적으로 꺼져 있으며 configure(enabled=True, ...) 로 켭니다.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._spans = {}
+        self._counters = {}
+        self._gauges = {}
+        self._exporters = []
+        self._export_interval = DEFAULT_EXPORT_INTERVAL
+        self._last_export = time.monotonic()
+
+    def configure(self, enabled=True, json_path=None, prometheus_path=None, export_interval=DEFAULT_EXPORT_INTERVAL):
+        self.enabled = enabled
+        self._export_interval = export_interval
+        self._exporters = []
+        if json_path:
+            self._exporters.append(JsonLogExporter(json_path))
+        if prometheus_path:
+            self._exporters.append(PrometheusTextfileExporter(prometheus_path))
+        return self
+
+    # --- 기록 ---
+
+    def span(self, name):
+        """with metrics.span("이름"): 블록의 소요 시간을 기록합니다."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                stats = self._spans[name] = _SpanStats()
+            stats.count += 1
+            stats.total += seconds
+            stats.window.append(seconds)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_count(self, name, value):
+        """다른 객체가 이미 세고 있는 누적 값(예: 버린 프레임 수)을 카운터로 그대로 기록합니다."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = value
+
+    def gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[name] = value
+
+    # --- 다른 프로세스의 측정값 합치기 (01_build_feature_db.py 의 작업자 프로세스용) ---
+
+    def drain(self):
+        """지금까지 모은 span 측정값과 카운터를 꺼내고 비웁니다. 피클 가능한 dict 를 반환합니다."""
+        with self._lock:
+            spans = {name: list(stats.window) for name, stats in self._spans.items()}
+            counters = dict(self._counters)
+            self._spans.clear()
+            self._counters.clear()
+        return {'spans': spans, 'counters': counters}
+
+    def merge(self, drained):
+        if not self.enabled or not drained:
+            return
+        for name, samples in drained['spans'].items():
+            for seconds in samples:
+                self.observe(name, seconds)
+        for name, value in drained['counters'].items():
+            self.count(name, value)
+
+    # --- 내보내기 ---
+
+    def snapshot(self):
+        """현재 상태를 JSON 으로 직렬화 가능한 dict 로 반환합니다. (시간 단위: 합계는 초, 백분위수는 밀리초)"""
+        with self._lock:
+            spans = {name: (stats.count, stats.total, np.array(stats.window)) for name, stats in self._spans.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        span_summary = {}
+        for name, (count, total, window) in spans.items():
+            summary = {'count': count, 'sum_s': total}
+            if window.size:
+                for q, value in zip(QUANTILES, np.quantile(window, QUANTILES)):
+                    summary[f'p{int(q * 100)}_ms'] = float(value) * 1000.0
+            span_summary[name] = summary
+        return {'time': time.time(), 'pid': os.getpid(), 'spans': span_summary, 'counters': counters, 'gauges': gauges}
+
+    def export(self):
+        """설정된 모든 내보내기 대상에 지금 상태를 씁니다. 파일 쓰기 실패는 경고만 출력합니다."""
+        self._last_export = time.monotonic()
+        if not self.enabled or not self._exporters:
+            return
+        snapshot = self.snapshot()
+        for exporter in self._exporters:
+            try:
+                exporter.write(snapshot)
+            except OSError as e:
+                print(f"!!! 경고: 계측 결과를 '{exporter.path}' 에 쓸 수 없습니다: {e}")
+
+    def maybe_export(self):
+        """마지막 내보내기 이후 export_interval 이 지났으면 내보냅니다. 매 프레임 호출해도 됩니다."""
+        if self.enabled and time.monotonic() - self._last_export >= self._export_interval:
+            self.export()
+
+# --- 4. 내보내기 형식 ---
+
+class JsonLogExporter:
+    """스냅샷을 한 줄씩 추가하는 JSON Lines 로그. max_bytes 를 넘으면 path.1 ... path.N 으로 밀어냅니다."""
+
+    def __init__(self, path, max_bytes=DEFAULT_JSON_MAX_BYTES, backups=DEFAULT_JSON_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def write(self, snapshot):
+        line = json.dumps(snapshot, ensure_ascii=False) + '\n'
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+            self._rotate()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+def _metric_name(name):
+    return METRIC_PREFIX + '_' + ''.join(c if c.isalnum() else '_' for c in name)
+
+class PrometheusTextfileExporter:
+    """
+    Prometheus 텍스트 형식으로 전체 상태를 씁니다. (node_exporter --collector.textfile.directory 용)
+    span 은 summary(quantile, _sum, _count), 카운터는 counter, 게이지는 gauge 로 내보냅니다.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, snapshot):
+        lines = []
+        for name, summary in sorted(snapshot['spans'].items()):
+            metric = _metric_name(name) + '_seconds'
+            lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                key = f'p{int(q * 100)}_ms'
+                if key in summary:
+                    lines.append(f'{metric}{{quantile="{q}"}} {summary[key] / 1000.0:.9f}')
+            lines.append(f"{metric}_sum {summary['sum_s']:.9f}")
+            lines.append(f"{metric}_count {summary['count']}")
+        for name, value in sorted(snapshot['counters'].items()):
+            metric = _metric_name(name) + '_total'
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for name, value in sorted(snapshot['gauges'].items()):
+            metric = _metric_name(name)
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.path)
+
+# 프로세스 전체에서 함께 쓰는 수집기
+metrics = Metrics()
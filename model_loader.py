@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+import numpy as np
+import cv2
+from metrics import metrics
+
+# --- TensorFlow Lite Interpreter 로드 / 빠른 시작 ---
+# - Interpreter 클래스는 처음 모델을 만들 때 import 합니다. tflite_runtime 이 없을 때만 TensorFlow 전체를 불러오며,
+#   이 비용(수 초)이 스크립트 import 시점이 아니라 모델 로드 시점(백그라운드 스레드)에 발생합니다.
+# - Interpreter 는 num_threads 와 XNNPACK delegate(기본 delegate) 사용 여부를 지정해 만듭니다.
+# - BackgroundModelLoader 는 모델 로드와 예열(첫 invoke) 을 모델마다 별도 스레드에서 처리하므로,
+#   그동안 카메라를 열고 첫 화면을 먼저 보여줄 수 있습니다.
+# - ModelRunner 는 입출력 텐서 정보를 한 번만 조회해 두고, 프레임을 한 번에 줄이고/색 변환/정규화하여
+#   Interpreter 입력 버퍼에 바로 쓰며, 출력도 미리 할당한 버퍼에 받습니다. (추론마다 새 배열을 만들지 않음)
+#
+# 사용 예:
+#   models = BackgroundModelLoader([('pose', POSE_MODEL_PATH)], num_threads=2).start()
+#   ...  (카메라 열기 등)
+#   keypoints = models['pose'].run(frame_bgr)   (준비될 때까지 기다림)
+
+# --- 1. 설정 및 상수 정의 ---
+DEFAULT_WARMUP_RUNS = 1
+
+_tflite_module = None
+
+# --- 2. Interpreter 생성 ---
+
+def _tflite():
+    """tflite_runtime (없으면 TensorFlow) 의 interpreter 모듈을 처음 필요할 때 한 번만 import 합니다."""
+    global _tflite_module
+    if _tflite_module is None:
+        # TensorFlow의 로그 메시지 수준을 조정하여 불필요한 경고를 숨깁니다.
+        os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+        try:
+            # tflite-runtime이 설치된 경우, 경량화된 인터프리터를 사용합니다.
+            from tflite_runtime import interpreter as tflite
+        except ImportError:
+            # TensorFlow 전체가 설치된 경우, 표준 인터프리터를 사용합니다.
+            from tensorflow.lite.python import interpreter as tflite
+        _tflite_module = tflite
+    return _tflite_module
+
+def create_interpreter(model_path, num_threads=None, use_xnnpack=True):
+    """
+    Interpreter 를 만들고 allocate_tensors() 까지 호출합니다.
+    use_xnnpack=True 이면 XNNPACK 을 포함한 기본 delegate 를 적용하고(num_threads 만큼 스레드 사용),
+    False 이면 기본 delegate 없이 내장 연산만 사용합니다. op resolver 를 고를 수 없는 예전 버전에서는 무시됩니다.
+    """
+    tflite = _tflite()
+    kwargs = {'model_path': model_path, 'num_threads': num_threads}
+    resolver = getattr(tflite, 'OpResolverType', None)
+    if resolver is not None:
+        kwargs['experimental_op_resolver_type'] = (resolver.AUTO if use_xnnpack
+                                                   else resolver.BUILTIN_WITHOUT_DEFAULT_DELEGATES)
+    try:
+        interpreter = tflite.Interpreter(**kwargs)
+    except TypeError:
+        kwargs.pop('experimental_op_resolver_type', None)
+        interpreter = tflite.Interpreter(**kwargs)
+    interpreter.allocate_tensors()
+    return interpreter
+
+def warm_up(interpreter, runs=DEFAULT_WARMUP_RUNS):
+    """
+    0 으로 채운 입력으로 invoke() 를 runs 번 실행합니다.
+    첫 invoke 에서 일어나는 delegate 준비/메모리 할당을 미리 끝내 두어, 사용자의 첫 검색이 느려지지 않게 합니다.
+    """
+    for details in interpreter.get_input_details():
+        interpreter.set_tensor(details['index'], np.zeros(details['shape'], dtype=details['dtype']))
+    for _ in range(runs):
+        interpreter.invoke()
+
+def input_size(interpreter):
+    """모델 입력 크기를 (width, height) 로 반환합니다."""
+    details = interpreter.get_input_details()[0]
+    return (int(details['shape'][2]), int(details['shape'][1]))
+
+# --- 3. 입력 전처리 / 추론 ---
+
+class ModelRunner:
+    """
+    Interpreter 하나를 감싸 전처리와 추론을 할당 없이 수행합니다.
+    - 입출력 텐서 정보(index, dtype, shape)는 만들 때 한 번만 조회합니다.
+    - BGR 프레임을 모델 입력 크기로 먼저 줄인 뒤 RGB 로 바꿉니다. 채널마다 따로 보간하므로 결과는
+      '전체 프레임을 RGB 로 바꾼 뒤 줄인 것' 과 같고, 큰 프레임의 색 변환이 없어집니다.
+    - uint8 모델은 색 변환 결과를, float32 모델은 0~1 정규화 결과를 Interpreter 입력 버퍼(tensor() 뷰)에 바로 씁니다.
+    - 출력은 미리 할당한 버퍼에 복사해 squeeze 된 뷰로 돌려줍니다.
+      다음 run() 호출 때 덮어쓰이므로, 결과를 보관하려면 복사해야 합니다.
+    Interpreter 와 마찬가지로 한 번에 한 스레드에서만 사용해야 합니다.
+    """
+
+    def __init__(self, interpreter, name="model"):
+        self.interpreter = interpreter
+        self.name = name
+        input_details = interpreter.get_input_details()[0]
+        output_details = interpreter.get_output_details()[0]
+        height, width = int(input_details['shape'][1]), int(input_details['shape'][2])
+        self.input_size = (width, height)
+        self._input_dtype = np.dtype(input_details['dtype'])
+        self._input_tensor = interpreter.tensor(input_details['index'])
+        self._output_tensor = interpreter.tensor(output_details['index'])
+        self._resized = np.empty((height, width, 3), dtype=np.uint8)
+        self._rgb = np.empty((height, width, 3), dtype=np.uint8)
+        self._output = np.empty(output_details['shape'], dtype=output_details['dtype'])
+        self._output_squeezed = np.squeeze(self._output)
+
+    def set_input_rgb(self, img_rgb):
+        """이미 모델 입력 크기로 맞춘 RGB 이미지를 입력 버퍼에 씁니다."""
+        # tensor() 뷰는 invoke() 전에 반드시 놓아야 하므로 함수 안에서만 사용합니다.
+        view = self._input_tensor()[0]
+        if self._input_dtype == np.float32:
+            # 모델이 요구하는 입력 데이터 타입이 소수점(FLOAT32) 형태이면, 픽셀 값을 0~1로 정규화합니다.
+            np.divide(img_rgb, np.float32(255.0), out=view, dtype=np.float32)
+        else:
+            np.copyto(view, img_rgb, casting='unsafe')
+        del view
+
+    def set_input_bgr(self, image_bgr):
+        """BGR 프레임(또는 그 일부 영역)을 모델 입력 크기로 줄이고 RGB 로 바꿔 입력 버퍼에 씁니다."""
+        cv2.resize(image_bgr, self.input_size, dst=self._resized)
+        if self._input_dtype == np.uint8:
+            view = self._input_tensor()[0]
+            cv2.cvtColor(self._resized, cv2.COLOR_BGR2RGB, dst=view)
+            del view
+        else:
+            cv2.cvtColor(self._resized, cv2.COLOR_BGR2RGB, dst=self._rgb)
+            self.set_input_rgb(self._rgb)
+
+    def invoke(self):
+        """입력 버퍼에 쓴 데이터로 추론하고, 재사용 출력 버퍼의 squeeze 된 뷰를 반환합니다."""
+        with metrics.span(f"{self.name}.invoke"):
+            self.interpreter.invoke()
+        output = self._output_tensor()
+        np.copyto(self._output, output)
+        del output
+        return self._output_squeezed
+
+    def run(self, image_bgr):
+        """BGR 프레임 하나로 전처리와 추론을 실행합니다."""
+        with metrics.span(f"{self.name}.preprocess"):
+            self.set_input_bgr(image_bgr)
+        return self.invoke()
+
+    def run_rgb(self, img_rgb):
+        """이미 모델 입력 크기로 맞춘 RGB 이미지로 추론을 실행합니다."""
+        self.set_input_rgb(img_rgb)
+        return self.invoke()
+
+# --- 4. 백그라운드 로드 ---
+
+class BackgroundModelLoader:
+    """
+    (이름, 모델 경로) 목록의 Interpreter 를 모델마다 별도 스레드에서 만들고 예열합니다.
+    models['이름'] 은 그 모델이 준비될 때까지 기다렸다가 ModelRunner 를 반환합니다.
+    로드 중 오류가 나면 error 에 보관되며 models['이름'] 에서 다시 발생합니다.
+    """
+
+    def __init__(self, models, num_threads=None, use_xnnpack=True, warmup_runs=DEFAULT_WARMUP_RUNS):
+        self._models = list(models)
+        self.num_threads = num_threads
+        self.use_xnnpack = use_xnnpack
+        self.warmup_runs = warmup_runs
+        self._runners = {}
+        self._threads = []
+        self._start = None
+        self.error = None
+        self.timings = {}  # 이름 -> {'load_s', 'warmup_s', 'ready_s'} (ready_s: 시작부터 준비될 때까지)
+
+    def start(self):
+        self._start = time.perf_counter()
+        for name, path in self._models:
+            thread = threading.Thread(target=self._load, args=(name, path), name=f"ModelLoader-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def _load(self, name, path):
+        try:
+            start = time.perf_counter()
+            interpreter = create_interpreter(path, self.num_threads, self.use_xnnpack)
+            loaded = time.perf_counter()
+            warm_up(interpreter, self.warmup_runs)
+            done = time.perf_counter()
+            self.timings[name] = {'load_s': loaded - start, 'warmup_s': done - loaded, 'ready_s': done - self._start}
+            self._runners[name] = ModelRunner(interpreter, name)
+        except Exception as e:
+            self.error = e
+
+    @property
+    def ready(self):
+        """모든 모델의 로드/예열이 끝났으면 True (실패한 경우 포함)."""
+        return all(not t.is_alive() for t in self._threads)
+
+    @property
+    def elapsed(self):
+        """시작부터 마지막 모델이 준비될 때까지 걸린 시간 (초). 아직 준비 중이면 None."""
+        if not self.ready or not self.timings:
+            return None
+        return max(t['ready_s'] for t in self.timings.values())
+
+    def wait(self):
+        """모든 모델이 준비될 때까지 기다립니다. 로드에 실패했으면 그 예외를 다시 발생시킵니다."""
+        for thread in self._threads:
+            thread.join()
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def __getitem__(self, name):
+        index = [model_name for model_name, _ in self._models].index(name)
+        self._threads[index].join()
+        if name not in self._runners:
+            raise self.error or KeyError(name)
+        return self._runners[name]
@@ -0,0 +1,115 @@
+import numpy as np
+from pose_utils import (CONFIDENCE_THRESHOLD, NUM_KEYPOINTS, KEYPOINTS_COLUMN, KEYPOINT_VALID_COLUMN, POSE_GEOMETRY_COLUMN,
+                        pose_center_and_size)
+
+# --- 자세 기반 재정렬 (하이브리드 검색) ---
+# 배경 특징으로 넉넉한 후보(예: 50개)를 먼저 찾은 뒤, 저장소에 미리 계산된 keypoints / 자세 위치·크기로
+# 현재 화면 속 사람과 얼마나 비슷한 구도인지를 후보 전체에 대해 한 번에(벡터 연산) 계산하여 다시 정렬합니다.
+# 후보마다 모델을 다시 돌리지 않으며, 현재 프레임의 자세 인식 한 번만 필요합니다.
+#
+# 점수 (작을수록 좋음) = 배경 가중치 * 배경 코사인 거리 + 자세 가중치 * 자세 모양 거리 + 구도 가중치 * 구도 거리
+# - 자세 모양 거리: 각 자세를 자신의 경계 사각형 중심/크기로 정규화한 keypoint 좌표 사이의 평균 거리
+#                  (두 자세 모두에서 유효한 점만 비교)
+# - 구도 거리: 화면 안에서의 자세 중심 위치 차이(0~1 정규화) + 화면 대비 자세 크기 비율의 로그 차이
+
+# --- 1. 설정 및 상수 정의 ---
+DEFAULT_BACKGROUND_WEIGHT = 1.0
+DEFAULT_POSE_WEIGHT = 0.3
+DEFAULT_FRAMING_WEIGHT = 0.3
+SIZE_LOG_WEIGHT = 0.5          # 구도 거리에서 크기 비율(로그) 차이의 비중
+MIN_COMMON_KEYPOINTS = 3       # 두 자세에서 함께 유효한 점이 이보다 적으면 비교할 수 없는 것으로 봄
+MISSING_POSE_DISTANCE = 1.0    # 자세 정보가 없거나 비교할 수 없는 후보에 주는 거리
+
+# --- 2. 벡터화된 자세 거리 ---
+
+def _normalized_pose(keypoints, geometry):
+    """
+    keypoints (n, 17, 3) 와 pose_geometry (n, 5) 로 경계 사각형 중심을 원점, 넓이의 제곱근을 1 로 하는
+    (n, 17, 2) 좌표 [x, y] 를 만듭니다. 자세 정보가 없는 행은 NaN 입니다.
+    """
+    center_x, center_y, size, h, w = (geometry[:, i:i + 1] for i in range(5))
+    scale = np.sqrt(np.maximum(size, 1e-6))
+    xs = (keypoints[:, :, 1] * w - center_x) / scale
+    ys = (keypoints[:, :, 0] * h - center_y) / scale
+    return np.stack([xs, ys], axis=2)
+
+def pose_distances(live_keypoints, live_geometry, keypoints, valid, geometry):
+    """
+    현재 자세 하나와 후보 자세들 사이의 (자세 모양 거리, 구도 거리) 를 (n,) 배열 두 개로 반환합니다.
+    비교할 수 없는 후보는 MISSING_POSE_DISTANCE 입니다.
+    """
+    live_keypoints = np.asarray(live_keypoints, dtype=np.float32)[np.newaxis]
+    live_geometry = np.asarray(live_geometry, dtype=np.float32)[np.newaxis]
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    geometry = np.asarray(geometry, dtype=np.float32)
+    n = len(keypoints)
+    if n == 0:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # 자세 모양: 두 자세 모두에서 유효한 점만 평균
+        common = (np.asarray(valid) > 0) & (live_keypoints[:, :, 2] > CONFIDENCE_THRESHOLD)
+        diff = np.linalg.norm(_normalized_pose(keypoints, geometry) - _normalized_pose(live_keypoints, live_geometry), axis=2)
+        diff = np.where(common, diff, 0.0)
+        common_count = common.sum(axis=1)
+        shape_distance = diff.sum(axis=1) / np.maximum(common_count, 1)
+
+        # 구도: 화면 안 중심 위치 (0~1) 와 화면 대비 크기 비율
+        center = geometry[:, :2] / geometry[:, [4, 3]]
+        live_center = live_geometry[:, :2] / live_geometry[:, [4, 3]]
+        relative_size = geometry[:, 2] / (geometry[:, 3] * geometry[:, 4])
+        live_relative_size = live_geometry[:, 2] / (live_geometry[:, 3] * live_geometry[:, 4])
+        framing_distance = (np.linalg.norm(center - live_center, axis=1)
+                            + SIZE_LOG_WEIGHT * np.abs(np.log(relative_size / live_relative_size)))
+
+    comparable = (common_count >= MIN_COMMON_KEYPOINTS) & np.isfinite(shape_distance)
+    shape_distance = np.where(comparable, shape_distance, MISSING_POSE_DISTANCE)
+    framing_distance = np.where(np.isfinite(framing_distance), framing_distance, MISSING_POSE_DISTANCE)
+    return shape_distance.astype(np.float32), framing_distance.astype(np.float32)
+
+# --- 3. 재정렬기 ---
+
+class PoseReranker:
+    """
+    FeatureIndex 검색 결과(후보)를 저장소의 자세 열로 다시 정렬합니다.
+    후보의 'index' 는 저장소 행 번호여야 합니다. (FeatureIndex.from_store 로 만든 인덱스)
+    """
+
+    def __init__(self, store, background_weight=DEFAULT_BACKGROUND_WEIGHT, pose_weight=DEFAULT_POSE_WEIGHT,
+                 framing_weight=DEFAULT_FRAMING_WEIGHT):
+        self.store = store
+        self.background_weight = background_weight
+        self.pose_weight = pose_weight
+        self.framing_weight = framing_weight
+
+    def _candidate_poses(self, rows):
+        if not self.store.has_column(KEYPOINTS_COLUMN):
+            n = len(rows)
+            return (np.full((n, NUM_KEYPOINTS, 3), np.nan, dtype=np.float32), np.zeros((n, NUM_KEYPOINTS), dtype=np.uint8),
+                    np.full((n, 5), np.nan, dtype=np.float32))
+        return (self.store.column(KEYPOINTS_COLUMN)[rows], self.store.column(KEYPOINT_VALID_COLUMN)[rows],
+                self.store.column(POSE_GEOMETRY_COLUMN)[rows])
+
+    def rerank(self, candidates, live_keypoints, frame_shape, k):
+        """
+        현재 프레임의 자세로 후보를 다시 정렬하여 상위 k개를 반환합니다.
+        각 결과에는 'background_distance', 'pose_distance', 'framing_distance', 'score' 가 추가되며
+        'distance' 는 기존과 같이 배경 거리입니다. 현재 프레임에서 자세를 찾지 못하면 배경 순서를 그대로 씁니다.
+        """
+        if not candidates:
+            return []
+        live_center, live_size = pose_center_and_size(live_keypoints, frame_shape)
+        if live_center is None:
+            return candidates[:k]
+        live_geometry = (live_center[0], live_center[1], live_size, frame_shape[0], frame_shape[1])
+
+        rows = np.array([c['index'] for c in candidates], dtype=np.int64)
+        keypoints, valid, geometry = self._candidate_poses(rows)
+        shape_distance, framing_distance = pose_distances(live_keypoints, live_geometry, keypoints, valid, geometry)
+        background_distance = np.array([c['distance'] for c in candidates], dtype=np.float32)
+        scores = (self.background_weight * background_distance + self.pose_weight * shape_distance
+                  + self.framing_weight * framing_distance)
+
+        order = np.argsort(scores, kind='stable')[:k]
+        return [dict(candidates[i], background_distance=float(background_distance[i]), pose_distance=float(shape_distance[i]),
+                     framing_distance=float(framing_distance[i]), score=float(scores[i])) for i in order]
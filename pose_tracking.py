@@ -0,0 +1,176 @@
+import math
+import time
+import numpy as np
+import cv2
+
+# --- 실시간 자세 추적 ---
+# 기존 MoveNet 추론 함수 위에 얹는 추적 계층입니다.
+# 1. ROI 추적: 이전 프레임 keypoint 주변의 정사각형 영역만 잘라 모델에 넣어, 작게 찍힌 사람도 크게 보이게 합니다.
+# 2. 시간 평활화: One-Euro 필터로 keypoint 떨림을 줄여 피드백 문구가 깜빡이지 않게 합니다.
+# 3. 적응형 추론 생략: 화면 움직임이 거의 없으면 추론을 건너뛰고 추적 중인 결과를 그대로 씁니다.
+
+# --- 1. 설정 및 상수 정의 ---
+CONFIDENCE_THRESHOLD = 0.3      # 02_run_realtime_webcam.py 와 동일하게 유지
+MIN_TRACK_KEYPOINTS = 4         # 이 개수 이상의 유효한 점이 있어야 ROI 추적을 사용
+ROI_MARGIN = 0.5                # keypoint 경계 사각형의 긴 변 대비 여유 비율 (양쪽)
+MIN_ROI_FRACTION = 0.25         # ROI 한 변의 최소 길이 (프레임 짧은 변 대비)
+MOTION_THUMB_SIZE = (64, 36)    # 움직임 판단용 축소 회색조 이미지 크기
+MOTION_THRESHOLD = 2.0          # 축소 이미지의 평균 밝기 차이가 이 값보다 작으면 '움직임 없음'
+MAX_SKIPPED_FRAMES = 4          # 움직임이 없어도 이 프레임 수마다 한 번은 추론
+
+# One-Euro 필터 기본값 (좌표는 0~1 정규화 단위, 시간은 초)
+ONE_EURO_MIN_CUTOFF = 1.0
+ONE_EURO_BETA = 5.0
+ONE_EURO_D_CUTOFF = 1.0
+
+# --- 2. One-Euro 필터 ---
+
+def _smoothing_factor(cutoff, dt):
+    tau = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+class OneEuroFilter:
+    """
+    여러 값을 한 번에 평활화하는 One-Euro 필터. (Casiez et al., 2012)
+    천천히 움직일 때는 강하게 평활화하여 떨림을 없애고, 빠르게 움직일 때는 지연을 줄입니다.
+    """
+
+    def __init__(self, min_cutoff=ONE_EURO_MIN_CUTOFF, beta=ONE_EURO_BETA, d_cutoff=ONE_EURO_D_CUTOFF):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self._x = None
+        self._dx = None
+        self._t = None
+
+    def __call__(self, x, t, active=None):
+        """
+        x: 현재 측정값 배열, t: 시각(초), active: 평활화할 항목 마스크.
+        active 가 False 인 항목은 측정값으로 다시 초기화됩니다.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        if self._x is None or self._x.shape != x.shape:
+            self._x, self._dx, self._t = x.copy(), np.zeros_like(x), t
+            return x.copy()
+        dt = max(t - self._t, 1e-6)
+        a_d = _smoothing_factor(self.d_cutoff, dt)
+        dx = (x - self._x) / dt
+        dx_hat = self._dx + a_d * (dx - self._dx)
+        cutoff = self.min_cutoff + self.beta * np.abs(dx_hat)
+        tau = 1.0 / (2 * math.pi * cutoff)
+        a = 1.0 / (1.0 + tau / dt)
+        x_hat = self._x + a * (x - self._x)
+        if active is not None:
+            inactive = ~np.broadcast_to(active, x.shape)
+            x_hat[inactive] = x[inactive]
+            dx_hat[inactive] = 0
+        self._x, self._dx, self._t = x_hat, dx_hat, t
+        return x_hat.copy()
+
+# --- 3. 자세 추적기 ---
+
+class PoseTracker:
+    """
+    infer_fn(이미지) -> (17, 3) keypoints [y, x, 신뢰도] 를 감싸서 ROI 추적, 평활화, 추론 생략을 수행합니다.
+    반환되는 keypoints 는 항상 입력 프레임 전체 기준의 0~1 정규화 좌표입니다.
+    한 스레드에서만 update() 를 호출해야 합니다. reset() 은 다른 스레드에서 호출해도 됩니다.
+    """
+
+    def __init__(self, infer_fn, use_roi=True, smooth=True, skip_static=True):
+        self._infer_fn = infer_fn
+        self.use_roi = use_roi
+        self.smooth = smooth
+        self.skip_static = skip_static
+        self._filter = OneEuroFilter()
+        self._reset_requested = False
+        self.inference_count = 0
+        self.frame_count = 0
+        self._clear()
+
+    def _clear(self):
+        self._filter.reset()
+        self._raw = None        # 마지막 추론 결과 (전체 프레임 좌표, 평활화 전)
+        self._tracked = None    # 마지막으로 반환한 결과 (평활화 후)
+        self._motion_ref = None
+        self._skipped = 0
+
+    def reset(self):
+        """다음 update() 때 추적 상태를 초기화합니다. (가이드 모드 재시작 등)"""
+        self._reset_requested = True
+
+    @property
+    def roi_active(self):
+        return self.use_roi and self._raw is not None and self._valid_count(self._raw) >= MIN_TRACK_KEYPOINTS
+
+    @staticmethod
+    def _valid_count(keypoints):
+        return int(np.count_nonzero(keypoints[:, 2] > CONFIDENCE_THRESHOLD))
+
+    def _compute_roi(self, frame_shape):
+        """이전 keypoint 를 감싸는 정사각형 ROI (x0, y0, x1, y1) 를 픽셀 단위로 계산합니다."""
+        h, w = frame_shape[:2]
+        valid = self._raw[self._raw[:, 2] > CONFIDENCE_THRESHOLD]
+        ys, xs = valid[:, 0] * h, valid[:, 1] * w
+        cx, cy = (xs.min() + xs.max()) / 2, (ys.min() + ys.max()) / 2
+        side = max(xs.max() - xs.min(), ys.max() - ys.min()) * (1 + 2 * ROI_MARGIN)
+        side = min(max(side, MIN_ROI_FRACTION * min(h, w)), min(h, w))
+        x0 = int(round(min(max(cx - side / 2, 0), w - side)))
+        y0 = int(round(min(max(cy - side / 2, 0), h - side)))
+        side = int(round(side))
+        return x0, y0, x0 + side, y0 + side
+
+    def _motion_thumb(self, frame):
+        gray = cv2.cvtColor(cv2.resize(frame, MOTION_THUMB_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        return gray.astype(np.int16)
+
+    def _is_static(self, thumb):
+        if self._motion_ref is None or self._tracked is None:
+            return False
+        return float(np.mean(np.abs(thumb - self._motion_ref))) < MOTION_THRESHOLD
+
+    def _infer(self, frame):
+        h, w = frame.shape[:2]
+        if self.roi_active:
+            x0, y0, x1, y1 = self._compute_roi(frame.shape)
+            keypoints = np.array(self._infer_fn(frame[y0:y1, x0:x1]), dtype=np.float32)
+            keypoints[:, 0] = (keypoints[:, 0] * (y1 - y0) + y0) / h
+            keypoints[:, 1] = (keypoints[:, 1] * (x1 - x0) + x0) / w
+            if self._valid_count(keypoints) < MIN_TRACK_KEYPOINTS:
+                # ROI 안에서 사람을 놓쳤으면 전체 프레임으로 다시 찾습니다.
+                keypoints = np.array(self._infer_fn(frame), dtype=np.float32)
+                self.inference_count += 1
+        else:
+            keypoints = np.array(self._infer_fn(frame), dtype=np.float32)
+        self.inference_count += 1
+        return keypoints
+
+    def update(self, frame, timestamp=None):
+        """새 프레임으로 추적 결과를 갱신하고 (17, 3) keypoints 를 반환합니다."""
+        if self._reset_requested:
+            self._reset_requested = False
+            self._clear()
+        timestamp = time.perf_counter() if timestamp is None else timestamp
+        self.frame_count += 1
+
+        thumb = self._motion_thumb(frame) if self.skip_static else None
+        if self.skip_static and self._skipped < MAX_SKIPPED_FRAMES and self._is_static(thumb):
+            self._skipped += 1
+            return self._tracked.copy()
+        self._skipped = 0
+        self._motion_ref = thumb
+
+        keypoints = self._infer(frame)
+        self._raw = keypoints
+        if self.smooth:
+            active = keypoints[:, 2] > CONFIDENCE_THRESHOLD
+            keypoints = keypoints.copy()
+            keypoints[:, :2] = self._filter(keypoints[:, :2], timestamp, active[:, np.newaxis])
+        self._tracked = keypoints
+        return keypoints.copy()
+
+    def inference_ratio(self):
+        """프레임당 평균 추론 횟수."""
+        return self.inference_count / self.frame_count if self.frame_count else 0.0
@@ -0,0 +1,119 @@
+import numpy as np
+import cv2
+
+# --- 자세(keypoint) 관련 공용 함수 ---
+# DB 빌드 시 계산한 keypoints 와 자세 위치/크기를 저장소에 함께 저장해 두고,
+# 웹캠 스크립트에서는 가이드 선택/확정 시 자세 인식을 다시 돌리지 않고 조회만 합니다.
+
+# --- 1. 설정 및 상수 정의 ---
+CONFIDENCE_THRESHOLD = 0.3  # 02_run_realtime_webcam.py 와 동일하게 유지
+NUM_KEYPOINTS = 17
+
+# --- MoveNet 모델 관련 상수 (자세 그리기용) ---
+KEYPOINT_DICT = {
+    'nose': 0, 'left_eye': 1, 'right_eye': 2, 'left_ear': 3, 'right_ear': 4,
+    'left_shoulder': 5, 'right_shoulder': 6, 'left_elbow': 7, 'right_elbow': 8,
+    'left_wrist': 9, 'right_wrist': 10, 'left_hip': 11, 'right_hip': 12,
+    'left_knee': 13, 'right_knee': 14, 'left_ankle': 15, 'right_ankle': 16
+}
+REV_KEYPOINT_DICT = {v: k for k, v in KEYPOINT_DICT.items()}
+CONNECTIONS = [(5, 6), (5, 7), (6, 8), (7, 9), (8, 10), (5, 11), (6, 12), (11, 12), (11, 13), (12, 14), (13, 15), (14, 16)]
+KEYPOINT_COLORS = {
+    'nose': (255, 255, 0), 'left_eye': (0, 0, 255), 'right_eye': (0, 0, 255),
+    'left_ear': (0, 255, 0), 'right_ear': (0, 255, 0), 'left_shoulder': (255, 0, 0),
+    'right_shoulder': (255, 0, 0), 'left_elbow': (255, 0, 255), 'right_elbow': (255, 0, 255),
+    'left_wrist': (0, 255, 255), 'right_wrist': (0, 255, 255), 'left_hip': (255, 128, 0),
+    'right_hip': (255, 128, 0), 'left_knee': (128, 0, 255), 'right_knee': (128, 0, 255),
+    'left_ankle': (255, 255, 255), 'right_ankle': (255, 255, 255),
+}
+CONNECTION_COLOR = (192, 192, 192)
+
+# 저장소 열 이름
+KEYPOINTS_COLUMN = "keypoints"            # (17, 3) float32: y, x, 신뢰도 (0~1 정규화 좌표)
+KEYPOINT_VALID_COLUMN = "keypoint_valid"  # (17,) uint8: 신뢰도가 임계값을 넘는지 여부
+POSE_GEOMETRY_COLUMN = "pose_geometry"    # (5,) float32: 중심 x, 중심 y, 크기, 이미지 높이, 이미지 너비 (픽셀)
+
+# --- 2. 자세 위치/크기 계산 ---
+
+def pose_center_and_size(keypoints, img_shape):
+    """
+    유효한 keypoint 들을 감싸는 사각형의 중심과 넓이를 픽셀 단위로 반환합니다.
+    유효한 점이 2개 미만이면 (None, None) 을 반환합니다.
+    """
+    h, w = img_shape[:2]
+    keypoints = np.asarray(keypoints)
+    valid = keypoints[keypoints[:, 2] > CONFIDENCE_THRESHOLD]
+    if len(valid) < 2:
+        return None, None
+    points_x = valid[:, 1] * w
+    points_y = valid[:, 0] * h
+    min_x, max_x = float(points_x.min()), float(points_x.max())
+    min_y, max_y = float(points_y.min()), float(points_y.max())
+    center_x = (min_x + max_x) / 2
+    center_y = (min_y + max_y) / 2
+    size = (max_x - min_x) * (max_y - min_y)
+    return (center_x, center_y), size
+
+def pose_columns(keypoints_list, img_shapes):
+    """여러 이미지의 keypoints 와 이미지 크기로 저장소에 넣을 자세 열들을 만듭니다."""
+    n = len(keypoints_list)
+    keypoints = np.asarray(keypoints_list, dtype=np.float32).reshape(n, NUM_KEYPOINTS, 3)
+    geometry = np.full((n, 5), np.nan, dtype=np.float32)
+    for i, (kps, shape) in enumerate(zip(keypoints, img_shapes)):
+        geometry[i, 3:] = shape[:2]
+        center, size = pose_center_and_size(kps, shape)
+        if center is not None:
+            geometry[i, :3] = (center[0], center[1], size)
+    return {
+        KEYPOINTS_COLUMN: keypoints,
+        KEYPOINT_VALID_COLUMN: (keypoints[:, :, 2] > CONFIDENCE_THRESHOLD).astype(np.uint8),
+        POSE_GEOMETRY_COLUMN: geometry,
+    }
+
+# --- 3. 자세 그리기 ---
+# 웹캠 스크립트의 화면 표시와 DB 빌드 시 만드는 가이드 썸네일이 같은 모양이 되도록 여기서 공용으로 사용합니다.
+
+def draw_pose_on_image(image, keypoints, color_override=None):
+    h, w, _ = image.shape
+    for i, kp in enumerate(keypoints):
+        if kp[2] > CONFIDENCE_THRESHOLD:
+            y, x, conf = kp
+            center = (int(x * w), int(y * h))
+            if color_override: color = color_override
+            else:
+                keypoint_name = REV_KEYPOINT_DICT.get(i)
+                color = KEYPOINT_COLORS.get(keypoint_name, (255, 255, 255))
+            cv2.circle(image, center, 5, color, -1)
+    for start_idx, end_idx in CONNECTIONS:
+        start_kp, end_kp = keypoints[start_idx], keypoints[end_idx]
+        if start_kp[2] > CONFIDENCE_THRESHOLD and end_kp[2] > CONFIDENCE_THRESHOLD:
+            start_pos = (int(start_kp[1] * w), int(start_kp[0] * h))
+            end_pos = (int(end_kp[1] * w), int(end_kp[0] * h))
+            cv2.line(image, start_pos, end_pos, CONNECTION_COLOR, 2)
+    return image
+
+# --- 4. 저장소 연동 ---
+
+def ensure_pose_columns(store):
+    """
+    저장소에 자세 열이 없으면 추가합니다. 이전에 만들어진 행은 '계산되지 않음'(NaN)으로 채워져
+    stored_pose() 가 None 을 반환하므로, 호출 측에서 자세 인식으로 대체할 수 있습니다.
+    """
+    store.add_column(KEYPOINTS_COLUMN, np.float32, (NUM_KEYPOINTS, 3), fill_value=np.nan)
+    store.add_column(KEYPOINT_VALID_COLUMN, np.uint8, (NUM_KEYPOINTS,), fill_value=0)
+    store.add_column(POSE_GEOMETRY_COLUMN, np.float32, (5,), fill_value=np.nan)
+
+def stored_pose(store, row):
+    """
+    저장소 행에 미리 계산된 (keypoints, 중심, 크기) 를 반환합니다. 계산되지 않은 행이면 None.
+    중심/크기는 pose_center_and_size 와 같이 유효한 점이 부족하면 None 입니다.
+    """
+    if row is None or not store.has_column(KEYPOINTS_COLUMN) or row >= store.count:
+        return None
+    keypoints = np.array(store.column(KEYPOINTS_COLUMN)[row])
+    if np.isnan(keypoints).any():
+        return None
+    center_x, center_y, size = (float(v) for v in store.column(POSE_GEOMETRY_COLUMN)[row][:3])
+    if np.isnan(size):
+        return keypoints, None, None
+    return keypoints, (center_x, center_y), size
@@ -0,0 +1,327 @@
+import json
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+import numpy as np
+import cv2
+from pose_utils import stored_pose
+from metrics import metrics
+
+# --- 배경 유사도 질의 서비스 ---
+# 특징 DB 와 특징 추출 모델을 한 번만 올려 두고, 로컬 소켓(TCP)으로 들어오는 질의에 상위 K개 결과를 돌려줍니다.
+# (안드로이드 앱은 adb reverse tcp:<포트> tcp:<포트> 로 PC 의 서버에 연결할 수 있습니다.)
+# - 질의: 이미지(JPEG/PNG 바이트) 또는 미리 계산한 특징 벡터(float32)
+# - 응답: 상위 K개의 경로, 코사인 거리, 저장소에 미리 계산된 가이드 keypoints
+# - 동시에 들어온 질의는 QueryBatcher 가 짧게(MAX_BATCH_WAIT_S) 모아 특징 추출과 검색을 한 번에 처리합니다.
+#
+# 메시지 형식 (요청/응답 동일): [4바이트 헤더 길이][UTF-8 JSON 헤더][4바이트 본문 길이][본문 바이트]  (길이는 big-endian)
+#   요청 헤더: {"id": 1, "type": "image" | "features" | "info", "top_k": 5}
+#              "features" 본문은 little-endian float32 배열
+#   응답 헤더: {"id": 1, "results": [{"index", "path", "distance", "keypoints": [[y, x, 신뢰도] x 17] 또는 null}],
+#              "batch_size": 함께 처리된 질의 수, "server_ms": 서버 처리 시간}
+#              실패하면 {"id": 1, "error": "..."}
+#
+# 사용 예:
+#   python .\05_run_query_server.py
+#   python .\06_query_load_test.py --clients 8 --requests 50
+
+# --- 1. 설정 및 상수 정의 ---
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_TOP_K = 5
+MAX_TOP_K = 100
+MAX_BATCH_SIZE = 16          # 한 번에 처리할 최대 질의 수
+MAX_BATCH_WAIT_S = 0.005     # 첫 질의가 들어온 뒤 다른 질의를 기다리는 최대 시간
+MAX_HEADER_BYTES = 64 << 10
+MAX_PAYLOAD_BYTES = 16 << 20
+REQUEST_IMAGE = "image"
+REQUEST_FEATURES = "features"
+REQUEST_INFO = "info"
+
+_LENGTH = struct.Struct('>I')
+
+class QueryError(Exception):
+    """잘못된 요청. 메시지는 응답의 "error" 로 클라이언트에 전달됩니다."""
+
+# --- 2. 메시지 주고받기 ---
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            return None
+        received += n
+    return bytes(buffer)
+
+def send_message(sock, header, payload=b""):
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    sock.sendall(b"".join([_LENGTH.pack(len(header_bytes)), header_bytes, _LENGTH.pack(len(payload)), payload]))
+
+def recv_message(sock):
+    """메시지 하나를 읽어 (헤더 dict, 본문 bytes) 를 반환합니다. 상대가 연결을 닫았으면 None."""
+    raw = _recv_exact(sock, _LENGTH.size)
+    if raw is None:
+        return None
+    (header_size,) = _LENGTH.unpack(raw)
+    if header_size > MAX_HEADER_BYTES:
+        raise QueryError(f"헤더가 너무 큽니다: {header_size} bytes")
+    header_bytes = _recv_exact(sock, header_size)
+    raw = _recv_exact(sock, _LENGTH.size) if header_bytes is not None else None
+    if raw is None:
+        return None
+    (payload_size,) = _LENGTH.unpack(raw)
+    if payload_size > MAX_PAYLOAD_BYTES:
+        raise QueryError(f"본문이 너무 큽니다: {payload_size} bytes")
+    payload = _recv_exact(sock, payload_size) if payload_size else b""
+    if payload is None:
+        return None
+    return json.loads(header_bytes.decode('utf-8')), payload
+
+# --- 3. 마이크로 배치 ---
+
+class _PendingQuery:
+    __slots__ = ('image', 'features', 'top_k', 'done', 'results', 'error', 'batch_size')
+
+    def __init__(self, image, features, top_k):
+        self.image = image
+        self.features = features
+        self.top_k = top_k
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+        self.batch_size = 0
+
+class QueryBatcher:
+    """
+    여러 연결 스레드에서 들어온 질의를 한 스레드에서 모아 처리합니다.
+    - 특징 추출: Interpreter 는 동시에 쓸 수 없으므로 이 스레드에서만 사용합니다. (모델 입력이 1장 단위이므로 차례로 invoke)
+    - 검색: 모은 질의의 특징을 FeatureIndex.search_batch 로 한 번에 검색합니다.
+    runner 는 model_loader.ModelRunner 이며, 특징 벡터 질의만 받을 때는 None 이어도 됩니다.
+    """
+
+    def __init__(self, index, store, runner=None, max_batch_size=MAX_BATCH_SIZE, max_wait_s=MAX_BATCH_WAIT_S):
+        self.index = index
+        self.store = store
+        self.runner = runner
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_s
+        self._queue = queue.Queue()
+        self._running = False
+        self._thread = None
+        self.batches = 0
+        self.queries = 0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="QueryBatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    def query(self, top_k, image=None, features=None):
+        """질의 하나를 제출하고 처리될 때까지 기다립니다. (결과 목록, 함께 처리된 질의 수) 를 반환합니다."""
+        pending = _PendingQuery(image, features, top_k)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.results, pending.batch_size
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._running = False
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self):
+        while self._running:
+            batch = self._collect()
+            if not batch:
+                continue
+            try:
+                with metrics.span('query.batch'):
+                    self._process(batch)
+            except Exception as e:
+                for pending in batch:
+                    if not pending.done.is_set():
+                        pending.error = e
+                        pending.done.set()
+            metrics.maybe_export()
+
+    def _features(self, pending):
+        if pending.features is not None:
+            if self.index.codec.dim is not None and len(pending.features) != self.index.codec.dim:
+                raise QueryError(f"특징 차원이 DB({self.index.codec.dim})와 다릅니다: {len(pending.features)}")
+            return pending.features
+        if self.runner is None:
+            raise QueryError("이 서버는 이미지 질의를 처리할 수 없습니다. (특징 추출 모델 없음)")
+        with metrics.span('query.feature'):
+            return self.runner.run(pending.image).copy()
+
+    def _process(self, batch):
+        valid, vectors = [], []
+        for pending in batch:
+            try:
+                vectors.append(self._features(pending))
+                valid.append(pending)
+            except QueryError as e:
+                pending.error = e
+                pending.done.set()
+        if not valid:
+            return
+        with metrics.span('query.search'):
+            results = self.index.search_batch(np.stack(vectors), max(p.top_k for p in valid))
+        for pending, matches in zip(valid, results):
+            matches = matches[:pending.top_k]
+            for match in matches:
+                pose = stored_pose(self.store, match['index']) if self.store is not None else None
+                match['keypoints'] = pose[0].tolist() if pose is not None else None
+            pending.results = matches
+            pending.batch_size = len(valid)
+            pending.done.set()
+        self.batches += 1
+        self.queries += len(valid)
+        metrics.count('query.requests', len(valid))
+        metrics.gauge('query.batch_size', len(valid))
+
+# --- 4. 서버 ---
+
+class _QueryHandler(socketserver.BaseRequestHandler):
+    """연결 하나를 맡아 요청을 차례로 읽고 응답합니다. 이미지 디코딩은 연결 스레드에서 병렬로 합니다."""
+
+    def handle(self):
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while True:
+            try:
+                message = recv_message(sock)
+            except (QueryError, ValueError) as e:
+                send_message(sock, {'error': str(e)})
+                return
+            except OSError:
+                return
+            if message is None:
+                return
+            header, payload = message
+            start = time.perf_counter()
+            try:
+                response = self.server.answer(header, payload)
+            except QueryError as e:
+                response = {'error': str(e)}
+            except Exception as e:
+                response = {'error': f"서버 오류: {e}"}
+            response['id'] = header.get('id')
+            response['server_ms'] = (time.perf_counter() - start) * 1000.0
+            try:
+                send_message(sock, response)
+            except OSError:
+                return
+
+class QueryServer(socketserver.ThreadingTCPServer):
+    """연결마다 스레드 하나를 쓰고, 모든 질의는 QueryBatcher 한 곳으로 모읍니다."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, batcher, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        super().__init__((host, port), _QueryHandler)
+        self.batcher = batcher
+
+    def info(self):
+        index = self.batcher.index
+        return {'db_size': len(index), 'feature_dim': index.codec.dim, 'codec': index.codec.kind,
+                'image_queries': self.batcher.runner is not None, 'max_top_k': MAX_TOP_K,
+                'max_batch_size': self.batcher.max_batch_size}
+
+    def answer(self, header, payload):
+        kind = header.get('type')
+        if kind == REQUEST_INFO:
+            return self.info()
+        top_k = int(header.get('top_k', DEFAULT_TOP_K))
+        if not 1 <= top_k <= MAX_TOP_K:
+            raise QueryError(f"top_k 는 1~{MAX_TOP_K} 사이여야 합니다: {top_k}")
+        if kind == REQUEST_IMAGE:
+            with metrics.span('query.decode'):
+                image = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                raise QueryError("이미지를 디코딩할 수 없습니다.")
+            results, batch_size = self.batcher.query(top_k, image=image)
+        elif kind == REQUEST_FEATURES:
+            if len(payload) % 4:
+                raise QueryError("특징 벡터는 float32 배열이어야 합니다.")
+            results, batch_size = self.batcher.query(top_k, features=np.frombuffer(payload, dtype='<f4'))
+        else:
+            raise QueryError(f"알 수 없는 요청 종류: {kind}")
+        return {'results': results, 'batch_size': batch_size}
+
+# --- 5. 클라이언트 ---
+
+class QueryClient:
+    """질의 서버에 연결 하나를 열어 요청을 차례로 보냅니다. (한 클라이언트는 한 스레드에서만 사용)"""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=30.0):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._next_id = 0
+
+    def _request(self, header, payload=b""):
+        self._next_id += 1
+        header = dict(header, id=self._next_id)
+        send_message(self._sock, header, payload)
+        message = recv_message(self._sock)
+        if message is None:
+            raise ConnectionError("서버가 연결을 닫았습니다.")
+        response, _ = message
+        if 'error' in response:
+            raise QueryError(response['error'])
+        return response
+
+    def info(self):
+        return self._request({'type': REQUEST_INFO})
+
+    def query_image(self, image, top_k=DEFAULT_TOP_K):
+        """image: 인코딩된 이미지 바이트(JPEG/PNG) 또는 BGR 배열. 응답 dict 를 반환합니다."""
+        if isinstance(image, np.ndarray):
+            ok, encoded = cv2.imencode('.jpg', image)
+            if not ok:
+                raise QueryError("이미지를 인코딩할 수 없습니다.")
+            image = encoded.tobytes()
+        return self._request({'type': REQUEST_IMAGE, 'top_k': top_k}, bytes(image))
+
+    def query_features(self, features, top_k=DEFAULT_TOP_K):
+        vector = np.ascontiguousarray(np.ravel(features), dtype='<f4')
+        return self._request({'type': REQUEST_FEATURES, 'top_k': top_k}, vector.tobytes())
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
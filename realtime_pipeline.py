@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import deque
+
+# --- 실시간 웹캠 파이프라인 ---
+# 캡처 / 추론 / 화면 출력을 서로 다른 스레드로 분리합니다.
+# - FrameGrabber: 카메라에서 계속 읽으면서 항상 '가장 최신 프레임' 하나만 보관합니다.
+# - InferenceWorker: 제출된 프레임 중 가장 최근 것만 골라 자신의 속도로 추론합니다.
+# - 출력 루프(02_run_realtime_webcam.py)는 카메라 속도로 돌면서 가장 최근 추론 결과를 합성합니다.
+# 모든 대기열은 크기가 제한되어 있으며, 가득 차면 가장 오래된 항목을 버립니다.
+
+class DropOldestQueue:
+    """크기가 제한된 대기열. 가득 찬 상태에서 put 하면 가장 오래된 항목을 버립니다."""
+
+    def __init__(self, maxsize=1):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """항목이 들어올 때까지 기다렸다가 가장 오래된 항목을 꺼냅니다. 시간 초과 시 None."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                return None
+            return self._items.popleft()
+
+    def clear(self):
+        with self._cond:
+            self._items.clear()
+
+class FrameGrabber:
+    """
+    별도 스레드에서 cap.read() 를 반복하며 최신 프레임만 보관합니다.
+    출력 루프가 느려도 카메라 버퍼에 오래된 프레임이 쌓이지 않습니다.
+    """
+
+    def __init__(self, cap, transform=None):
+        self._cap = cap
+        self._transform = transform
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._read_seq = 0
+        self._running = False
+        self._thread = None
+        self.dropped = 0  # 한 번도 읽히지 않고 새 프레임에 덮어쓰인 프레임 수
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="FrameGrabber", daemon=True)
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while self._running:
+            ret, frame = self._cap.read()
+            if ret and self._transform is not None:
+                frame = self._transform(frame)
+            with self._cond:
+                if not ret:
+                    self._running = False
+                else:
+                    if self._seq > self._read_seq:
+                        self.dropped += 1
+                    self._frame = frame
+                    self._seq += 1
+                self._cond.notify_all()
+
+    def read(self):
+        """
+        아직 읽지 않은 새 프레임이 올 때까지 기다렸다가 (True, 프레임) 을 반환합니다.
+        자동 노출 조정이나 USB 지연으로 프레임이 잠시 늦는 것은 계속 기다리고,
+        카메라 읽기가 실패했거나 stop() 으로 멈춘 뒤에만 (False, None) 을 반환합니다.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > self._read_seq or not self._running)
+            if self._seq == self._read_seq:
+                return False, None
+            self._read_seq = self._seq
+            return True, self._frame
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+class InferenceWorker:
+    """
+    제출된 프레임을 별도 스레드에서 처리하고 가장 최근 결과만 보관합니다.
+    처리 함수가 느리면 그 사이 제출된 프레임은 버려지고(drop-oldest) 항상 최신 프레임을 처리합니다.
+    처리 함수가 사용하는 Interpreter 는 이 작업자 전용이어야 합니다. (TFLite Interpreter 는 스레드 안전하지 않음)
+    처리 함수가 예외를 던져도 스레드는 멈추지 않고, 가장 최근 예외를 error 에 남깁니다. (호출하는 쪽에서 확인)
+    """
+
+    def __init__(self, process_fn, name="InferenceWorker", queue_size=1):
+        self._process_fn = process_fn
+        self._queue = DropOldestQueue(queue_size)
+        self._lock = threading.Lock()
+        self._result = None
+        self._result_time = None
+        self._generation = 0
+        self._running = False
+        self._thread = None
+        self._name = name
+        self.processed = 0
+        self.failures = 0
+        self.error = None
+
+    @property
+    def dropped(self):
+        return self._queue.dropped
+
+    @property
+    def name(self):
+        return self._name
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name=self._name, daemon=True)
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while self._running:
+            item = self._queue.get(timeout=0.1)
+            if item is None:
+                continue
+            generation, frame = item
+            try:
+                result = self._process_fn(frame)
+            except Exception as e:
+                with self._lock:
+                    self.error = e
+                    self.failures += 1
+                continue
+            with self._lock:
+                # reset() 이전에 제출된 프레임의 결과는 버립니다.
+                if generation == self._generation:
+                    self._result = result
+                    self._result_time = time.perf_counter()
+                    self.processed += 1
+
+    def submit(self, frame):
+        with self._lock:
+            generation = self._generation
+        self._queue.put((generation, frame))
+
+    def latest(self):
+        """가장 최근 처리 결과를 반환합니다. 아직 결과가 없으면 None."""
+        with self._lock:
+            return self._result
+
+    def result_age(self):
+        """가장 최근 결과가 만들어진 뒤 지난 시간(초). 결과가 없으면 None."""
+        with self._lock:
+            return None if self._result_time is None else time.perf_counter() - self._result_time
+
+    def reset(self):
+        """대기 중인 프레임과 이전 결과를 버립니다. (모드 전환 시 오래된 결과가 보이지 않도록)"""
+        with self._lock:
+            self._generation += 1
+            self._result = None
+            self._result_time = None
+        self._queue.clear()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
@@ -0,0 +1,191 @@
+import time
+from collections import OrderedDict
+import numpy as np
+import cv2
+from realtime_pipeline import InferenceWorker
+from metrics import metrics
+
+# --- 실시간 배경 추천 ---
+# 's' 를 누르지 않아도 카메라가 비추는 배경에 맞는 추천 사진을 계속 보여줍니다.
+# 특징 모델은 무겁기 때문에 매 프레임 돌리지 않고, 값싼 장면 서명으로 '배경이 실제로 바뀌었을 때'만 검색합니다.
+# 1. 장면 서명: 프레임을 아주 작게 줄여 만든 64비트 dHash(밝기 구조) + H-S 색 히스토그램. (720p 프레임당 약 1ms)
+# 2. 정착 판단: 카메라를 돌리는 중(서명이 프레임마다 크게 바뀜)에는 검색하지 않고, 몇 프레임 동안 멈춘 뒤에 판단합니다.
+# 3. 변화 판단: 마지막으로 검색한 장면과 서명이 충분히 다를 때만 새로 검색합니다.
+# 4. 결과 재사용: 장면 서명별 검색 결과를 보관해 두고, 예전에 본 장면으로 돌아오면 모델 없이 바로 보여줍니다.
+# 5. 비동기 검색: 특징 추출 + 상위 K 검색은 전용 스레드에서 실행하고, 최소 간격(MIN_SEARCH_INTERVAL_S)을 지킵니다.
+
+# --- 1. 설정 및 상수 정의 ---
+SIGNATURE_THUMB_SIZE = (64, 36)   # 서명 계산용 축소 이미지 크기 (한 번만 줄여서 hash/히스토그램에 같이 사용)
+HASH_SIZE = (9, 8)                # dHash: 가로로 이웃한 픽셀 밝기 비교 -> 8 x 8 = 64비트
+HIST_BINS = (16, 8)               # H, S 히스토그램 칸 수
+STABLE_HASH_BITS = 8              # 직전 프레임과 hash 가 이 비트 수 이하로 다르면 '멈춤'
+STABLE_FRAMES = 5                 # 연속으로 이 프레임 수만큼 멈춰 있어야 장면 변화를 판단
+CHANGE_HASH_BITS = 14             # 마지막 검색 장면과 hash 가 이 비트 수 이상 다르면 '배경이 바뀜'
+CHANGE_HIST_DISTANCE = 0.3        # 또는 히스토그램 Bhattacharyya 거리가 이 값 이상이면 '배경이 바뀜'
+MIN_SEARCH_INTERVAL_S = 10.0      # 특징 추출 최소 간격 (분당 최대 6번)
+MEMO_SIZE = 32                    # 결과를 보관할 장면 수 (오래 안 본 장면부터 버림)
+
+# --- 2. 장면 서명 ---
+
+class SceneSignature:
+    """프레임 한 장의 값싼 요약. hash 는 64비트 정수, hist 는 정규화된 float32 H-S 히스토그램입니다."""
+
+    __slots__ = ('hash', 'hist')
+
+    def __init__(self, hash_value, hist):
+        self.hash = hash_value
+        self.hist = hist
+
+    @classmethod
+    def from_frame(cls, frame_bgr):
+        small = cv2.resize(frame_bgr, SIGNATURE_THUMB_SIZE, interpolation=cv2.INTER_AREA)
+        gray = cv2.resize(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), HASH_SIZE, interpolation=cv2.INTER_AREA)
+        bits = np.packbits(gray[:, 1:] > gray[:, :-1])
+        hist = cv2.calcHist([cv2.cvtColor(small, cv2.COLOR_BGR2HSV)], [0, 1], None, list(HIST_BINS), [0, 180, 0, 256])
+        cv2.normalize(hist, hist, 1.0, 0.0, cv2.NORM_L1)
+        return cls(int.from_bytes(bits.tobytes(), 'big'), hist)
+
+    def hash_distance(self, other):
+        return bin(self.hash ^ other.hash).count('1')
+
+    def hist_distance(self, other):
+        return cv2.compareHist(self.hist, other.hist, cv2.HISTCMP_BHATTACHARYYA)
+
+    def same_scene(self, other):
+        return (self.hash_distance(other) < CHANGE_HASH_BITS
+                and self.hist_distance(other) < CHANGE_HIST_DISTANCE)
+
+class SceneChangeDetector:
+    """
+    update(frame) 은 카메라가 멈춰 있고 배경이 기준 장면과 달라졌을 때만 그 프레임의 서명을, 아니면 None 을 반환합니다.
+    검색(또는 결과 재사용)을 했으면 accept(서명) 으로 기준 장면을 옮깁니다.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._previous = None
+        self._stable_frames = 0
+        self.reference = None
+
+    def update(self, frame_bgr):
+        signature = SceneSignature.from_frame(frame_bgr)
+        if self._previous is not None and signature.hash_distance(self._previous) <= STABLE_HASH_BITS:
+            self._stable_frames += 1
+        else:
+            self._stable_frames = 0
+        self._previous = signature
+        if self._stable_frames < STABLE_FRAMES:
+            return None
+        if self.reference is not None and signature.same_scene(self.reference):
+            return None
+        return signature
+
+    def accept(self, signature):
+        self.reference = signature
+
+# --- 3. 실시간 추천 ---
+
+class LiveSuggestions:
+    """
+    search_fn(frame) -> 검색 결과 목록 을 장면이 바뀔 때만 전용 스레드에서 실행하고, 가장 최근 결과를 보관합니다.
+    search_fn 이 쓰는 Interpreter 는 이 작업자 전용이어야 합니다. (TFLite Interpreter 는 스레드 안전하지 않음)
+    update() / latest() 는 메인 루프 한 스레드에서만 호출해야 합니다.
+    """
+
+    def __init__(self, search_fn, min_interval=MIN_SEARCH_INTERVAL_S, memo_size=MEMO_SIZE):
+        self._worker = InferenceWorker(lambda item: (item[0], search_fn(item[1])), name="SuggestionWorker")
+        self._detector = SceneChangeDetector()
+        self._memo = OrderedDict()  # 장면 hash -> (서명, 결과)
+        self._memo_size = memo_size
+        self._min_interval = min_interval
+        self._last_search = None
+        self._seen_results = 0
+        self._results = None
+        self.searches = 0
+        self.memo_hits = 0
+        self.frames = 0
+
+    def start(self):
+        self._worker.start()
+        return self
+
+    def stop(self):
+        self._worker.stop()
+
+    @property
+    def name(self):
+        return self._worker.name
+
+    @property
+    def error(self):
+        """검색 스레드에서 마지막으로 난 예외. 없으면 None."""
+        return self._worker.error
+
+    def reset(self):
+        """보여주던 결과, 진행 중인 검색, 기준 장면을 버립니다. (보관한 결과는 그대로 두어 같은 장면이면 바로 다시 씁니다.)"""
+        self._worker.reset()
+        self._detector.reset()
+        self._results = None
+
+    def invalidate(self):
+        """DB 가 바뀌어 보관한 결과가 맞지 않을 때 호출합니다. 다음 정착 프레임에서 다시 검색합니다."""
+        self._memo.clear()
+        self.reset()
+
+    def _lookup(self, signature):
+        for key, (memo_signature, results) in self._memo.items():
+            if signature.same_scene(memo_signature):
+                self._memo.move_to_end(key)
+                return results
+        return None
+
+    def _remember(self, signature, results):
+        self._memo[signature.hash] = (signature, results)
+        self._memo.move_to_end(signature.hash)
+        while len(self._memo) > self._memo_size:
+            self._memo.popitem(last=False)
+
+    def update(self, frame):
+        """
+        현재 프레임으로 장면 변화를 확인합니다. 바뀐 장면이면 보관한 결과를 쓰거나, 최소 간격이 지났을 때 검색을 맡깁니다.
+        작업자에게는 복사본을 넘기므로 호출 뒤에 frame 에 그림을 그려도 됩니다.
+        """
+        self.frames += 1
+        self._collect()
+        with metrics.span('suggest.detect'):
+            signature = self._detector.update(frame)
+        if signature is None:
+            return
+        results = self._lookup(signature)
+        if results is not None:
+            self.memo_hits += 1
+            metrics.count('suggest.memo_hits')
+            self._results = results
+            self._detector.accept(signature)
+            return
+        now = time.perf_counter()
+        if self._last_search is not None and now - self._last_search < self._min_interval:
+            return  # 간격이 지날 때까지 기준 장면을 그대로 두어 다음 프레임에서 다시 판단
+        self._last_search = now
+        self.searches += 1
+        metrics.count('suggest.searches')
+        self._worker.submit((signature, frame.copy()))
+        self._detector.accept(signature)
+
+    def _collect(self):
+        """작업자가 새 결과를 냈으면 보관하고 화면에 보여줄 결과로 바꿉니다."""
+        if self._worker.processed == self._seen_results:  # reset() 이전 검색의 결과는 세지 않음
+            return
+        self._seen_results = self._worker.processed
+        latest = self._worker.latest()
+        if latest is None:
+            return
+        signature, results = latest
+        self._remember(signature, results)
+        self._results = results
+
+    def latest(self):
+        """가장 최근 추천 결과 ([{'index', 'path', 'distance'}]). 아직 없으면 None."""
+        return self._results
@@ -0,0 +1,223 @@
+import copy
+import threading
+import numpy as np
+from feature_codec import Float32Codec, CODEC_FLOAT32, load_codec, fit_codec, _normalize_rows
+
+# --- 배경 특징 검색 인덱스 ---
+# 01_build_feature_db.py 가 만든 특징 DB를 메모리에 한 번만 정규화해 두고,
+# 웹캠 스크립트나 다른 도구가 같은 API로 상위 K개 유사 배경을 찾을 수 있게 합니다.
+
+# --- 1. 설정 및 상수 정의 ---
+SEARCH_MODE_AUTO = "auto"    # DB 크기에 따라 exact / ivf 를 자동 선택
+SEARCH_MODE_EXACT = "exact"  # 행렬-벡터 곱 한 번 + argpartition 으로 정확한 상위 K
+SEARCH_MODE_IVF = "ivf"      # 거친 클러스터링(IVF) 기반 근사 검색
+
+IVF_MIN_SIZE = 100_000   # auto 모드에서 이 개수 이상이면 근사 검색을 사용
+IVF_TRAIN_SAMPLES = 50_000  # 클러스터 중심 학습에 사용할 최대 샘플 수
+IVF_TRAIN_ITERS = 10
+DEFAULT_N_PROBE = 8
+
+# --- 2. 내부 함수 ---
+
+def _normalize_vector(vector):
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else np.zeros_like(vector)
+
+def _top_k(distances, k):
+    """거리 배열에서 가장 작은 k개의 위치를 오름차순으로 반환합니다."""
+    k = min(k, len(distances))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(distances):
+        part = np.argpartition(distances, k - 1)[:k]
+    else:
+        part = np.arange(len(distances))
+    return part[np.argsort(distances[part], kind='stable')]
+
+def _train_centroids(vectors, n_lists, seed=0):
+    """정규화된 벡터에 대해 구면 k-means 를 수행하여 클러스터 중심을 학습합니다."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > IVF_TRAIN_SAMPLES:
+        vectors = vectors[rng.choice(len(vectors), IVF_TRAIN_SAMPLES, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(IVF_TRAIN_ITERS):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        # 비어 있는 클러스터는 임의의 샘플로 다시 시작
+        empty = np.bincount(assign, minlength=n_lists) == 0
+        sums[empty] = vectors[rng.integers(len(vectors), size=int(empty.sum()))]
+        centroids = _normalize_rows(sums)
+    return centroids
+
+# --- 3. 검색 인덱스 ---
+
+class FeatureIndex:
+    """
+    배경 특징 벡터에 대한 코사인 거리 검색 인덱스.
+    - 로드 시 한 번만 float32 로 정규화된 행렬을 만들어 두고,
+      검색은 행렬-벡터 곱 한 번과 argpartition 으로 상위 K개를 정확하게 찾습니다.
+    - 10만 개 이상의 대용량 DB에서는 IVF(거친 클러스터링) 근사 검색을 사용할 수 있습니다.
+    - 반환 형식은 기존 find_similar_images 와 같은 [{'path', 'distance'}] 에 'index' 가 추가됩니다.
+      'index' 는 ids 를 주면 그 값(예: 저장소 행 번호), 아니면 입력 순서입니다.
+    - codec 을 주면 벡터를 압축된 코드(float16 / int8 / PQ)로 보관하고 코드 위에서 바로 거리를 계산합니다.
+      (feature_codec.py 참고) encoded=True 이면 features 는 이미 그 코덱으로 압축된 코드입니다.
+    - add() 와 search() / search_batch() 는 서로 다른 스레드에서 호출해도 됩니다. (예: 'k' 추가와 실시간 추천 검색)
+    """
+
+    def __init__(self, features, filepaths, mode=SEARCH_MODE_AUTO, n_lists=None, n_probe=DEFAULT_N_PROBE, ids=None,
+                 codec=None, encoded=False):
+        features = np.asarray(features)
+        self._lock = threading.RLock()  # add() 가 버퍼/코덱/IVF 목록을 바꾸는 동안 검색이 중간 상태를 보지 않도록
+        # 차원 기록 / 재학습으로 코덱을 바꾸므로 넘겨받은 코덱은 복사해서 씁니다. (호출한 쪽 코덱은 그대로)
+        self.codec = copy.copy(codec) if codec is not None else Float32Codec()
+        self.filepaths = [str(p) for p in filepaths]
+        self._size = len(self.filepaths)
+        self._ids = list(range(self._size)) if ids is None else [int(i) for i in ids]
+        if self._size and features.ndim >= 2:
+            if encoded:
+                self._codes = np.array(features)
+            else:
+                vectors = _normalize_rows(features)
+                if not self.codec.trained:
+                    self.codec = fit_codec(self.codec, vectors)
+                self._codes = np.asarray(self.codec.encode(vectors))
+                self.codec.dim = vectors.shape[1]
+            self._dim = self.codec.dim
+        else:
+            self._dim = None
+            self._codes = None
+
+        if mode == SEARCH_MODE_AUTO:
+            mode = SEARCH_MODE_IVF if self._size >= IVF_MIN_SIZE else SEARCH_MODE_EXACT
+        self.mode = mode
+        self.n_probe = n_probe
+        self._centroids = None
+        self._lists = None
+        if self.mode == SEARCH_MODE_IVF and self._size:
+            self._build_ivf(n_lists or int(np.sqrt(self._size)))
+
+    @classmethod
+    def from_store(cls, store, **kwargs):
+        """
+        FeatureStore 의 살아있는 행들로 인덱스를 만듭니다. 결과의 'index' 는 저장소 행 번호입니다.
+        저장소가 압축 형식이면 코드를 그대로 메모리에 올립니다. (float32 로 풀지 않음)
+        """
+        codec = load_codec(store)
+        rows = store.alive_indices()
+        if len(rows) == 0 or not store.has_column(codec.column):
+            return cls([], [], codec=codec, **kwargs)
+        paths = store.filepaths
+        return cls(store.column(codec.column)[rows], [paths[i] for i in rows], ids=rows, codec=codec,
+                   encoded=codec.kind != CODEC_FLOAT32, **kwargs)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def features(self):
+        """정규화된 특징 행렬 (압축 형식이면 코드를 풀어 새로 만든 근사값, 읽기 전용으로 다룰 것)."""
+        if self._codes is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self.codec.decode(self._codes[:self._size])
+
+    @property
+    def codes(self):
+        """보관 중인 (압축된) 코드. float32 형식이면 정규화된 특징 행렬과 같습니다."""
+        return self._codes[:self._size] if self._codes is not None else self._codes
+
+    @property
+    def nbytes(self):
+        return 0 if self._codes is None else self.codes.nbytes
+
+    def entry(self, position, distance):
+        """인덱스 안의 위치(0 ~ len-1) 를 검색 결과 형식 {'index', 'path', 'distance'} 으로 만듭니다."""
+        return {'index': self._ids[position], 'path': self.filepaths[position], 'distance': float(distance)}
+
+    def _build_ivf(self, n_lists):
+        n_lists = max(1, min(n_lists, self._size))
+        rng = np.random.default_rng(0)
+        sample = rng.choice(self._size, IVF_TRAIN_SAMPLES, replace=False) if self._size > IVF_TRAIN_SAMPLES else slice(None)
+        self._centroids = _train_centroids(self.codec.decode(self.codes[sample]), n_lists)
+        assign = np.concatenate([np.argmax(self.codec.decode(self.codes[start:start + IVF_TRAIN_SAMPLES]) @ self._centroids.T, axis=1)
+                                 for start in range(0, self._size, IVF_TRAIN_SAMPLES)])
+        order = np.argsort(assign, kind='stable')
+        bounds = np.searchsorted(assign[order], np.arange(n_lists + 1))
+        self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(n_lists)]
+
+    def add(self, feature, filepath, id=None):
+        """특징 벡터 하나를 인덱스에 추가합니다. 내부 버퍼는 두 배씩 늘려 재할당을 줄입니다."""
+        with self._lock:
+            return self._add(feature, filepath, id)
+
+    def _add(self, feature, filepath, id):
+        vector = _normalize_vector(feature)
+        if self._dim is None:
+            self._dim = len(vector)
+            if not self.codec.trained:
+                # 벡터 하나로는 int8 배율 / PQ 중심을 학습할 수 없으므로 float16 으로 대신 보관합니다.
+                self.codec = fit_codec(self.codec, vector[np.newaxis])
+            self.codec.dim = self._dim
+        code = self.codec.encode(vector[np.newaxis])[0]
+        if self._codes is None:
+            self._codes = np.empty((16, *code.shape), dtype=code.dtype)
+        if self._size == len(self._codes):
+            grown = np.empty((max(16, 2 * self._size), *code.shape), dtype=self._codes.dtype)
+            grown[:self._size] = self._codes[:self._size]
+            self._codes = grown
+        self._codes[self._size] = code
+        self.filepaths.append(str(filepath))
+        self._ids.append(self._size if id is None else int(id))
+        if self._lists is not None:
+            c = int(np.argmax(self._centroids @ vector))
+            self._lists[c] = np.append(self._lists[c], self._size)
+        self._size += 1
+        return self._size - 1
+
+    def _candidates(self, query):
+        """IVF 모드에서 질의와 가까운 n_probe 개 클러스터의 항목 번호를 모읍니다."""
+        n_probe = min(self.n_probe, len(self._centroids))
+        nearest = np.argpartition(-(self._centroids @ query), n_probe - 1)[:n_probe]
+        return np.concatenate([self._lists[c] for c in nearest])
+
+    def search(self, query, k):
+        """질의 특징과 코사인 거리가 가장 가까운 k개 결과를 거리 오름차순으로 반환합니다."""
+        with self._lock:
+            return self._search(query, k)
+
+    def _search(self, query, k):
+        if self._size == 0:
+            return []
+        query = _normalize_vector(query)
+        if self._lists is not None:
+            ids = self._candidates(query)
+            distances = 1.0 - self.codec.similarities(self._codes[ids], query)
+            order = _top_k(distances, k)
+            ids, distances = ids[order], distances[order]
+        else:
+            distances = 1.0 - self.codec.similarities(self.codes, query)
+            ids = _top_k(distances, k)
+            distances = distances[ids]
+        return [self.entry(i, d) for i, d in zip(ids, distances)]
+
+    def search_batch(self, queries, k):
+        """
+        여러 질의를 한 번에 검색하여 질의마다 search() 와 같은 결과 목록을 반환합니다.
+        정확한 검색에서는 (DB x 질의) 유사도를 행렬 곱 한 번으로 계산합니다. IVF 는 질의마다 후보가 달라 하나씩 검색합니다.
+        """
+        queries = _normalize_rows(np.atleast_2d(queries))
+        with self._lock:
+            return self._search_batch(queries, k)
+
+    def _search_batch(self, queries, k):
+        if self._size == 0:
+            return [[] for _ in queries]
+        if self._lists is not None:
+            return [self._search(query, k) for query in queries]
+        distances = 1.0 - self.codec.similarities(self.codes, queries)
+        results = []
+        for column in distances.T:
+            ids = _top_k(column, k)
+            results.append([self.entry(i, column[i]) for i in ids])
+        return results
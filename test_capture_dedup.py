@@ -0,0 +1,43 @@
+import numpy as np
+from feature_codec import make_codec
+from search_index import FeatureIndex, SEARCH_MODE_IVF
+from dedup import find_capture_duplicate
+
+# --- 'k' 캡처 중복 확인 테스트 ---
+# 02_run_realtime_webcam.py 의 'k' 저장 전 확인(find_capture_duplicate)이 01_build_feature_db.py 의 빌드 시
+# 중복 제거(dedup_features)와 같은 판단을 내리는지 확인합니다. (PQ 비대칭 거리 / IVF 후보 누락과 무관해야 함)
+
+DIM = 64
+THRESHOLD = 0.03
+
+def _features(n, seed):
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+def _pq_index(features, **kwargs):
+    codec = make_codec("pq", subspaces=8).train(features / np.linalg.norm(features, axis=1, keepdims=True))
+    return FeatureIndex(features, [f"db_{i}.jpg" for i in range(len(features))], codec=codec, **kwargs)
+
+def _capture(index, features):
+    """'k' 처리와 같이 중복이 아니면 인덱스에 추가하고, 중복이면 찾은 항목을 반환합니다."""
+    duplicate = find_capture_duplicate(index, features, THRESHOLD)
+    if duplicate is None:
+        index.add(features, f"capture_{len(index)}.jpg")
+    return duplicate
+
+def test_same_frame_twice_with_pq_is_rejected():
+    index = _pq_index(_features(300, seed=0))
+    capture = _features(1, seed=1)[0]
+    assert _capture(index, capture) is None
+    duplicate = _capture(index, capture)
+    assert duplicate is not None
+    assert duplicate['path'] == "capture_300.jpg"
+    assert abs(duplicate['distance']) < 1e-6
+    assert len(index) == 301
+
+def test_ivf_finds_duplicate_outside_probed_lists():
+    features = _features(400, seed=2)
+    index = _pq_index(features, mode=SEARCH_MODE_IVF, n_lists=20, n_probe=1)
+    # 어느 목록에 있든 빠짐없이 비교하므로 DB 에 있는 모든 항목이 자기 자신의 중복으로 판단되어야 합니다.
+    for row in range(0, len(features), 37):
+        duplicate = find_capture_duplicate(index, features[row], THRESHOLD)
+        assert duplicate is not None and duplicate['index'] == row
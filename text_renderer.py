@@ -0,0 +1,113 @@
+from collections import OrderedDict
+import numpy as np
+from PIL import Image, ImageDraw
+
+# --- 캐시된 텍스트 스프라이트 렌더러 ---
+# 매 프레임 전체 화면을 BGR -> RGB -> PIL -> BGR 로 변환하며 글자를 다섯 번씩 그리는 대신,
+# (문자열, 폰트, 색상) 조합마다 외곽선을 포함한 스프라이트를 한 번만 만들어 두고
+# 프레임에는 글자가 차지하는 영역(ROI)만 NumPy 로 알파 합성합니다.
+
+# --- 1. 설정 및 상수 정의 ---
+DEFAULT_CACHE_SIZE = 128
+OUTLINE_WIDTH = 2  # 기존 draw_text_with_outline 과 같이 상하좌우 2픽셀 외곽선
+OUTLINE_OFFSETS = [(-OUTLINE_WIDTH, 0), (OUTLINE_WIDTH, 0), (0, -OUTLINE_WIDTH), (0, OUTLINE_WIDTH)]
+
+# --- 2. 스프라이트 ---
+
+class TextSprite:
+    """
+    미리 래스터화된 글자 이미지.
+    - inv_alpha: (h, w, 1) uint16, 256 * (1 - 불투명도) (외곽선 + 글자)
+    - color: (h, w, 3) uint16, 256 * 불투명도가 곱해진 BGR 색상 (외곽선은 검정이므로 글자 부분만 값이 있음)
+    - offset: 글자를 그릴 기준 좌표(pos) 에서 스프라이트 왼쪽 위 모서리까지의 거리
+    정수 고정소수점(8비트)으로 저장하여 합성 시 부동소수점 변환 없이 계산합니다.
+    """
+    __slots__ = ('inv_alpha', 'color', 'offset', 'font')
+
+    def __init__(self, inv_alpha, color, offset, font):
+        self.inv_alpha = inv_alpha
+        self.color = color
+        self.offset = offset
+        self.font = font  # 캐시 키에 id(font) 를 쓰므로 폰트 객체가 먼저 해제되지 않도록 참조를 유지
+
+def rasterize_text(text, font, fill_color):
+    """
+    PIL 로 외곽선 마스크와 글자 마스크를 각각 그려 스프라이트를 만듭니다.
+    fill_color 는 기존 코드와 같이 RGB 순서입니다.
+    합성 결과는 '외곽선(검정)을 먼저 그리고 그 위에 글자를 그리는' 기존 방식과 같습니다:
+        결과 = 프레임 * (1 - 외곽선) * (1 - 글자) + 색상 * 글자
+    """
+    probe = ImageDraw.Draw(Image.new('L', (1, 1)))
+    left, top, right, bottom = probe.multiline_textbbox((0, 0), text, font=font)
+    pad = OUTLINE_WIDTH
+    size = (max(1, right - left + 2 * pad), max(1, bottom - top + 2 * pad))
+    origin = (pad - left, pad - top)
+
+    outline_img = Image.new('L', size, 0)
+    outline_draw = ImageDraw.Draw(outline_img)
+    for dx, dy in OUTLINE_OFFSETS:
+        outline_draw.multiline_text((origin[0] + dx, origin[1] + dy), text, font=font, fill=255)
+    fill_img = Image.new('L', size, 0)
+    ImageDraw.Draw(fill_img).multiline_text(origin, text, font=font, fill=255)
+
+    outline = np.asarray(outline_img, dtype=np.float32)[..., np.newaxis] / 255.0
+    fill = np.asarray(fill_img, dtype=np.float32)[..., np.newaxis] / 255.0
+    alpha = 1.0 - (1.0 - outline) * (1.0 - fill)
+    bgr = np.array(fill_color[:3][::-1], dtype=np.float32)
+    inv_alpha = np.rint(256.0 * (1.0 - alpha)).astype(np.uint16)
+    color = np.rint(256.0 * fill * bgr).astype(np.uint16)
+    return TextSprite(inv_alpha, color, (left - pad, top - pad), font)
+
+def blend_sprite(frame, sprite, pos):
+    """스프라이트가 차지하는 영역만 프레임에 알파 합성합니다. 화면 밖으로 나가는 부분은 잘라냅니다."""
+    frame_h, frame_w = frame.shape[:2]
+    sprite_h, sprite_w = sprite.inv_alpha.shape[:2]
+    x0, y0 = int(pos[0]) + sprite.offset[0], int(pos[1]) + sprite.offset[1]
+    fx0, fy0 = max(x0, 0), max(y0, 0)
+    fx1, fy1 = min(x0 + sprite_w, frame_w), min(y0 + sprite_h, frame_h)
+    if fx0 >= fx1 or fy0 >= fy1:
+        return frame
+    sx0, sy0 = fx0 - x0, fy0 - y0
+    sx1, sy1 = sx0 + (fx1 - fx0), sy0 + (fy1 - fy0)
+    roi = frame[fy0:fy1, fx0:fx1]
+    # (프레임 * (256 - a) + 256 * a * 색상) / 256, 최댓값이 255 * 256 이므로 uint16 안에서 계산됩니다.
+    blended = roi * sprite.inv_alpha[sy0:sy1, sx0:sx1]
+    blended += sprite.color[sy0:sy1, sx0:sx1]
+    blended >>= 8
+    roi[...] = blended
+    return frame
+
+# --- 3. LRU 캐시 ---
+
+class TextSpriteCache:
+    """(문자열, 폰트, 색상) -> TextSprite 의 LRU 캐시. 가득 차면 가장 오래 쓰이지 않은 스프라이트를 버립니다."""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._sprites = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._sprites)
+
+    def get(self, text, font, fill_color):
+        key = (text, id(font), tuple(fill_color))
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        sprite = rasterize_text(text, font, fill_color)
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.max_entries:
+            self._sprites.popitem(last=False)
+        return sprite
+
+    def draw(self, frame, text, pos, font, fill_color):
+        """프레임(BGR) 위 pos 위치에 외곽선이 있는 글자를 그립니다. 프레임을 직접 수정합니다."""
+        return blend_sprite(frame, self.get(text, font, fill_color), pos)
+
+    def clear(self):
+        self._sprites.clear()
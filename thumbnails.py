@@ -0,0 +1,71 @@
+import numpy as np
+import cv2
+from pose_utils import draw_pose_on_image
+
+# --- DB 썸네일 저장 ---
+# 검색 결과 창과 가이드 모드의 '분석된 가이드' 썸네일을 DB 빌드 시 미리 만들어 저장소 열로 저장합니다.
+# 웹캠 스크립트는 원본 이미지를 디스크에서 다시 읽고 줄이는 대신, 메모리 맵된 저장소에서 행 하나만 읽습니다.
+
+# --- 1. 설정 및 상수 정의 ---
+THUMBNAIL_SIZE = (320, 240)        # (너비, 높이) 검색 결과 창 (02_run_realtime_webcam.py 가 이 값을 그대로 사용)
+GUIDE_THUMBNAIL_SIZE = (160, 120)  # (너비, 높이) 가이드 모드 오른쪽 위 썸네일
+PREVIEW_MAX_SIZE = (1280, 720)     # 자세를 그리기 전 원본을 이 크기 안으로 줄입니다. (선택 화면 표시 크기)
+
+# 저장소 열 이름
+THUMBNAIL_COLUMN = "thumbnail"              # (240, 320, 3) uint8 BGR
+GUIDE_THUMBNAIL_COLUMN = "guide_thumbnail"  # (120, 160, 3) uint8 BGR, 가이드 자세가 그려진 이미지
+
+# --- 2. 썸네일 생성 ---
+
+def shrink_for_thumbnails(image):
+    """
+    썸네일을 만들 원본을 PREVIEW_MAX_SIZE 안으로 미리 줄입니다. (이미 작으면 그대로 반환)
+    큰 원본 전체를 보관하지 않고 자세 인식이 끝날 때까지 이 이미지만 들고 있으면 됩니다.
+    """
+    h, w = image.shape[:2]
+    scale = min(PREVIEW_MAX_SIZE[0] / w, PREVIEW_MAX_SIZE[1] / h)
+    if scale >= 1:
+        return image
+    return cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+def make_thumbnails(image, keypoints):
+    """(검색 결과 썸네일, 자세가 그려진 가이드 썸네일) 을 반환합니다."""
+    image = shrink_for_thumbnails(image)
+    thumbnail = cv2.resize(image, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    guide = draw_pose_on_image(image.copy(), keypoints)
+    guide_thumbnail = cv2.resize(guide, GUIDE_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    return thumbnail, guide_thumbnail
+
+def thumbnail_columns(thumbnails_list):
+    """[(썸네일, 가이드 썸네일)] 목록으로 저장소에 넣을 썸네일 열들을 만듭니다."""
+    thumbnails, guide_thumbnails = zip(*thumbnails_list)
+    return {
+        THUMBNAIL_COLUMN: np.stack(thumbnails),
+        GUIDE_THUMBNAIL_COLUMN: np.stack(guide_thumbnails),
+    }
+
+# --- 3. 저장소 연동 ---
+
+def ensure_thumbnail_columns(store):
+    """
+    저장소에 썸네일 열이 없으면 추가합니다. 이전에 만들어진 행은 검정(0)으로 채워지며,
+    stored_thumbnail() 이 None 을 반환하므로 호출 측에서 원본 이미지로 대체할 수 있습니다.
+    """
+    store.add_column(THUMBNAIL_COLUMN, np.uint8, (THUMBNAIL_SIZE[1], THUMBNAIL_SIZE[0], 3), fill_value=0)
+    store.add_column(GUIDE_THUMBNAIL_COLUMN, np.uint8, (GUIDE_THUMBNAIL_SIZE[1], GUIDE_THUMBNAIL_SIZE[0], 3), fill_value=0)
+
+def _stored_image(store, row, name):
+    if row is None or not store.has_column(name) or row >= store.count:
+        return None
+    image = np.array(store.column(name)[row])
+    if not image.any():
+        return None
+    return image
+
+def stored_thumbnail(store, row):
+    """저장소 행의 검색 결과 썸네일 (THUMBNAIL_SIZE). 만들어지지 않은 행이면 None."""
+    return _stored_image(store, row, THUMBNAIL_COLUMN)
+
+def stored_guide_thumbnail(store, row):
+    """저장소 행의 가이드 썸네일 (GUIDE_THUMBNAIL_SIZE). 만들어지지 않은 행이면 None."""
+    return _stored_image(store, row, GUIDE_THUMBNAIL_COLUMN)